@@ -0,0 +1,253 @@
+"""Time the stages of wrapping a synthetic header: ``generation.py -o new.json --baseline old.json``."""
+
+import argparse
+import ast as stdlib_ast
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import typing as tp
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from headache import CTyper, DLLWrapper  # noqa: E402
+from headache.emitter import to_source  # noqa: E402
+from headache.myast import thaw  # noqa: E402
+
+
+def printers() -> tp.Dict[str, tp.Callable[[stdlib_ast.AST], str]]:
+    """The ways of turning a module into source to compare: the emitter, `ast.unparse` and astor if available."""
+    res = {'to_source': to_source}
+    if hasattr(stdlib_ast, 'unparse'):
+        res['to_source (ast.unparse)'] = lambda mod: stdlib_ast.unparse(stdlib_ast.fix_missing_locations(thaw(mod)))
+    try:
+        import astor
+    except ImportError:
+        pass
+    else:
+        res['to_source (astor)'] = astor.to_source
+    return res
+
+
+class Synthesizer:
+    """A header exercising the parts of `CTyper` that scale, and C stubs for its functions."""
+
+    fundamentals = ('int', 'unsigned int', 'long', 'double', 'float', 'char', 'unsigned short', 'long long')
+
+    def __init__(self, functions=2000, typedef_depth=20, enums=50, enum_size=100, structs=100, struct_depth=5,
+                 callbacks=50, macros=500):
+        self.functions = functions
+        self.typedef_depth = typedef_depth
+        self.enums = enums
+        self.enum_size = enum_size
+        self.structs = structs
+        self.struct_depth = struct_depth
+        self.callbacks = callbacks
+        self.macros = macros
+
+    @property
+    def params(self) -> tp.Dict[str, int]:
+        return dict(vars(self))
+
+    def macro_lines(self) -> tp.Iterator[str]:
+        yield '#define M0 1'
+        for i in range(1, self.macros):
+            yield f'#define M{i} (M{i - 1} + {i} * (1 << {i % 8}))'
+        yield '#define MSIZE sizeof(t0)'
+        yield '#define MAX(a, b) ((a) > (b) ? (a) : (b))'
+
+    def typedef_lines(self) -> tp.Iterator[str]:
+        yield 'typedef long t0;'
+        for i in range(1, self.typedef_depth):
+            yield f'typedef t{i - 1} t{i};'
+
+    def enum_lines(self) -> tp.Iterator[str]:
+        for i in range(self.enums):
+            yield f'typedef enum e{i} {{ ' + ', '.join(
+                f'E{i}_{j} = {j * 3}' if j % 5 else f'E{i}_{j}' for j in range(self.enum_size)) + f' }} e{i}_t;'
+
+    def struct_lines(self) -> tp.Iterator[str]:
+        # Chains of struct_depth structs, each embedding the previous one by value and in an array
+        for i in range(self.structs):
+            level = i % self.struct_depth
+            fields = [f'{self.fundamentals[(i + k) % len(self.fundamentals)]} f{k};' for k in range(4)] + [
+                f't{self.typedef_depth - 1} t;', 'const char *name;', f'double m[{2 + i % 3}][3];']
+            if level:
+                fields += [f's{i - 1}_t inner;', f's{i - 1}_t items[4];', f's{i - 1}_t *next;']
+            yield f'typedef struct s{i} {{ ' + ' '.join(fields) + f' }} s{i}_t;'
+
+    def callback_lines(self) -> tp.Iterator[str]:
+        for i in range(self.callbacks):
+            yield f'typedef int (*cb{i}_t)(int, s{i % self.structs}_t *, void *);'
+
+    def function_prototypes(self) -> tp.Iterator[tp.Tuple[str, str]]:
+        for i in range(self.functions):
+            ret = ('int', 'double', 'void', f's{i % self.structs}_t *', f'e{i % self.enums}_t')[i % 5]
+            params = [f'{self.fundamentals[i % len(self.fundamentals)]} a', 'const double *xs', 'size_t n',
+                      f's{i % self.structs}_t *s', f'e{i % self.enums}_t e', f'cb{i % self.callbacks}_t cb',
+                      f't{i % self.typedef_depth} t'][:2 + i % 6]
+            yield ret, f'f{i}({", ".join(params)})'
+
+    def header(self) -> str:
+        return '\n'.join([
+            '#include <stddef.h>', *self.macro_lines(), *self.typedef_lines(), *self.enum_lines(),
+            *self.struct_lines(), *self.callback_lines(),
+            *(f'{ret} {proto};' for ret, proto in self.function_prototypes())
+        ]) + '\n'
+
+    def stubs(self, header: str) -> str:
+        return f'#include "{header}"\n' + '\n'.join(
+            f'{ret} {proto} {{ return {"" if ret == "void" else "0"}; }}' for ret, proto in self.function_prototypes()
+        ) + '\n'
+
+    def write(self, directory: str, name='synth') -> tp.Tuple[str, tp.Optional[str]]:
+        """Write the header (and, if a C compiler is around, build a library from the stubs)."""
+        header = os.path.join(directory, f'{name}.h')
+        with open(header, 'w') as f:
+            f.write(self.header())
+
+        cc = os.environ.get('CC') or shutil.which('gcc') or shutil.which('cc')
+        if cc is None:
+            return header, None
+        with open(source := os.path.join(directory, f'{name}.c'), 'w') as f:
+            f.write(self.stubs(os.path.basename(header)))
+        library = os.path.join(directory, f'lib{name}.so')
+        subprocess.run([cc, '-shared', '-fPIC', '-w', '-o', library, source], check=True)
+        return header, library
+
+
+class Timer:
+    """The best time of every stage."""
+
+    def __init__(self):
+        self.times: tp.Dict[str, float] = {}
+
+    def record(self, stage: str, elapsed: float):
+        self.times[stage] = min(self.times.get(stage, elapsed), elapsed)
+
+    @contextmanager
+    def __call__(self, stage: str):
+        start = time.perf_counter()
+        yield
+        self.record(stage, time.perf_counter() - start)
+
+
+def import_time(directory: str, module: str) -> float:
+    return float(subprocess.run(
+        [sys.executable, '-c', f'import time; t = time.perf_counter(); import {module}; '
+                               f'print(time.perf_counter() - t)'],
+        cwd=directory, check=True, stdout=subprocess.PIPE, universal_newlines=True,
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (sys.path[0], os.environ.get('PYTHONPATH')))))
+    ).stdout)
+
+
+def run(synth: Synthesizer, directory: str, repeat=3,
+        **wrapper_options) -> tp.Tuple[tp.Dict[str, float], tp.Dict[str, int]]:
+    """The best time of every stage, and the sizes of what was generated."""
+    header, library = synth.write(directory)
+    timer = Timer()
+
+    for i in range(repeat):
+        typer = CTyper()
+        config = typer.xml_generator_config()
+        with timer('parse_header'):
+            ns, macros, files = typer.parse_header(header, config)
+        with timer('process_namespace'):
+            typer.process_namespace(ns)
+        with timer('process_defines'):
+            typer.process_macros(macros)
+
+        with timer('load_header'):
+            wrapper = DLLWrapper(header, CTyper(), **wrapper_options)
+        with timer('create_typedefs'):
+            wrapper.create_typedefs()
+        with timer('create_functions'):
+            wrapper.create_functions()
+        output = os.path.join(directory, f'synth_{i}.py')
+        with timer('print'):
+            mod = wrapper.print(output, library or 'synth')
+        for stage, printer in printers().items():
+            with timer(stage):
+                printer(mod)
+
+        if library is not None:
+            # The first import writes the bytecode the second one loads
+            for stage in ('import (compile)', 'import'):
+                timer.record(stage, import_time(directory, f'synth_{i}'))
+
+    return timer.times, {'output bytes': os.path.getsize(output)}
+
+
+def compare(results: tp.Mapping[str, float], baseline: tp.Mapping[str, float], tolerance: float) -> tp.List[str]:
+    """Print a comparison table and return the stages that regressed."""
+    regressions = []
+    print(f'{"stage":<20} {"baseline":>12} {"current":>12} {"ratio":>8}')
+    for stage, value in results.items():
+        if (base := baseline.get(stage)) is None:
+            print(f'{stage:<20} {"-":>12} {value:>12.4g}')
+            continue
+        ratio = value / base if base else float('inf')
+        flag = ' !' if ratio > 1 + tolerance else ''
+        print(f'{stage:<20} {base:>12.4g} {value:>12.4g} {ratio:>8.2f}{flag}')
+        if flag:
+            regressions.append(stage)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    defaults = Synthesizer().params
+    for key, default in defaults.items():
+        parser.add_argument(f'--{key.replace("_", "-")}', type=int, default=default)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--compiler-path', help='compiler castxml should emulate (default: gcc or cc)')
+    parser.add_argument('--lazy', action='store_true')
+    parser.add_argument('--direct', action='store_true')
+    parser.add_argument('-o', '--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare against this results file')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative slowdown (default: 0.1)')
+    parser.add_argument('--keep', help='generate into this directory and keep the files')
+    args = parser.parse_args(argv)
+
+    # CTyper defaults to MSVC, which castxml can only emulate where it is installed
+    if compiler_path := args.compiler_path or shutil.which('gcc') or shutil.which('cc'):
+        CTyper.compiler_path = compiler_path
+
+    synth = Synthesizer(**{key: getattr(args, key) for key in defaults})
+    directory = args.keep or tempfile.mkdtemp(prefix='headache-bench-')
+    os.makedirs(directory, exist_ok=True)
+    try:
+        stages, sizes = run(synth, directory, args.repeat, lazy=args.lazy, direct=args.direct)
+    finally:
+        if not args.keep:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    results = dict(
+        meta=dict(python=sys.version.split()[0], platform=platform.platform(), time=time.time(),
+                  params=synth.params, options=dict(lazy=args.lazy, direct=args.direct)),
+        stages=stages, sizes=sizes)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['meta']['params'] != synth.params:
+            print('warning: the baseline was run with different parameters', file=sys.stderr)
+        return 1 if compare(stages, baseline['stages'], args.tolerance) else 0
+
+    for stage, value in stages.items():
+        print(f'{stage:<20} {value:>12.4g}')
+    for name, size in sizes.items():
+        print(f'{name:<20} {size:>12}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
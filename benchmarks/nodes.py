@@ -0,0 +1,78 @@
+"""Time the construction of the AST nodes code generation is made of: ``nodes.py -o new.json --baseline old.json``."""
+
+import argparse
+import ast as stdlib
+import json
+import os
+import platform
+import sys
+import time
+import timeit
+import typing as tp
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from headache import myast as ast  # noqa: E402
+from generation import compare  # noqa: E402
+
+load = stdlib.Load()
+child = stdlib.Name(id='x', ctx=load)
+names = ['ctypes.c_int', 'ctypes.POINTER', 'ctypes.c_char', 'size_t', '__dll.f0', 'struct_s0']
+
+
+def stdlib_dotted(name: str) -> stdlib.expr:
+    first, *attrs = name.split('.')
+    res = stdlib.Name(id=first, ctx=load)
+    for attr in attrs:
+        res = stdlib.Attribute(value=res, attr=attr, ctx=load)
+    return res
+
+
+cases: tp.Dict[str, tp.Callable[[], tp.Any]] = {
+    'Name': lambda: ast.Name(id='x', ctx=load),
+    'Name (stdlib)': lambda: stdlib.Name(id='x', ctx=load),
+    'Call': lambda: ast.Call(func=child, args=[child]),
+    'Call (stdlib)': lambda: stdlib.Call(func=child, args=[child], keywords=[]),
+    'Assign': lambda: ast.Assign(targets=[child], value=child),
+    'Assign (stdlib)': lambda: stdlib.Assign(targets=[child], value=child),
+    'lvalue': lambda: [ast.lvalue(name) for name in names],
+    'rvalue': lambda: [ast.rvalue(name) for name in names],
+    'dotted (stdlib)': lambda: [stdlib_dotted(name) for name in names],
+    # What create_typename does for a char ** parameter
+    'POINTER(POINTER(c_char))': lambda: ast.call('ctypes.POINTER', [
+        ast.call('ctypes.POINTER', [ast.rvalue('ctypes.c_char')])]),
+}
+sizes = {'lvalue': len(names), 'rvalue': len(names), 'dotted (stdlib)': len(names)}
+
+
+def run(number: int, repeat: int) -> tp.Dict[str, float]:
+    return {case: min(timeit.repeat(func, number=number, repeat=repeat)) / number / sizes.get(case, 1) * 1e9
+            for case, func in cases.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('-o', '--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare against this results file')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative slowdown (default: 0.1)')
+    args = parser.parse_args(argv)
+
+    stages = run(args.number, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(dict(meta=dict(python=sys.version.split()[0], platform=platform.platform(), time=time.time()),
+                           stages=stages), f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            return 1 if compare(stages, json.load(f)['stages'], args.tolerance) else 0
+
+    for case, value in stages.items():
+        print(f'{case:<28} {value:>10.1f} ns')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
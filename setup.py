@@ -9,10 +9,13 @@ setup(
     packages=find_packages('src'),
     package_dir={'': 'src'},
     install_requires=[
-        'astor',
         'frozendict', 'frozenlist',
         'lxml',
         'more_itertools',
         'pygccxml',
-    ]
+    ],
+    extras_require={
+        'cffi': ['cffi'],
+        'numpy': ['numpy'],
+    }
 )
@@ -1,24 +1,39 @@
+import bisect
 import ctypes as ct
+import fnmatch
+import hashlib
+import importlib.util
 import inspect
+import json
+import marshal
 import os
+import platform
+import py_compile
 import re
+import shlex
 import subprocess
+import tempfile
 import textwrap
+import time
 import typing as tp
-from itertools import chain, repeat
+import warnings
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import chain, count, repeat
 
 import pygccxml
-from astor import to_source, source_repr
 from frozendict import frozendict
-from more_itertools import lstrip
 from pygccxml import declarations as d
 
-from . import cutils, myast as ast
+from . import cache, cexpr, cutils, emitter, myast as ast, profiling
+from .cache import HeaderCache
 from .cutils import c_enum, CArrayType, CFuncType, CPointerType, CTSignature, CType
 from .doxml import DoXML
-from .utils import patch, tryall, unzip
+from .utils import uint32, unzip
 
 _ctftypes = {key: val for key, val in ct.__dict__.items() if key.startswith('c_')}
+_missing = object()
 
 
 class CTyper:
@@ -34,68 +49,346 @@ class CTyper:
     }
     fundamental_typemap[d.FUNDAMENTAL_TYPES['unsigned char']] = ct.c_ubyte
 
-    def __init__(self):
+    def __init__(self, cache: HeaderCache = None, single_pass: bool = False,
+                 allow_functions: tp.Iterable[str] = None, allow_files: tp.Iterable[str] = None):
+        """With ``allow_functions`` or ``allow_files``, only the matches and the types they refer to are processed."""
         self.defines: tp.Dict[str, tp.Any] = {}
         self.typemap = self.fundamental_typemap.copy()
         self.functions: tp.Dict[str, inspect.Signature] = {}
+        self.unresolved_defines: tp.Dict[str, str] = {}
+        self.cache = cache
+        self.single_pass = single_pass
+        self.allow_functions = None if allow_functions is None else tuple(sorted(allow_functions))
+        self.allow_files = None if allow_files is None else tuple(sorted(map(os.path.abspath, allow_files)))
+        self._allowed_files: tp.Dict[str, bool] = {}
+
+        # Memo of get_type: by the identity of pygccxml type objects (which castxml shares between uses) and
+        # by type_key, so that equal types met as different objects are only worked out once
+        self.type_table: tp.Dict[tp.Hashable, CType] = {}
+        self._type_memo: tp.Dict[int, tp.Tuple[d.type_t, CType]] = {}
+        self.type_hits: tp.Counter[str] = Counter()
+        self._incomplete: tp.Dict[d.class_t, CType] = {}
+        # Types of a previous parse (see `reusing`), by declaration_key
+        self._previous: tp.Dict[tp.Hashable, CType] = {}
 
         self._createed_types = {}
 
     compiler_path = 'C:/Program Files (x86)/Microsoft Visual Studio/2019/BuildTools/VC/Tools/MSVC/14.27.29110/bin/Hostx86/x86/cl.exe'
 
-    def load_header(self, fname: str, compiler_path: str = None):
+    def xml_generator_config(self, compiler_path: str = None) -> pygccxml.parser.xml_generator_configuration_t:
         generator_path, generator_name = pygccxml.utils.find_xml_generator()
 
-        xml_generator_config = pygccxml.parser.xml_generator_configuration_t(
+        return pygccxml.parser.xml_generator_configuration_t(
             xml_generator_path=generator_path,
             xml_generator=generator_name,
             compiler_path=compiler_path if compiler_path is not None else self.compiler_path
         )
 
-        ns = pygccxml.parser.parse([fname], config=xml_generator_config)[0]
+    def spawn(self) -> 'CTyper':
+        """A fresh typer with the same configuration."""
+        return type(self)(cache=self.cache, single_pass=self.single_pass,
+                          allow_functions=self.allow_functions, allow_files=self.allow_files)
+
+    @property
+    def pruning(self) -> bool:
+        return self.allow_functions is not None or self.allow_files is not None
+
+    def allowed_file(self, fname: str) -> bool:
+        if self.allow_files is None or fname.startswith('<'):
+            return False
+        try:
+            return self._allowed_files[fname]
+        except KeyError:
+            path = os.path.abspath(fname)
+            ret = self._allowed_files[fname] = any(
+                path == allowed or path.startswith(allowed + os.sep) or fnmatch.fnmatchcase(path, allowed)
+                for allowed in self.allow_files)
+            return ret
+
+    def allowed_name(self, name: str) -> bool:
+        return self.allow_functions is not None and any(
+            fnmatch.fnmatchcase(name, pattern) for pattern in self.allow_functions)
+
+    def allowed(self, decl: d.declaration_t) -> bool:
+        """Whether ``decl`` is processed regardless of being referred to (always, unless pruning)."""
+        return not self.pruning or (decl.location is not None and self.allowed_file(decl.location.file_name)) or (
+            isinstance(decl, d.free_function_t) and self.allowed_name(decl.name))
+
+    def cache_extra(self) -> tuple:
+        """The settings beyond the xml generator configuration that the result of `load_header` depends on."""
+        return (self.single_pass,) + ((self.allow_functions, self.allow_files) if self.pruning else ())
+
+    def preprocess_command(self, fname: str, config: pygccxml.parser.xml_generator_configuration_t) -> tp.List[str]:
+        compiler_path = config.compiler_path
+        return [
+            config.xml_generator_path,
+            '--castxml-cc-msvc' if platform.system() == 'Windows' and not any(
+                compiler in compiler_path.lower() for compiler in ('mingw', 'g++', 'gcc')) else '--castxml-cc-gnu',
+            *(('(', compiler_path, *shlex.split(config.ccflags), ')') if config.ccflags else (compiler_path,)),
+            '-x', 'c++', '-E', '-dD', '-Wno-everything',
+            *(f'-I{path}' for path in config.include_paths),
+            *(f'-D{symbol}' for symbol in config.define_symbols),
+            *(f'-U{symbol}' for symbol in config.undefine_symbols),
+            *shlex.split(config.cflags),
+            fname
+        ]
+
+    def preprocess(self, fname: str, config: pygccxml.parser.xml_generator_configuration_t, out: tp.TextIO
+                   ) -> tp.Tuple[tp.Dict[str, str], tp.Set[str], tp.List[tp.Tuple[int, str, int]]]:
+        """
+        Preprocess ``fname`` once, streaming it to ``out``. Returns the macro definitions, the included files and
+        the line markers as ``(line in out, file, line in file)``.
+        """
+        macros, files, markers = {}, set(), []
+        current = fname
+        with subprocess.Popen(self.preprocess_command(fname, config), stdout=subprocess.PIPE,
+                              universal_newlines=True) as proc:
+            for lineno, line in enumerate(proc.stdout, 1):
+                if line.startswith('#define '):
+                    name, _, expr = line[8:].rstrip('\r\n').partition(' ')
+                    if self.allowed_macro(name, current):
+                        macros[name] = expr
+                    # Blanked out rather than dropped, so that the lines of out match those of the output
+                    line = '\n'
+                elif line.startswith('#undef '):
+                    macros.pop(line[7:].strip(), None)
+                    line = '\n'
+                elif (match := re.match(r'# (\d+) "([^"]*)"', line)) is not None:
+                    current = match.group(2)
+                    markers.append((lineno, current, int(match.group(1))))
+                    if not current.startswith('<'):
+                        files.add(current)
+                out.write(line)
+        if proc.returncode:
+            raise RuntimeError(f'Preprocessing {fname} failed with exit code {proc.returncode}.')
+        return macros, files, markers
+
+    @staticmethod
+    def relocate(ns: d.namespace_t, fname: str, markers: tp.Sequence[tp.Tuple[int, str, int]]):
+        """Point the declarations located in the preprocessed ``fname`` back to where its line markers say."""
+        names = {fname, os.path.realpath(fname)}
+        starts = [start for start, _, _ in markers]
+        for decl in d.make_flatten(ns):
+            if (loc := decl.location) is not None and loc.file_name in names and (
+                    i := bisect.bisect_right(starts, loc.line) - 1) >= 0:
+                start, file_name, line = markers[i]
+                decl.location = d.location_t(file_name if file_name.startswith('<') else os.path.normpath(file_name),
+                                             line + loc.line - start - 1)
+
+    def included_files(self, fname: str, compiler_path: str = None) -> tp.Set[str]:
+        """All files the preprocessor reads for ``fname``, including the ones that only define macros."""
+        with open(os.devnull, 'w') as out:
+            return self.preprocess(fname, self.xml_generator_config(compiler_path), out)[1]
+
+    def parse_header(self, fname: str, config: pygccxml.parser.xml_generator_configuration_t
+                     ) -> tp.Tuple[d.namespace_t, tp.Iterable[tp.Tuple[str, str]], tp.Set[str]]:
+        if not self.single_pass:
+            return pygccxml.parser.parse([fname], config=config)[0], (
+                self.read_located_defines(fname) if self.pruning else self.read_defines(fname)), set()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with open(tmpname := os.path.join(tmpdir, os.path.basename(fname) + '.ii'), 'w') as f:
+                macros, files, markers = self.preprocess(fname, config, f)
+            ns = pygccxml.parser.parse([tmpname], config=config)[0]
+        # castxml does not follow the line markers, so its locations are in the temporary file
+        self.relocate(ns, tmpname, markers)
+        return ns, macros.items(), files
+
+    def load_header(self, fname: str, compiler_path: str = None):
+        xml_generator_config = self.xml_generator_config(compiler_path)
+
+        if self.cache is not None and (cached := self.cache.load(fname, xml_generator_config,
+                                                                 *self.cache_extra())) is not None:
+            ns, typemap, functions, defines, unresolved_defines = cached
+            self.clear_type_table()
+            self.typemap.update(typemap)
+            self.functions.update(functions)
+            self.defines.update(defines)
+            self.unresolved_defines.update(unresolved_defines)
+            return ns
+
+        typemap, functions, defines, unresolved_defines = (
+            self.typemap.copy(), self.functions.copy(), self.defines.copy(), self.unresolved_defines.copy())
+
+        ns, macros, files = self.parse_header(fname, xml_generator_config)
         self.process_namespace(ns)
-        self.process_defines(fname)
+        self.process_macros(macros)
+
+        if self.cache is not None:
+            if not self.single_pass:
+                files = self.included_files(fname, compiler_path)
+            self.cache.store(fname, xml_generator_config, (ns, *(
+                {key: val for key, val in new.items() if key not in old or old[key] is not val}
+                for old, new in ((typemap, self.typemap), (functions, self.functions), (defines, self.defines),
+                                 (unresolved_defines, self.unresolved_defines))
+            )), *self.cache_extra(), dependencies=chain(
+                files, (decl.location.file_name for decl in ns.declarations if decl.location)))
         return ns
 
+    def invalidate_cache(self, fname: str, compiler_path: str = None):
+        if self.cache is not None:
+            self.cache.invalidate(fname, self.xml_generator_config(compiler_path), *self.cache_extra())
+
+    def _load_header_state(self, fname: str, compiler_path: str = None) -> bytes:
+        ns = self.load_header(fname, compiler_path)
+        return cache.dumps((ns, {key: val for key, val in self.typemap.items() if key not in self.fundamental_typemap},
+                            self.functions, self.defines, self.unresolved_defines))
+
+    @staticmethod
+    def _merge_into(dct: tp.Dict, other: tp.Mapping, what: str, same: tp.Callable[[tp.Any, tp.Any], bool],
+                    name: tp.Callable[[tp.Any], tp.Hashable] = lambda key: key):
+        """Add the entries of ``other`` to ``dct``, unless one with the same ``name`` is there already."""
+        keys = {name(key): key for key in dct}
+        for key, val in other.items():
+            if (existing := keys.get(name(key), _missing)) is _missing:
+                dct[key] = val
+                keys[name(key)] = key
+            elif not same(dct[existing], val):
+                warnings.warn(f'Conflicting definitions of {what} {key}: {dct[existing]!r} and {val!r}. '
+                              f'Keeping the first one.')
+
+    @staticmethod
+    def type_name(pgxtype) -> tp.Hashable:
+        """What identifies a `typemap` key across translation units: its kind and declaration string."""
+        return type(pgxtype), pgxtype.decl_string
+
     @staticmethod
-    def process_define(expr: str, defines: tp.Dict[str, tp.Any] = frozendict()) -> tp.Optional[tp.Any]:
-        if expr != '':
-            return tryall(*(lambda: eval(_expr, defines)
-                            for _expr in (expr, re.sub(r'([\d.+\-x]*)[fFdDlLuU]*', '\\1', expr))))
+    def same_signature(a: inspect.Signature, b: inspect.Signature) -> bool:
+        return a == b or list(a.parameters) == list(b.parameters) and all(cache.same_layout(x, y) for x, y in zip(
+            (a.return_annotation, *(param.annotation for param in a.parameters.values())),
+            (b.return_annotation, *(param.annotation for param in b.parameters.values()))))
+
+    def merge(self, ns: d.namespace_t, typemap: tp.Mapping, functions: tp.Mapping[str, inspect.Signature],
+              defines: tp.Mapping[str, tp.Any], unresolved_defines: tp.Mapping[str, str] = frozendict()
+              ) -> d.namespace_t:
+        self.clear_type_table()
+        self._merge_into(self.typemap, typemap, 'type', cache.same_layout, self.type_name)
+        self._merge_into(self.functions, functions, 'function', self.same_signature)
+        self._merge_into(self.defines, defines, 'define',
+                         lambda a, b: a is b if isinstance(a, type) or isinstance(b, type) else a == b)
+        for key, val in unresolved_defines.items():
+            if key not in self.defines:
+                self.unresolved_defines.setdefault(key, val)
+        return ns
+
+    def load_headers(self, fnames: tp.Iterable[str], compiler_path: str = None,
+                     jobs: int = None) -> tp.List[d.namespace_t]:
+        compiler_path = compiler_path if compiler_path is not None else self.compiler_path
+        registry = cache.make_registry(self.typemap.values())
+
+        with ProcessPoolExecutor(jobs) as pool:
+            return [self.merge(*cache.loads(state, registry)) for state in pool.map(
+                partial(CTyper._load_header_state, self.spawn()), fnames, repeat(compiler_path)
+            )]
+
+    @staticmethod
+    def process_define(expr: str, defines: tp.Mapping[str, tp.Any] = frozendict(),
+                       types: tp.Mapping[str, CType] = frozendict()) -> tp.Optional[tp.Any]:
+        return cexpr.evaluate(expr, defines, types)
+
+    @staticmethod
+    def read_defines(fname: str) -> tp.Iterator[tp.Tuple[str, str]]:
+        with subprocess.Popen(['castxml', '-E', '-dM', '-Wno-everything', fname], stdout=subprocess.PIPE,
+                              universal_newlines=True) as proc:
+            yield from ((match.group(1), match.group(2)) for match in map(
+                partial(re.match, r'^#define\s+([^\s]*)(?: |)([^\r\n]*)[\s\r\n]*$'), proc.stdout
+            ) if match)
+
+    def read_located_defines(self, fname: str) -> tp.Iterator[tp.Tuple[str, str]]:
+        """The `allowed_macro` definitions, read from the preprocessed source so that their files are known."""
+        macros, current = {}, fname
+        with subprocess.Popen(['castxml', '-E', '-dD', '-Wno-everything', fname], stdout=subprocess.PIPE,
+                              universal_newlines=True) as proc:
+            for line in proc.stdout:
+                if (match := re.match(r'^#define\s+([^\s]*)(?: |)([^\r\n]*)[\s\r\n]*$', line)) is not None:
+                    if self.allowed_macro(match.group(1), current):
+                        macros[match.group(1)] = match.group(2)
+                elif line.startswith('#undef '):
+                    macros.pop(line[7:].strip(), None)
+                elif (match := re.match(r'# \d+ "([^"]*)"', line)) is not None:
+                    current = match.group(1)
+        return iter(macros.items())
+
+    def allowed_macro(self, name: str, fname: str) -> bool:
+        return not self.pruning or self.allowed_file(fname) or self.allowed_name(name.partition('(')[0])
+
+    def macro_types(self) -> tp.Dict[str, CType]:
+        return {pgxtype.declaration.name: ctype for pgxtype, ctype in self.typemap.items()
+                if isinstance(pgxtype, d.declarated_t) and isinstance(ctype, type)}
 
     def process_defines(self, fname: str):
-        undefined = {}
-        newdefs = True
-
-        for defs in chain(
-            (((match.group(1), match.group(2))
-              for match in re.finditer(
-                r'^#define\s+([^\s]*)(?: |)([^\r\n]*)[\s\r\n]*$',
-                subprocess.run(
-                    ['castxml', '-E', '-dM', '-Wno-everything', fname], stdout=subprocess.PIPE
-                ).stdout.decode(),
-                re.MULTILINE
-            )),),
-            repeat(undefined.items())
-        ):
-            if not defs or not newdefs:
-                break
-            newdefs = False
-            for name, expr in defs:
-                try:
-                    self.defines[name] = self.process_define(expr, self.defines)
-                    undefined.pop(name, None)
-                    newdefs = True
-                except ValueError:
-                    undefined[name] = expr
-                    continue
+        self.process_macros(self.read_defines(fname))
+
+    def process_macros(self, defines: tp.Iterable[tp.Tuple[str, str]]):
+        macros = {}
+        for name, expr in defines:
+            if '(' in name:
+                self.unresolved_defines[name[:name.index('(')]] = 'function-like macro'
+            else:
+                macros[name] = expr
+
+        defines, unresolved = cexpr.evaluate_macros(macros, self.defines, self.macro_types())
+        self.defines.update(defines)
+        self.unresolved_defines.update(unresolved)
 
-        self.defines.pop('__builtins__', None)
+    def report_defines(self) -> str:
+        return '\n'.join(f'{name}: {reason}' for name, reason in self.unresolved_defines.items())
 
+    @staticmethod
+    def type_key(pgxtype: d.type_t) -> tp.Hashable:
+        """
+        The declaration string, which identifies a C type except for anonymous declarations, and the identity of
+        the declaration underneath any pointers, arrays and qualifiers, which tells those apart.
+        """
+        base = pgxtype
+        while isinstance(base, d.compound_t):
+            base = base.base
+        return pgxtype.decl_string, id(base.declaration) if isinstance(base, d.declarated_t) else None
 
     def get_type(self, pgxtype: d.type_t) -> CType:
+        if (memo := self._type_memo.get(id(pgxtype))) is not None and memo[0] is pgxtype:
+            self.type_hits['identity'] += 1
+            return memo[1]
+
+        if (ctype := self.type_table.get(key := self.type_key(pgxtype), _missing)) is not _missing:
+            self.type_hits['key'] += 1
+        else:
+            self.type_hits['miss'] += 1
+            ctype = self.type_table[key] = self.make_type(pgxtype)
+        self._type_memo[id(pgxtype)] = pgxtype, ctype
+        return ctype
+
+    def type_stats(self) -> tp.Dict[str, int]:
+        return dict(size=len(self.type_table), identity_hits=self.type_hits['identity'],
+                    key_hits=self.type_hits['key'], misses=self.type_hits['miss'], reused=self.type_hits['reused'])
+
+    def clear_type_table(self):
+        self.type_table.clear()
+        self._type_memo.clear()
+
+    @staticmethod
+    def declaration_key(decl: d.declaration_t) -> tp.Hashable:
+        """Identifies a declaration across parses: by its name, or by where it is if it has none."""
+        return type(decl), decl.name or (decl.location and (decl.location.file_name, decl.location.line))
+
+    def reusing(self, previous: 'CTyper') -> 'CTyper':
+        """Take over the types of ``previous`` for the declarations that come out the same."""
+        self._previous = {self.declaration_key(key.declaration if isinstance(key, d.declarated_t) else key): ctype
+                          for key, ctype in previous.typemap.items()
+                          if isinstance(key, (d.declarated_t, d.declaration_t)) and isinstance(ctype, type)}
+        return self
+
+    def _reused(self, decl: d.declaration_t, same: tp.Callable[[type], bool]) -> tp.Optional[CType]:
+        if (old := self._previous.get(self.declaration_key(decl))) is not None and same(old):
+            self.type_hits['reused'] += 1
+            return old
+        return None
+
+    def make_type(self, pgxtype: d.type_t) -> CType:
         if isinstance(pgxtype, d.pointer_t):
-            return ct.POINTER(self.get_type(pgxtype.base))
+            base = self.get_type(pgxtype.base)
+            # ctypes function types already are pointers
+            return base if isinstance(base, type) and issubclass(base, CFuncType) else ct.POINTER(base)
 
         elif isinstance(pgxtype, d.array_t):
             return self.get_type(pgxtype.base) * pgxtype.size
@@ -108,13 +401,21 @@ class CTyper:
             ).as_parameter
         else:
             try:
-                return self.typemap[d.remove_cv(pgxtype)]
+                return self.typemap[pgxtype := d.remove_cv(pgxtype)]
             except KeyError as e:
                 if isinstance(pgxtype, d.declarated_t):
+                    if (key := self.typemap_key(pgxtype.declaration)) in self.typemap:
+                        return self.typemap[key]
+                    if key in self._incomplete:
+                        return self._incomplete[key]
                     return self.process_declaration(pgxtype.declaration)
                 else:
                     raise e
 
+    @staticmethod
+    def typemap_key(decl: d.declaration_t) -> tp.Hashable:
+        return d.declarated_t(decl) if isinstance(decl, d.typedef_t) else decl
+
     def _in_dict(self, key, value, dct=None):
         if dct is None:
             dct = self.typemap
@@ -123,13 +424,14 @@ class CTyper:
 
     def process_typedef(self, tdef: d.typedef_t) -> CType:
         if isinstance(tdef.decl_type, d.declarated_t) and tdef.decl_type.declaration.name == tdef.name:
-            return self.typemap[tdef.decl_type.declaration]
+            return self.get_type(tdef.decl_type)
 
         ctype = self.get_type(tdef.decl_type)
-        return self._in_dict(d.declarated_t(tdef), (
-            (ctype if issubclass(ctype, CFuncType) else type(tdef.name, (ctype,), {}))
-            if isinstance(ctype, type) else ctype
-        ))
+        if isinstance(ctype, type) and not issubclass(ctype, CFuncType):
+            if (typedef := self._reused(tdef, lambda old: old.__bases__ == (ctype,))) is None:
+                typedef = type(tdef.name, (ctype,), {})
+            ctype = typedef
+        return self._in_dict(d.declarated_t(tdef), ctype)
 
     def process_variable(self, var: d.variable_t) -> tp.Tuple[str, CType]:
         return var.name, self.get_type(var.decl_type)
@@ -138,12 +440,23 @@ class CTyper:
         return self.process_class(d.class_t(name=cdef.name, class_type=d.CLASS_TYPES.STRUCT))
 
     def process_class(self, cls: d.class_t) -> CType:
-        return self._in_dict(cls, type(cls.name, (ct.Structure,),
-                                       dict(_fields_=[self.process_variable(var)
-                                                      for var in cls.variables(allow_empty=True)])))
+        # Visible to get_type while the fields are worked out, so that they can point back to it, but only added to
+        # the typemap afterwards, so that it comes after the types of its fields
+        ctype = self._incomplete[cls] = type(cls.name, (ct.Structure,), {})
+        try:
+            fields = [self.process_variable(var) for var in cls.variables(allow_empty=True)]
+        finally:
+            del self._incomplete[cls]
+        # A previous struct with fields of the same types, which thus do not lead to the new one, stands in for it
+        if (old := self._reused(cls, lambda old: old.__dict__.get('_fields_') == fields)) is not None:
+            return self._in_dict(cls, old)
+        ctype._fields_ = fields
+        return self._in_dict(cls, ctype)
 
     def process_enum(self, enum: d.enumeration_t) -> CType:
-        return self._in_dict(enum, type(enum.name, (c_enum,), dict(enum.values)))
+        if (ctype := self._reused(enum, lambda old: old.__dict__.get('__members') == dict(enum.values))) is None:
+            ctype = type(enum.name, (c_enum,), dict(enum.values))
+        return self._in_dict(enum, ctype)
 
     def process_function(self, func: d.free_function_t) -> inspect.Signature:
         return self._in_dict(func.name, CTSignature.make(
@@ -167,21 +480,69 @@ class CTyper:
 
     def process_namespace(self, ns: d.namespace_t):
         for decl in ns.declarations:
-            if not decl.location.file_name == '<builtin>' and not decl.is_artificial:
+            # Declarations already pulled in as dependencies must keep their types. When pruning, the rest is
+            # only processed when get_type comes across it.
+            if (decl.location is not None and not decl.location.file_name == '<builtin>' and not decl.is_artificial
+                    and self.allowed(decl)
+                    and self.typemap_key(decl) not in self.typemap):
                 self.process_declaration(decl)
 
 
 class DLLWrapper:
-    def __init__(self, headername: str, typer: CTyper = CTyper(), doxml_base=None):
-        self.headername = headername
+    def __init__(self, headername: tp.Union[str, tp.Sequence[str]], typer: CTyper = CTyper(), doxml_base=None,
+                 direct=False, lazy=False, lazy_types=False, buffers=False,
+                 async_functions: tp.Union[str, tp.Iterable[str], tp.Callable[[str], bool]] = (),
+                 numpy_dtypes=False, out_params: tp.Union[bool, tp.Mapping[str, tp.Collection[str]]] = False,
+                 profile=False, hoist_types=True, jobs: int = None):
+        # Several headers are loaded in parallel (in ``jobs`` worker processes) and wrapped as one
+        self.headernames = [headername] if isinstance(headername, str) else list(headername)
+        self.headername = self.headernames[0]
+        self.jobs = jobs
         self.typer = typer
-        self.ns = self.typer.load_header(headername)
+        self.ns = self.load()
+        self._dependencies = None
 
-        self.doxml = doxml_base and DoXML(doxml_base)
+        self.doxml = doxml_base and (doxml_base if isinstance(doxml_base, DoXML) else DoXML(doxml_base))
         self.textwidth = 80
         self.tabwidth = 4
 
+        # Bind the library functions themselves instead of wrapping them in Python functions
+        self.direct = direct
+        # Resolve functions (and types) on first access through the module __getattr__.
+        # Eagerly bound functions would need the types right away, so lazy types imply lazy functions.
+        self.lazy = lazy or lazy_types
+        self.lazy_types = lazy_types
+        # Let pointer and array parameters take buffer-protocol objects without copying
+        self.buffers = buffers
+        self._const_parameters = None
+        # Also emit awaitable variants of the functions matching these glob patterns (or this predicate) and
+        # of those annotated with __attribute__((annotate("async")))
+        self.async_functions = [async_functions] if isinstance(async_functions, str) else async_functions
+        self._async_names = None
+        # Give every struct a _dtype_: the NumPy structured dtype with the same layout
+        self.numpy_dtypes = numpy_dtypes
+        self._dtypes = {}
+        # Turn pointer parameters annotated with __attribute__((annotate("out"))) or documented as \param[out]
+        # (and those given explicitly as {function: [parameter, ...]}) into return values
+        self.out_params = out_params
+        self._output_parameters = None
+        self._declared_typedefs = None
+        # Give the module a __profiler__ (a profiling.Profiler) that can time its functions when enabled
+        self.profile = profile
+        # Give every pointer, array and function type a module-level name instead of spelling it out wherever it
+        # is used. Lazy types are defined independently of each other, so they keep the spelled out types.
+        self.hoist_types = hoist_types
+        # create_typename results, with the number of created types they were made with
+        self._typenames: tp.Dict[CType, tp.Tuple[int, ast.expr]] = {}
+        self._new_aliases: tp.List[ast.stmt] = []
+
     _createed_types: tp.Dict[CType, str] = {}
+    _forward_declared: tp.Dict[CType, str] = {}
+
+    enum_base = 'c_enum'
+    async_annotation = 'async'
+    async_suffix = '_async'
+    out_annotation = 'out'
 
     def format_docstring(self, docstring):
         return (
@@ -192,28 +553,108 @@ class DLLWrapper:
             + '\n' + ' ' * self.tabwidth
         )
 
+    def get_docs(self, name: str, *scopes: str) -> tp.Optional[str]:
+        return self.doxml and next(filter(None, (self.doxml.get_docs(name, scope) for scope in scopes or (None,))),
+                                   None)
+
+    def create_docstring(self, docstring: tp.Optional[str]) -> tp.List[ast.stmt]:
+        return [ast.Expr(value=ast.Constant(value=self.format_docstring(docstring)))] if docstring else []
+
     @staticmethod
     def get_typename(typ):
         return f'{typ.__module__}.{typ.__qualname__}'.replace(f'{__name__}.', '').replace('builtins.', '')
 
-    def create_typename(self, typ) -> ast.expr:
+    @property
+    def hoists_types(self) -> bool:
+        return self.hoist_types and not self.lazy_types
+
+    def create_typename(self, typ, alias=True) -> ast.expr:
+        """
+        The expression for ``typ``. Composite types are given an alias if `hoists_types`, unless ``alias`` is
+        false, in which case only the types they are made of are.
+        """
+        # The same types come up over and over, so their expressions are shared. Creating a type can turn (part of)
+        # an expression into a name, so they only hold while no more types are created.
+        cacheable = alias or not self.hoists_types
+        if cacheable and (cached := self._typenames.get(typ)) is not None and cached[0] == len(self._createed_types):
+            return cached[1]
+
         if typ in self._createed_types:
-            return ast.rvalue(self._createed_types[typ])
-        else:
+            res = ast.rvalue(self._createed_types[typ])
+        elif typ is not None and issubclass(typ, (CFuncType, CPointerType, CArrayType)):
             if issubclass(typ, CFuncType):
-                return ast.call('ctypes.CFUNCTYPE',
-                                list(map(self.create_typename, chain((typ._restype_,), typ._argtypes_))))
+                res = ast.call('ctypes.CFUNCTYPE',
+                               list(map(self.create_typename, chain((typ._restype_,), typ._argtypes_))))
             elif issubclass(typ, CPointerType):
-                return ast.call('ctypes.POINTER', [self.create_typename(typ._type_)])
-            elif issubclass(typ, CArrayType):
-                return ast.BinOp(left=ast.Constant(value=typ._length_),
-                                 op=ast.Mult(),
-                                 right=self.create_typename(typ._type_))
+                res = ast.call('ctypes.POINTER', [self.create_typename(typ._type_)])
             else:
-                return ast.rvalue(self.get_typename(typ))
+                res = ast.BinOp(left=ast.Constant(value=typ._length_), op=ast.Mult(),
+                                right=self.create_typename(typ._type_))
+            if alias and self.hoists_types:
+                return self.create_type_alias(typ, res)
+        else:
+            res = ast.rvalue(self.get_typename(typ))
+
+        if cacheable:
+            self._typenames[typ] = len(self._createed_types), res
+        return res
+
+    alias_prefix = '_ct_'
+
+    def alias_code(self, typ) -> str:
+        """A readable identifier for ``typ``, e.g. P_P_c_char for ``ctypes.POINTER(ctypes.POINTER(c_char))``."""
+        if typ in self._createed_types:
+            name = self._createed_types[typ].rpartition('.')[2]
+            return name[len(self.alias_prefix):] if name.startswith(self.alias_prefix) else name
+        elif typ is None:
+            return 'None'
+        elif issubclass(typ, CFuncType):
+            return 'F_' + '__'.join(map(self.alias_code, chain((typ._restype_,), typ._argtypes_)))
+        elif issubclass(typ, CPointerType):
+            return 'P_' + self.alias_code(typ._type_)
+        elif issubclass(typ, CArrayType):
+            return f'A{typ._length_}_' + self.alias_code(typ._type_)
+        return self.get_typename(typ).rpartition('.')[2]
+
+    def create_type_alias(self, typ: CType, expr: ast.expr) -> ast.expr:
+        """
+        Name ``typ``, spelled out as ``expr``, at module level, so that it is evaluated only once. The definition
+        is queued for `take_aliases`. Types spelled out the same (like identical function prototypes) share it.
+        """
+        name = self.create_alias(self.alias_code(typ), expr)
+        self._createed_types[typ] = name
+        return ast.rvalue(name)
+
+    def create_alias(self, code: str, expr: ast.expr) -> str:
+        """The name of the module-level alias of ``expr``, made up from ``code`` if ``expr`` has none yet."""
+        source = self.to_source(expr)
+        if (name := self._aliases.get(source)) is None:
+            if len(code) > 60:
+                code = f'{code[:2]}{hashlib.sha1(source.encode()).hexdigest()[:8]}'
+            name = base = self.alias_prefix + code
+            for i in count(2):
+                if name not in self._alias_names:
+                    break
+                name = f'{base}_{i}'
+            self._aliases[source] = name
+            self._alias_names.add(name)
+            self._new_aliases.append(ast.assign(name, expr))
+        return name
+
+    def take_aliases(self) -> tp.List[ast.stmt]:
+        """The definitions of the aliases made since the last call."""
+        aliases, self._new_aliases = self._new_aliases, []
+        return aliases
+
+    def with_aliases(self, stmts: tp.List[ast.stmt]) -> tp.List[ast.stmt]:
+        return self.take_aliases() + stmts
+
+    def alias_chunks(self) -> tp.Iterator[tp.Tuple[str, tp.List[ast.stmt]]]:
+        return ((f'alias {stmt.targets[0].id}', [stmt]) for stmt in self.take_aliases())
 
     def create_define(self, name: str, value) -> ast.ast.Assign:
-        return ast.assign(name, self.create_typename(value) if isinstance(value, type) else ast.Constant(value=value))
+        return ast.assign(name, self.create_typename(value, alias=False) if isinstance(value, type) else
+                          ast.Constant(value=value))
 
     def create_defines(self) -> tp.List[ast.stmt]:
         return [self.create_define(key, val) for key, val in self.typer.defines.items()]
@@ -224,25 +665,129 @@ class DLLWrapper:
     def create_typedef_struct(self, name: str, ctype: CType):
         return ast.ClassDef(
             name=name, bases=[ast.rvalue('ctypes.Structure')],
-            body=[
+            body=self.create_docstring(self.get_docs(name) or self.get_docs(ctype.__name__)) + [
                  ast.assign('_fields_', ast.List(
                      elts=[ast.Tuple(elts=[ast.Constant(value=fname), self.create_typename(ftype)])
                            for fname, ftype in ctype._fields_]))
             ] + [
-                 ast.AnnAssign(target=ast.lvalue(fname), annotation=self.create_typename(ftype))
-                 for fname, ftype in ctype._fields_
-            ]
+                 stmt for fname, ftype in ctype._fields_
+                 for stmt in [ast.AnnAssign(target=ast.lvalue(fname), annotation=self.create_typename(ftype)),
+                              *self.create_docstring(self.get_docs(fname, ctype.__name__, name))]
+            ] + ([ast.assign('_dtype_', dtype[1])] if self.numpy_dtypes and (dtype := self.struct_dtype(ctype)) else [])
         )
 
-    @staticmethod
-    def create_typedef_enum(name: str, ctype: CType):
+    def forward_references(self, ctype: CType) -> tp.List[CType]:
+        """The structs the fields of ``ctype`` point to (possibly ``ctype`` itself) that are not created yet."""
+        refs, todo = [], [ftype for fname, ftype, *_ in getattr(ctype, '_fields_', ())]
+        while todo:
+            if (typ := todo.pop(0)) is None or typ in self._createed_types:
+                continue
+            if issubclass(typ, CPointerType):
+                if not issubclass(target := typ._type_, ct.Structure):
+                    todo.append(target)
+                elif target not in self._createed_types and target not in refs:
+                    refs.append(target)
+            elif issubclass(typ, CArrayType):
+                todo.append(typ._type_)
+            elif issubclass(typ, CFuncType):
+                todo.extend((typ._restype_, *typ._argtypes_))
+        return refs
+
+    def create_forward_declaration(self, ctype: CType, declarer: str) -> ast.stmt:
+        self._createed_types[ctype] = ctype.__name__
+        self._forward_declared[ctype] = declarer
+        return ast.ClassDef(name=ctype.__name__, bases=[ast.rvalue('ctypes.Structure')],
+                            body=self.create_docstring(self.get_docs(ctype.__name__)) or [ast.Pass()])
+
+    def create_struct_fields(self, name: str, ctype: CType) -> tp.List[ast.stmt]:
+        """Fill in the fields of a forward-declared struct."""
+        return [ast.assign(f'{name}._fields_', ast.List(
+            elts=[ast.Tuple(elts=[ast.Constant(value=fname), self.create_typename(ftype)])
+                  for fname, ftype in ctype._fields_]))
+        ] + ([ast.assign(f'{name}._dtype_', dtype[1])]
+             if self.numpy_dtypes and (dtype := self.struct_dtype(ctype)) else [])
+
+    def create_typedef_stmts(self, name: str, ctype: CType) -> tp.List[ast.stmt]:
+        """
+        The statements defining ``ctype``. Structs its fields point to before they are defined (as in linked
+        lists) are declared ahead without fields; their fields are filled in once everything they use exists.
+        """
+        forward = self.forward_references(ctype) if isinstance(ctype, type) and issubclass(ctype, ct.Structure) else []
+        stmts = [self.create_forward_declaration(ref, name) for ref in forward]
+        if ctype in self._forward_declared:
+            return stmts + self.with_aliases(self.create_struct_fields(ctype.__name__, ctype))
+        stmts.extend(self.with_aliases([self.create_typedef(name, ctype)]))
+        if self.lazy_types and (others := [ref.__name__ for ref in forward if ref is not ctype]):
+            # Complete the structs declared here, unless that is what is under way
+            stmts.append(ast.Expr(value=ast.call('__require', [ast.Constant(value=other) for other in others])))
+        return stmts
+
+    def dtype_format(self, ctype: CType) -> tp.Optional[tp.Tuple[tp.Any, ast.expr]]:
+        """The NumPy format of a struct field of type ``ctype`` and the expression for it, if it has one."""
+        import numpy as np
+
+        if issubclass(ctype, CArrayType):
+            shape = []
+            while issubclass(ctype, CArrayType):
+                shape.append(ctype._length_)
+                ctype = ctype._type_
+            return (base := self.dtype_format(ctype)) and ((base[0], tuple(shape)), ast.Tuple(elts=[
+                base[1], ast.Tuple(elts=[ast.Constant(value=n) for n in shape])]))
+        elif issubclass(ctype, ct.Structure):
+            return next(((self._dtypes[cls], ast.rvalue(
+                f'{self._createed_types.get(ctype) or self._createed_types[cls]}._dtype_'))
+                for cls in ctype.__mro__ if cls in self._dtypes), None)
+        elif issubclass(ctype, (CPointerType, CFuncType, ct.c_void_p, ct.c_char_p, ct.c_wchar_p)):
+            dtype = np.dtype(np.uintp)
+        elif issubclass(ctype, ct._SimpleCData):
+            dtype = np.dtype(next(cls for cls in ctype.__mro__ if cls.__module__ == ct.__name__))
+        else:
+            return None
+        return dtype, ast.Constant(value=dtype.str)
+
+    def struct_dtype(self, ctype: CType) -> tp.Optional[tp.Tuple[tp.Any, ast.expr]]:
+        """The NumPy dtype with the layout of ``ctype`` and its expression, or None if NumPy cannot represent it."""
+        import numpy as np
+
+        fields = getattr(ctype, '_fields_', None)
+        if not fields or any(len(field) != 2 or not field[0] for field in fields):
+            return None
+        formats = [self.dtype_format(ftype) for fname, ftype in fields]
+        if not all(formats):
+            return None
+
+        spec = dict(names=[fname for fname, ftype in fields], formats=[fmt[0] for fmt in formats],
+                    offsets=[getattr(ctype, fname).offset for fname, ftype in fields], itemsize=ct.sizeof(ctype))
+        try:
+            dtype = np.dtype(spec)
+            for fname, ftype in fields:
+                if (size := dtype.fields[fname][0].itemsize) != ct.sizeof(ftype):
+                    raise ValueError(f'field {fname!r} has itemsize {size} but sizeof {ct.sizeof(ftype)}')
+        except (TypeError, ValueError) as e:
+            warnings.warn(f'No NumPy dtype for {ctype.__name__}: {e}')
+            return None
+
+        self._dtypes[ctype] = dtype
+        return dtype, ast.call('numpy.dtype', [ast.Dict(
+            keys=[ast.Constant(value=key) for key in spec],
+            values=[ast.List(elts=[fmt[1] for fmt in formats]) if key == 'formats' else
+                    ast.List(elts=[ast.Constant(value=v) for v in val]) if isinstance(val, list) else
+                    ast.Constant(value=val)
+                    for key, val in spec.items()])])
+
+    def create_typedef_enum(self, name: str, ctype: CType):
         return ast.ClassDef(
-            name=name, bases=[ast.rvalue('c_enum')],
-            body=[ast.assign(key, ast.Constant(value=val)) for key, val in ctype._members.items()]
+            name=name, bases=[ast.rvalue(self.enum_base)],
+            body=self.create_docstring(self.get_docs(name) or self.get_docs(ctype.__name__)) + [
+                stmt for key, val in ctype._members.items()
+                for stmt in [ast.assign(key, ast.Constant(value=val)),
+                             *self.create_docstring(self.get_docs(key, ctype.__name__, name))]
+            ] or [ast.Pass()]
         )
 
     def create_typedef_multibase(self, name: str, ctype: CType):
-        return ast.ClassDef(name=name, bases=list(map(self.create_typename, ctype.__bases__)), body=[ast.Pass()])
+        return ast.ClassDef(name=name, bases=list(map(self.create_typename, ctype.__bases__)),
+                            body=self.create_docstring(self.get_docs(name)) or [ast.Pass()])
 
     def create_typedef(self, name: str, ctype: CType) -> ast.stmt:
         if isinstance(ctype, type):
@@ -253,65 +798,455 @@ class DLLWrapper:
                     return self.create_typedef_struct(name, ctype)
                 elif issubclass(ctype, c_enum):
                     return self.create_typedef_enum(name, ctype)
+                elif issubclass(ctype, ct._SimpleCData) and self.get_typename(ctype) == name:
+                    return self.create_typedef_multibase(name, ctype)
             else:
                 return self.create_typedef_multibase(name, ctype)
 
         return self.create_define(name, ctype)
 
-    def create_typedefs(self) -> tp.List[ast.stmt]:
-        self._createed_types = {}
+    def reset_createed_types(self):
+        self._dtypes = {}
+        self._typenames = {}
+        self._aliases: tp.Dict[str, str] = {}
+        self._alias_names: tp.Set[str] = set()
+        self._new_aliases = []
+        self._forward_declared: tp.Dict[CType, str] = {}
         self._createed_types = {
             typ: self.get_typename(typ) for typ in self.typer.fundamental_typemap.values()
             if isinstance(typ, type)
         }
 
-        return [(self.create_typedef(name, ctype), self._createed_types.__setitem__(ctype, name))[0]
+    def typedefs(self) -> tp.Iterable[tp.Tuple[str, CType]]:
+        return ((name, ctype)
                 for pgxtype, ctype in self.typer.typemap.items()
                 if ctype not in ct.__dict__.values()
                 for name in [pgxtype.declaration.name if isinstance(pgxtype, d.declarated_t)else
                              pgxtype.name if isinstance(pgxtype, d.declaration_t) else
-                             pgxtype._name]]
+                             pgxtype._name])
+
+    def create_typedefs(self) -> tp.List[ast.stmt]:
+        self.reset_createed_types()
+        return [stmt for name, ctype in self.typedefs()
+                for stmt in (self.create_typedef_stmts(name, ctype), self._createed_types.__setitem__(ctype, name))[0]]
+
+    def declared_typedefs(self) -> tp.Dict[str, tp.Dict[str, str]]:
+        """
+        The typedefs the parameters (and, as ``'return'``, the result) of every function are declared with. Types
+        can have several names, e.g. function prototypes are shared by all typedefs of the same shape.
+        """
+        if self._declared_typedefs is None:
+            self._declared_typedefs = {
+                decl.name: {
+                    pname: pgxtype.declaration.name for pname, pgxtype in chain(
+                        ((arg.name, arg.decl_type) for arg in decl.required_args), (('return', decl.return_type),))
+                    for pgxtype in [d.remove_cv(pgxtype)]
+                    if isinstance(pgxtype, d.declarated_t) and isinstance(pgxtype.declaration, d.typedef_t)
+                    and self.typer.typemap.get(d.declarated_t(pgxtype.declaration)) is (
+                        sig.return_annotation if pname == 'return' else
+                        getattr(sig.parameters.get(pname), 'annotation', None))
+                }
+                for decl in self.ns.declarations
+                if isinstance(decl, d.free_function_t) and (sig := self.typer.functions.get(decl.name)) is not None
+            }
+        return self._declared_typedefs
+
+    def create_declared_typename(self, typ, declared: tp.Optional[str]) -> ast.expr:
+        """`create_typename`, but by the name of the typedef ``typ`` was ``declared`` with, once it is created."""
+        if declared is not None and typ in self._createed_types:
+            return ast.rvalue(declared)
+        return self.create_typename(typ)
 
-    def create_function(self, name: str, sig: inspect.Signature, body: tp.List[ast.stmt]) -> ast.FunctionDef:
-        return ast.FunctionDef(
+    def create_function(self, name: str, sig: inspect.Signature, body: tp.List[ast.stmt],
+                        is_async=False, declared: tp.Mapping[str, str] = frozendict()
+                        ) -> tp.Union[ast.FunctionDef, ast.AsyncFunctionDef]:
+        return (ast.AsyncFunctionDef if is_async else ast.FunctionDef)(
             name=name,
             args=ast.arguments(args=[
-                ast.arg(arg=pname, annotation=self.create_typename(param.annotation))
+                ast.arg(arg=pname, annotation=self.create_declared_typename(param.annotation, declared.get(pname)))
                 for pname, param in sig.parameters.items()
             ]),
-            returns=self.create_typename(sig.return_annotation),
-            body=body
+            returns=None if sig.return_annotation is sig.empty else self.create_declared_typename(
+                sig.return_annotation, declared.get('return')),
+            body=body, decorator_list=[]
         )
 
-    def create_functions(self, dllvar='__dll') -> tp.List[ast.stmt]:
-        return sum([
-            [
-                ast.assign(f'{cfuncname}.argtypes', ast.Tuple(
-                    elts=list(self.create_typename(param.annotation) for param in sig.parameters.values())
-                )),
-                self.create_function(name, sig, body=list(lstrip((
-                    docstring and ast.Expr(value=ast.Constant(value=self.format_docstring(docstring))),
-                    ast.Return(value=ast.call(cfuncname, [ast.rvalue(pname) for pname in sig.parameters.keys()]))
-                ), lambda x: x is None)))
+    @staticmethod
+    def has_annotation(decl: tp.Union[d.declaration_t, d.argument_t], annotation: str) -> bool:
+        """Whether ``decl`` carries ``__attribute__((annotate("<annotation>")))``."""
+        return bool(decl.attributes and re.search(rf'\bannotate\({re.escape(annotation)}\)', decl.attributes))
+
+    @staticmethod
+    def points_to_const(pgxtype: d.type_t) -> bool:
+        return isinstance(pgxtype := d.remove_cv(d.remove_alias(pgxtype)), (d.pointer_t, d.array_t)) and d.is_const(
+            pgxtype.base)
+
+    def const_parameters(self) -> tp.Dict[str, tp.Set[str]]:
+        """The pointer and array parameters of every function that point to const data."""
+        if self._const_parameters is None:
+            self._const_parameters = {
+                decl.name: {arg.name for arg in decl.required_args if self.points_to_const(arg.decl_type)}
+                for decl in self.ns.declarations if isinstance(decl, d.free_function_t)
+            }
+        return self._const_parameters
+
+    def create_argtype(self, typ: CType, const=False) -> ast.expr:
+        if self.buffers and isinstance(typ, type) and (
+                issubclass(typ, (CPointerType, CArrayType)) and not issubclass(typ._type_, CFuncType)
+                or issubclass(typ, ct.c_void_p)):
+            pointee = None if issubclass(typ, ct.c_void_p) else typ._type_
+            res = ast.call('buffer_pointer', [
+                ast.Constant(value=None) if pointee is None else self.create_typename(pointee)] + (
+                [ast.Constant(value=True)] if const else []))
+            if not self.hoists_types:
+                return res
+            return ast.rvalue(self.create_alias(f'B_{self.alias_code(pointee)}{"_const" if const else ""}', res))
+        return self.create_typename(typ)
+
+    def create_prototype(self, target: str, sig: inspect.Signature,
+                         const: tp.Collection[str] = ()) -> tp.List[ast.stmt]:
+        return [
+            ast.assign(f'{target}.argtypes', ast.Tuple(
+                elts=list(self.create_argtype(param.annotation, pname in const)
+                          for pname, param in sig.parameters.items())
+            )),
+            ast.assign(f'{target}.restype', self.create_typename(sig.return_annotation))
+        ]
+
+    def create_binding(self, name: str, sig: inspect.Signature, dllvar='__dll',
+                       docstring: str = None) -> tp.List[ast.stmt]:
+        return [ast.assign(name, ast.rvalue(f'{dllvar}.{name}'))] + self.create_prototype(
+            name, sig, self.const_parameters().get(name, ()) if self.buffers else ()) + (
+            [ast.assign(f'{name}.__doc__', ast.Constant(value=docstring))] if docstring else [])
+
+    @staticmethod
+    def is_output_type(typ: CType) -> bool:
+        return isinstance(typ, type) and issubclass(typ, CPointerType) and issubclass(
+            typ._type_, (ct._SimpleCData, ct.Structure, ct.Union))
+
+    def output_parameters(self) -> tp.Dict[str, tp.List[str]]:
+        """The out-parameters of the functions that have any, in order."""
+        if self._output_parameters is None:
+            explicit = self.out_params if isinstance(self.out_params, tp.Mapping) else {}
+            self._output_parameters = {} if not self.out_params else {
+                decl.name: outs for decl in self.ns.declarations
+                if isinstance(decl, d.free_function_t) and (sig := self.typer.functions.get(decl.name))
+                for directions in [self.doxml.get_directions(decl.name) if self.doxml else {}]
+                for outs in [[
+                    arg.name for arg in decl.required_args
+                    if self.is_output_type(sig.parameters[arg.name].annotation)
+                    and not self.points_to_const(arg.decl_type) and (
+                        self.has_annotation(arg, self.out_annotation) or directions.get(arg.name) == 'out'
+                        or arg.name in explicit.get(decl.name, ()))
+                ]] if outs
+            }
+        return self._output_parameters
+
+    def input_signature(self, name: str, sig: inspect.Signature) -> inspect.Signature:
+        """The signature of the wrapper of ``name``: without out-parameters, whose values are returned instead."""
+        if not (outs := self.output_parameters().get(name)):
+            return sig
+        return sig.replace(parameters=[param for pname, param in sig.parameters.items() if pname not in outs],
+                           return_annotation=sig.empty)
+
+    def create_output_call(self, name: str, sig: inspect.Signature, outs: tp.Collection[str],
+                           cfuncname: str) -> tp.List[ast.stmt]:
+        """Call ``cfuncname`` with scratch objects for the out-parameters and return their values after the result."""
+        simple = [pname for pname in outs if issubclass(sig.parameters[pname].annotation._type_, ct._SimpleCData)]
+        results = ([] if sig.return_annotation is None else [ast.rvalue('__ret')]) + [
+            ast.rvalue(f'{pname}.value' if pname in simple else pname) for pname in outs]
+        return ([ast.Assign(targets=[ast.Tuple(elts=[ast.lvalue(pname) for pname in simple], ctx=ast.Store())],
+                            value=ast.call('__out', [ast.Constant(value=name)] + [
+                                self.create_typename(sig.parameters[pname].annotation._type_)
+                                for pname in simple]))] if simple else []) + [
+            ast.assign(pname, ast.Call(func=self.create_typename(sig.parameters[pname].annotation._type_), args=[]))
+            for pname in outs if pname not in simple
+        ] + [
+            ast.Expr(value=call) if sig.return_annotation is None else ast.assign('__ret', call)
+            for call in [ast.call(cfuncname, [ast.rvalue(pname) for pname in sig.parameters.keys()])]
+        ] + [ast.Return(value=results[0] if len(results) == 1 else ast.Tuple(elts=results))]
+
+    def create_function_stmts(self, name: str, sig: inspect.Signature, dllvar='__dll') -> tp.List[ast.stmt]:
+        cfuncname = f'{dllvar}.{name}'
+        docstring = self.get_docs(name)
+
+        if outs := self.output_parameters().get(name):
+            return self.create_prototype(cfuncname, sig,
+                                         self.const_parameters().get(name, ()) if self.buffers else ()) + [
+                self.create_function(name, self.input_signature(name, sig), body=self.create_docstring(docstring)
+                                     + self.create_output_call(name, sig, outs, cfuncname),
+                                     declared=self.declared_typedefs().get(name, {}))
             ]
-            for name, sig in self.typer.functions.items()
-            for cfuncname in [f'{dllvar}.{name}']
-            for docstring in [self.doxml and self.doxml.get_docs(name)]
-        ], [])
 
-    def create(self, dllname=None, dllvar='__dll'):
+        if self.direct:
+            return self.create_binding(name, sig, dllvar, docstring)
+
+        return self.create_prototype(cfuncname, sig,
+                                     self.const_parameters().get(name, ()) if self.buffers else ()) + [
+            self.create_function(name, sig, body=self.create_docstring(docstring) + [
+                ast.Return(value=ast.call(cfuncname, [ast.rvalue(pname) for pname in sig.parameters.keys()]))
+            ], declared=self.declared_typedefs().get(name, {}))
+        ]
+
+    def async_names(self) -> tp.List[str]:
+        """The functions that get an awaitable variant."""
+        if self._async_names is None:
+            annotated = {decl.name for decl in self.ns.declarations
+                         if isinstance(decl, d.free_function_t) and self.has_annotation(decl, self.async_annotation)}
+            self._async_names = [
+                name for name in self.typer.functions
+                if name in annotated or (self.async_functions(name) if callable(self.async_functions) else
+                                         any(fnmatch.fnmatchcase(name, pat) for pat in self.async_functions))
+            ]
+        return self._async_names
+
+    def create_async_function_stmts(self, name: str, sig: inspect.Signature, dllvar='__dll') -> tp.List[ast.stmt]:
+        """
+        ``async def <name>_async(...)``, which runs the library function (or its wrapper, if it has out-parameters)
+        through `cutils.async_caller`.
+        """
+        sig = self.input_signature(name, sig)
+        return [self.create_function(name + self.async_suffix, sig, is_async=True, body=self.create_docstring(
+            self.get_docs(name)) + [ast.Return(value=ast.Await(value=ast.call('async_caller', [
+                ast.rvalue(name if name in self.output_parameters() else f'{dllvar}.{name}'),
+                *(ast.rvalue(pname) for pname in sig.parameters.keys())])))],
+            declared=self.declared_typedefs().get(name, {}))]
+
+    def create_functions(self, dllvar='__dll') -> tp.List[ast.stmt]:
+        return sum([self.with_aliases(self.create_function_stmts(name, sig, dllvar))
+                    for name, sig in self.typer.functions.items()], [])
+
+    lazy_preamble = textwrap.dedent('''
+        __factories = {}
+
+
+        def __lazy(name, source):
+            __factories[name] = source
+
+
+        def __require(*names):
+            for name in names:
+                if name in __factories:
+                    __getattr__(name)
+
+
+        def __getattr__(name):
+            try:
+                source = __factories.pop(name)
+            except KeyError:
+                raise AttributeError(f'module {__name__!r} has no attribute {name!r}') from None
+            try:
+                exec(source, globals())
+            except BaseException:
+                __factories[name] = source
+                raise
+            return globals()[name]
+
+
+        def __dir__():
+            return sorted(set(globals()) | set(__factories))
+    ''')
+
+    def create_lazy(self, name: str, stmts: tp.List[ast.stmt], lazy_names: tp.Collection[str],
+                    requires: tp.Iterable[str] = ()) -> tp.List[ast.stmt]:
+        """Defer the statements defining ``name``, as source, until the module ``__getattr__`` is asked for it."""
+        defined = {name}.union(stmt.name for stmt in stmts if isinstance(stmt, ast.ast.ClassDef))
+        requires = sorted({node.id for stmt in stmts for node in ast.ast.walk(stmt)
+                           if isinstance(node, ast.ast.Name) and isinstance(node.ctx, ast.Load)
+                           and node.id in lazy_names}.union(requires) - defined)
+        return [ast.Expr(value=ast.call('__lazy', [ast.Constant(value=name), ast.Constant(value=self.to_source(
+            ast.Module(body=([ast.Expr(value=ast.call('__require', [ast.Constant(value=r) for r in requires]))]
+                             if requires else []) + stmts)
+        ))]))]
+
+    def create_chunks(self, dllvar='__dll') -> tp.Iterator[tp.Tuple[str, tp.List[ast.stmt]]]:
+        self.reset_createed_types()
+        yield from ((f'define {name}', self.with_aliases([self.create_define(name, value)]))
+                    for name, value in self.typer.defines.items())
+
+        lazy_names = {name for name, ctype in self.typedefs()} if self.lazy_types else set()
+
+        for name, ctype in self.typedefs():
+            stmts = self.create_typedef_stmts(name, ctype)
+            yield f'typedef {name}', self.create_lazy(
+                name, stmts, lazy_names, [declarer] if (declarer := self._forward_declared.get(ctype)) else ()
+            ) if self.lazy_types else stmts
+            self._createed_types[ctype] = name
+
+        # Aliases come first, on their own, since lazy functions share them
+        for name, sig in self.typer.functions.items():
+            stmts = self.create_function_stmts(name, sig, dllvar)
+            yield from self.alias_chunks()
+            yield f'function {name}', self.create_lazy(name, stmts, lazy_names) if self.lazy else stmts
+
+        # The prototype is set up by the synchronous function's statements
+        for name in self.async_names():
+            stmts = self.create_async_function_stmts(name, self.typer.functions[name], dllvar)
+            yield from self.alias_chunks()
+            aname = name + self.async_suffix
+            yield f'function {aname}', self.create_lazy(aname, stmts, lazy_names, [name]) if self.lazy else stmts
+
+    def create_preamble(self, dllname=None, dllvar='__dll') -> tp.List[ast.stmt]:
         dllname = dllname or os.path.splitext(self.headername)[0]
-        return ast.Module(body=[
+        return [
             ast.Import(names=[ast.alias(name='ctypes')]),
-            ast.ImportFrom(module=f'{cutils.__name__}', names=[ast.alias(name='c_enum')]),
-            ast.assign('__dll',
-                       ast.call('ctypes.cdll.LoadLibrary', [ast.Constant(value=dllname)]))
-        ] + self.create_defines() + self.create_typedefs() + self.create_functions(dllvar=dllvar))
+            *([ast.Import(names=[ast.alias(name='numpy')])] if self.numpy_dtypes else []),
+            ast.ImportFrom(module=f'{cutils.__name__}', names=[ast.alias(name='c_enum')] + (
+                [ast.alias(name='buffer_pointer')] if self.buffers else []) + (
+                [ast.alias(name='async_caller')] if self.async_names() else []) + (
+                [ast.alias(name='OutBuffers')] if self.output_parameters() else [])),
+            ast.assign(dllvar,
+                       ast.call('ctypes.cdll.LoadLibrary', [ast.Constant(value=dllname)])),
+            *([ast.assign('__out', ast.call('OutBuffers', []))] if self.output_parameters() else []),
+            *([ast.ImportFrom(module=profiling.__name__, names=[ast.alias(name='Profiler')]),
+               ast.assign('__profiler__', ast.call('Profiler', [
+                   ast.rvalue(dllvar), ast.call('globals', []),
+                   ast.Tuple(elts=[ast.Constant(value=name) for name in self.typer.functions])]))]
+              if self.profile else [])
+        ] + (ast.ast.parse(self.lazy_preamble).body if self.lazy or self.lazy_types else [])
+
+    def create(self, dllname=None, dllvar='__dll'):
+        return ast.Module(body=self.create_preamble(dllname, dllvar)
+                          + sum((stmts for key, stmts in self.create_chunks(dllvar)), []))
+
+    def iter_statements(self, dllname=None, dllvar='__dll') -> tp.Iterator[ast.stmt]:
+        """The statements of `create`, built one declaration at a time."""
+        yield from self.create_preamble(dllname, dllvar)
+        for key, stmts in self.create_chunks(dllvar):
+            yield from stmts
+
+    source_emitter = emitter.SourceEmitter
+    # Part of the fingerprints of print_incremental, so that sources printed differently are not reused
+    source_format = 'emitter-1'
+    to_source = staticmethod(emitter.to_source)
+    separator = staticmethod(emitter.SourceEmitter.separator)
 
     def print(self, file: tp.Union[str, tp.TextIO], dllname=None, dllvar='__dll'):
         mod = self.create(dllname, dllvar)
-
-        # Ugly hack
-        with patch(source_repr.split_lines, '__defaults__', (65535,)):
-            (open(file, 'w') if isinstance(file, str) else file).write(to_source(mod))
+        f = open(file, 'w') if isinstance(file, str) else file
+        try:
+            self.source_emitter(f.write).emit(mod)
+        finally:
+            if f is not file:
+                f.close()
         return mod
+
+    def print_stream(self, file: tp.Union[str, tp.TextIO], dllname=None, dllvar='__dll'):
+        """
+        Like `print` but writes every statement as soon as it is built, so that the whole module never has to be
+        in memory at once.
+        """
+        f = open(file, 'w') if isinstance(file, str) else file
+        try:
+            emit = self.source_emitter(f.write).emit
+            for stmt in self.iter_statements(dllname, dllvar):
+                emit(stmt)
+        finally:
+            if f is not file:
+                f.close()
+
+    def print_bytecode(self, file: str, dllname=None, dllvar='__dll', source=True,
+                       invalidation_mode: py_compile.PycInvalidationMode = None) -> str:
+        """Write the module (unless not ``source``) and its bytecode, and return the path of the bytecode."""
+        # Compiled from the printed source (not the AST), so that line numbers in tracebacks match it
+        src = self.to_source(self.create(dllname, dllvar)).encode()
+        code = compile(src, file, 'exec', dont_inherit=True)
+
+        # The header of a .pyc (PEP 552): flags, then the mtime and size of the source or, with flags, its hash
+        if not source:
+            cfile = os.path.splitext(file)[0] + '.pyc'
+            header = uint32(0) + uint32(0) + uint32(0)
+        else:
+            with open(file, 'wb') as f:
+                f.write(src)
+
+            cfile = importlib.util.cache_from_source(file)
+            if invalidation_mode is None:
+                # As py_compile does: reproducible builds get hashes
+                invalidation_mode = (py_compile.PycInvalidationMode.CHECKED_HASH if os.environ.get('SOURCE_DATE_EPOCH')
+                                     else py_compile.PycInvalidationMode.TIMESTAMP)
+            if invalidation_mode == py_compile.PycInvalidationMode.TIMESTAMP:
+                st = os.stat(file)
+                header = uint32(0) + uint32(int(st.st_mtime)) + uint32(st.st_size)
+            else:
+                header = uint32(0b01 | (0b10 if invalidation_mode == py_compile.PycInvalidationMode.CHECKED_HASH
+                                        else 0)) + importlib.util.source_hash(src)
+
+        os.makedirs(os.path.dirname(cfile) or '.', exist_ok=True)
+        with open(cfile + '.tmp', 'wb') as f:
+            f.write(importlib.util.MAGIC_NUMBER + header + marshal.dumps(code))
+        os.replace(cfile + '.tmp', cfile)
+        return cfile
+
+    @staticmethod
+    def fingerprints_file(file: str) -> str:
+        return f'{file}.fingerprints.json'
+
+    def print_incremental(self, file: str, dllname=None, dllvar='__dll',
+                          fingerprints: tp.Dict[str, tp.Tuple[str, str]] = None) -> tp.Dict[str, tp.Tuple[str, str]]:
+        """Like `print` but reuses the source recorded next to ``file`` for the statements that did not change."""
+        if fingerprints is None:
+            try:
+                with open(self.fingerprints_file(file)) as f:
+                    fingerprints = json.load(f)
+            except (OSError, ValueError):
+                fingerprints = {}
+
+        newprints = {}
+        with open(file, 'w') as f:
+            preamble = self.create_preamble(dllname, dllvar)
+            f.write(self.to_source(ast.Module(body=preamble)))
+            prev = preamble[-1]
+            for key, stmts in self.create_chunks(dllvar):
+                mod = ast.Module(body=stmts)
+                fingerprint = hashlib.sha1(f'{self.source_format}:{ast.ast.dump(mod)}'.encode()).hexdigest()
+                newprints[key] = (fingerprint, fingerprints[key][1] if fingerprints.get(key, (None,))[0] == fingerprint
+                                               else self.to_source(mod))
+
+                f.write(self.separator(prev, stmts[0]) + newprints[key][1])
+                prev = stmts[-1]
+
+        with open(self.fingerprints_file(file), 'w') as f:
+            json.dump(newprints, f)
+        return newprints
+
+    def load(self) -> d.namespace_t:
+        if len(self.headernames) == 1:
+            return self.typer.load_header(self.headername)
+        return d.namespace_t('::', list(chain.from_iterable(
+            ns.declarations for ns in self.typer.load_headers(self.headernames, jobs=self.jobs))))
+
+    def dependencies(self) -> tp.Set[str]:
+        """The headers and all files they include, as listed by the preprocessor."""
+        if self._dependencies is None:
+            self._dependencies = set(self.headernames).union(*map(self.typer.included_files, self.headernames), {
+                decl.location.file_name for decl in self.ns.declarations
+                if decl.location and os.path.isfile(decl.location.file_name)})
+        return self._dependencies
+
+    def reload(self):
+        self.typer = self.typer.spawn().reusing(self.typer)
+        self.ns = self.load()
+        self._const_parameters = None
+        self._async_names = None
+        self._output_parameters = None
+        self._declared_typedefs = None
+        self._dependencies = None
+
+    def watch(self, file: str, dllname=None, dllvar='__dll', interval: float = 0.2):
+        """Regenerate ``file`` whenever a header or a file it includes changes, reparsing the headers in full."""
+        fingerprints = self.print_incremental(file, dllname, dllvar)
+        mtimes = {}
+        while True:
+            try:
+                newtimes = {fname: os.stat(fname).st_mtime_ns for fname in self.dependencies()}
+            except FileNotFoundError:
+                newtimes = mtimes
+            if mtimes and newtimes != mtimes:
+                try:
+                    self.reload()
+                    fingerprints = self.print_incremental(file, dllname, dllvar, fingerprints)
+                except Exception as e:
+                    warnings.warn(f'Regenerating {file} failed: {e}')
+            mtimes = newtimes
+            time.sleep(interval)
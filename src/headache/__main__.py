@@ -0,0 +1,80 @@
+import argparse
+import py_compile
+
+from . import CTyper, DLLWrapper, HeaderCache
+from .cffigen import CFFIWrapper
+from .doxml import DoXML
+
+
+parser = argparse.ArgumentParser(prog='headache', description='Generate a ctypes wrapper module for a C header.')
+parser.add_argument('header', nargs='+', help='the header(s) to wrap into one module')
+parser.add_argument('-o', '--output', required=True)
+parser.add_argument('--dll', help='name of the library to load (default: the header name without extension)')
+parser.add_argument('--dllvar', default='__dll')
+parser.add_argument('--compiler-path', help='compiler castxml should emulate')
+parser.add_argument('--jobs', type=int, help='worker processes for parsing several headers (default: one per CPU)')
+parser.add_argument('--doxml', help='directory with the Doxygen XML output')
+parser.add_argument('--doxml-stream', action='store_true',
+                    help='parse the Doxygen XML file by file and cache the extracted docs')
+parser.add_argument('--cache', nargs='?', const='', help='cache parsed headers (optionally in the given directory)')
+parser.add_argument('--allow-function', action='append', metavar='PATTERN',
+                    help='only wrap the matching functions, the declarations in --allow-file and what they use')
+parser.add_argument('--allow-file', action='append', metavar='PATH',
+                    help='only wrap the declarations and macros in these files or directories, '
+                         'the --allow-function functions and what they use')
+parser.add_argument('--cffi', metavar='BUILD_SCRIPT',
+                    help='generate a module for a cffi extension instead, and its build script')
+parser.add_argument('--direct', action='store_true', help='bind the library functions without Python wrappers')
+parser.add_argument('--buffers', action='store_true',
+                    help='let pointer parameters take NumPy arrays and other buffers without copying')
+parser.add_argument('--out-params', action='store_true',
+                    help='return the values of out-parameters (annotated or documented as [out]) instead')
+parser.add_argument('--profile', action='store_true',
+                    help='let the functions be profiled at run time through the module __profiler__')
+parser.add_argument('--numpy', action='store_true', help='give every struct a NumPy structured dtype')
+parser.add_argument('--async', dest='async_functions', metavar='PATTERN', action='append', default=[],
+                    help='also emit awaitable <name>_async variants of the matching functions (repeatable)')
+parser.add_argument('--lazy', action='store_true', help='resolve functions on first access')
+parser.add_argument('--lazy-types', action='store_true', help='also create types on first access')
+parser.add_argument('--bytecode', nargs='?', const='', choices=('', 'timestamp', 'checked-hash', 'unchecked-hash'),
+                    help='also write precompiled bytecode (optionally with the given invalidation mode)')
+parser.add_argument('--no-source', action='store_true', help='only write a sourceless .pyc (implies --bytecode)')
+parser.add_argument('--incremental', action='store_true',
+                    help='reuse the recorded source of the declarations that did not change')
+parser.add_argument('--watch', action='store_true',
+                    help='regenerate whenever the header or a file it includes changes (reparsing it in full)')
+args = parser.parse_args()
+
+if args.cffi and (unsupported := [option for option, value in (
+        ('--direct', args.direct), ('--buffers', args.buffers), ('--out-params', args.out_params),
+        ('--async', args.async_functions), ('--profile', args.profile), ('--numpy', args.numpy),
+        ('--lazy', args.lazy), ('--lazy-types', args.lazy_types)) if value]):
+    parser.error(f'--cffi cannot be combined with {", ".join(unsupported)}')
+
+if args.compiler_path is not None:
+    CTyper.compiler_path = args.compiler_path
+
+wrapper = (CFFIWrapper if args.cffi else DLLWrapper)(
+    args.header, CTyper(cache=None if args.cache is None else HeaderCache(args.cache or None),
+                        allow_functions=args.allow_function, allow_files=args.allow_file),
+    doxml_base=args.doxml and (DoXML(args.doxml, streaming=True, cache_dir=args.cache or None)
+                               if args.doxml_stream else args.doxml),
+    direct=args.direct, lazy=args.lazy, lazy_types=args.lazy_types, buffers=args.buffers,
+    async_functions=args.async_functions, numpy_dtypes=args.numpy, out_params=args.out_params,
+    profile=args.profile, jobs=args.jobs)
+
+if args.cffi:
+    wrapper.print_build_script(args.cffi, args.dll)
+
+if args.watch:
+    try:
+        wrapper.watch(args.output, args.dll, args.dllvar)
+    except KeyboardInterrupt:
+        pass
+elif args.bytecode is not None or args.no_source:
+    wrapper.print_bytecode(args.output, args.dll, args.dllvar, source=not args.no_source, invalidation_mode=(
+        py_compile.PycInvalidationMode[args.bytecode.upper().replace('-', '_')] if args.bytecode else None))
+elif args.incremental:
+    wrapper.print_incremental(args.output, args.dll, args.dllvar)
+else:
+    wrapper.print_stream(args.output, args.dll, args.dllvar)
@@ -0,0 +1,288 @@
+import _ctypes
+import ctypes as ct
+import hashlib
+import io
+import operator
+import os
+import pickle
+import subprocess
+import sys
+import typing as tp
+import warnings
+from functools import lru_cache, partial, reduce
+
+import pygccxml
+
+
+_ctype_metas = tuple({type(t) for t in (ct.Structure, ct.Union, ct.c_int, ct.POINTER(ct.c_int),
+                                        ct.c_int * 1, ct.CFUNCTYPE(None))})
+
+_bare_bases = (_ctypes._Pointer, _ctypes.Array, _ctypes.CFuncPtr)
+_layout_attributes = ('_fields_', '_pack_', '_anonymous_', '_argtypes_', '_restype_', '_flags_')
+
+
+def _is_importable(cls: type) -> bool:
+    try:
+        return reduce(getattr, cls.__qualname__.split('.'), sys.modules[cls.__module__]) is cls
+    except (KeyError, AttributeError):
+        return False
+
+
+def _freeze(value):
+    return (tuple(map(_freeze, value)) if isinstance(value, (list, tuple)) else
+            tuple((key, _freeze(val)) for key, val in value.items()) if isinstance(value, dict) else
+            value)
+
+
+def ctype_key(name: str, bases: tp.Tuple[type, ...], namespace: tp.Dict[str, tp.Any]) -> tp.Hashable:
+    return name, bases, _freeze(namespace)
+
+
+def make_ctype(name: str, bases: tp.Tuple[type, ...], namespace: tp.Dict[str, tp.Any],
+               registry: tp.Dict[tp.Hashable, type] = None) -> type:
+    if registry is None:
+        return type(bases[0])(name, bases, namespace)
+
+    key = ctype_key(name, bases, namespace)
+    if key not in registry:
+        registry[key] = type(bases[0])(name, bases, namespace)
+    return registry[key]
+
+
+def make_incomplete_ctype(name: str, bases: tp.Tuple[type, ...], namespace: tp.Dict[str, tp.Any],
+                          key: tp.Hashable = None, registry: tp.Dict[tp.Hashable, type] = None) -> type:
+    """A struct whose fields are only set by `_set_fields` once they have been unpickled, since they refer to it."""
+    if registry is None or key is None:
+        return type(bases[0])(name, bases, namespace)
+    if key not in registry:
+        registry[key] = type(bases[0])(name, bases, namespace)
+    return registry[key]
+
+
+def _set_fields(cls: type, state: tp.Dict[str, tp.Any]) -> type:
+    # Structs taken from the registry already have the same fields
+    if '_fields_' not in cls.__dict__:
+        cls._fields_ = state['_fields_']
+    return cls
+
+
+def _components(cls: type) -> tp.Iterator[type]:
+    if issubclass(cls, (ct.Structure, ct.Union)):
+        yield from (field[1] for field in cls.__dict__.get('_fields_', ()))
+    elif issubclass(cls, _ctypes.CFuncPtr):
+        yield from (cls._restype_, *cls._argtypes_) if hasattr(cls, '_argtypes_') else ()
+    elif issubclass(cls, (_ctypes._Pointer, _ctypes.Array)) and isinstance(getattr(cls, '_type_', None), type):
+        yield cls._type_
+
+
+def refers_to(cls: type, target: type, seen: tp.Set[type] = None) -> bool:
+    """Whether ``target`` can be reached from ``cls`` through fields, pointers, arrays and function prototypes."""
+    seen = set() if seen is None else seen
+    for component in _components(cls):
+        if component is target or (isinstance(component, type) and component not in seen
+                                    and not seen.add(component) and refers_to(component, target, seen)):
+            return True
+    return False
+
+
+def layout(cls: type) -> tp.Dict[str, tp.Any]:
+    return dict({key: cls.__dict__[key] for key in _layout_attributes if key in cls.__dict__},
+                __module__=cls.__module__, **cls.__dict__.get('__members', {}))
+
+
+def is_dynamic_ctype(obj) -> bool:
+    return isinstance(obj, _ctype_metas) and not _is_importable(obj)
+
+
+def structure_key(cls) -> tp.Hashable:
+    """The layout of ``cls`` and of everything it refers to, spelled out: equal for identically laid out types."""
+    # References back to a type being spelled out count the levels up to it, so the keys of types that lead back
+    # to none above them are the same wherever they are met
+    memo: tp.Dict[type, tp.Hashable] = {}
+
+    def key(obj, stack: tp.Tuple[type, ...]) -> tp.Tuple[tp.Hashable, int]:
+        """The key of ``obj`` and the highest level of ``stack`` it leads back to."""
+        if isinstance(obj, (list, tuple)):
+            keys = [key(item, stack) for item in obj]
+            return tuple(k for k, _ in keys), min((level for _, level in keys), default=len(stack))
+        elif not is_dynamic_ctype(obj):
+            return obj, len(stack)
+        elif obj in memo:
+            return memo[obj], len(stack)
+        elif obj in stack:
+            return ('recursion', len(stack) - stack.index(obj)), stack.index(obj)
+
+        inner = stack + (obj,)
+        if obj.__bases__ in ((_ctypes._Pointer,), (_ctypes.Array,)):
+            res, level = key([obj._type_, getattr(obj, '_length_', None)], inner)
+            res = (obj.__bases__, *res)
+        else:
+            res, level = key([obj.__bases__, list(layout(obj).items())], inner)
+            res = (obj.__name__, *res)
+        if level >= len(stack):
+            memo[obj] = res
+        return res, min(level, len(stack))
+
+    return key(cls, ())[0]
+
+
+def same_layout(a, b) -> bool:
+    return a is b or structure_key(a) == structure_key(b)
+
+
+def reduce_ctype(cls: type) -> tuple:
+    if cls.__bases__ == (_ctypes._Pointer,):
+        return ct.POINTER, (cls._type_,)
+    elif cls.__bases__ == (_ctypes.Array,):
+        return operator.mul, (cls._type_, cls._length_)
+    elif cls.__bases__ == (_ctypes.CFuncPtr,) and cls._flags_ == ct._FUNCFLAG_CDECL:
+        return ct.CFUNCTYPE, (cls._restype_, *cls._argtypes_)
+    elif issubclass(cls, (ct.Structure, ct.Union)) and refers_to(cls, cls):
+        namespace = layout(cls)
+        fields = namespace.pop('_fields_')
+        return (make_incomplete_ctype, (cls.__name__, cls.__bases__, namespace, structure_key(cls)),
+                dict(_fields_=fields),
+                None, None, _set_fields)
+    else:
+        return make_ctype, (cls.__name__, cls.__bases__, layout(cls))
+
+
+class CTypePickler(pickle.Pickler):
+    """Pickles the ctypes classes that `CTyper` creates on the fly by re-creating them from their layout."""
+
+    def reducer_override(self, obj):
+        if is_dynamic_ctype(obj):
+            return reduce_ctype(obj)
+        return NotImplemented
+
+
+class CTypeUnpickler(pickle.Unpickler):
+    """Re-creates pickled ctypes classes, reusing the ones with identical layout already in `registry`."""
+
+    def __init__(self, file, registry: tp.Dict[tp.Hashable, type] = None, **kwargs):
+        super().__init__(file, **kwargs)
+        self.registry = registry
+
+    def find_class(self, module, name):
+        if module == __name__ and name in (make_ctype.__name__, make_incomplete_ctype.__name__) and (
+                self.registry is not None):
+            return partial(super().find_class(module, name), registry=self.registry)
+        return super().find_class(module, name)
+
+
+def dumps(obj) -> bytes:
+    buf = io.BytesIO()
+    CTypePickler(buf, protocol=pickle.HIGHEST_PROTOCOL).dump(obj)
+    return buf.getvalue()
+
+
+def loads(data: bytes, registry: tp.Dict[tp.Hashable, type] = None):
+    return CTypeUnpickler(io.BytesIO(data), registry).load()
+
+
+def make_registry(ctypes: tp.Iterable) -> tp.Dict[tp.Hashable, type]:
+    return {structure_key(cls) if issubclass(cls, (ct.Structure, ct.Union)) and refers_to(cls, cls) else
+            ctype_key(cls.__name__, cls.__bases__, layout(cls)): cls
+            for cls in ctypes if is_dynamic_ctype(cls) and cls.__bases__[0] not in _bare_bases}
+
+
+@lru_cache(maxsize=None)
+def xml_generator_version(generator_path: str) -> str:
+    try:
+        return subprocess.run([generator_path, '--version'],
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout.decode()
+    except OSError:
+        return ''
+
+
+def default_directory() -> str:
+    return os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'headache')
+
+
+def file_digest(fname: str) -> str:
+    with open(fname, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class HeaderCache:
+    """Content-addressed on-disk cache of `CTyper.load_header` results, evicting the least recently used entries."""
+
+    config_attributes = ('xml_generator', 'xml_generator_path', 'compiler', 'compiler_path', 'cflags', 'ccflags',
+                         'include_paths', 'define_symbols', 'undefine_symbols')
+    suffix = '.pickle'
+    version = 5
+
+    def __init__(self, directory: str = None, max_size: int = 2**30):
+        self.directory = directory or default_directory()
+        self.max_size = max_size
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, fname: str, config: pygccxml.parser.xml_generator_configuration_t, *extra) -> str:
+        h = hashlib.sha1(file_digest(fname).encode())
+        for attr in self.config_attributes:
+            h.update(repr(getattr(config, attr, None)).encode())
+        h.update(repr(extra).encode())
+        h.update(pygccxml.__version__.encode())
+        h.update(xml_generator_version(config.xml_generator_path).encode())
+        h.update(str(self.version).encode())
+        return h.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.suffix)
+
+    def entries(self) -> tp.List[os.DirEntry]:
+        return [entry for entry in os.scandir(self.directory) if entry.name.endswith(self.suffix)]
+
+    @staticmethod
+    def dependencies_valid(dependencies: tp.Mapping[str, str]) -> bool:
+        try:
+            return all(file_digest(fname) == digest for fname, digest in dependencies.items())
+        except OSError:
+            return False
+
+    def load(self, fname: str, config: pygccxml.parser.xml_generator_configuration_t,
+             *extra) -> tp.Optional[tp.Any]:
+        path = self.path(self.key(fname, config, *extra))
+        try:
+            with open(path, 'rb') as f:
+                if not self.dependencies_valid(pickle.load(f)):
+                    return None
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # Whatever is wrong with an entry, it is a miss, and dropped so that it is rewritten
+            warnings.warn(f'Ignoring the unreadable cache entry for {fname}: {e!r}')
+            self.invalidate(fname, config, *extra)
+            return None
+
+        os.utime(path)
+        return value
+
+    def store(self, fname: str, config: pygccxml.parser.xml_generator_configuration_t, value, *extra,
+              dependencies: tp.Iterable[str] = ()):
+        path = self.path(self.key(fname, config, *extra))
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump({dep: file_digest(dep) for dep in set(dependencies) if os.path.isfile(dep)}, f)
+            f.write(dumps(value))
+        os.replace(path + '.tmp', path)
+        self.evict()
+
+    def evict(self, max_size: int = None):
+        max_size = self.max_size if max_size is None else max_size
+        entries = sorted(self.entries(), key=lambda entry: entry.stat().st_mtime)
+        size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if size <= max_size:
+                break
+            size -= entry.stat().st_size
+            os.remove(entry.path)
+
+    def invalidate(self, fname: str, config: pygccxml.parser.xml_generator_configuration_t, *extra):
+        try:
+            os.remove(self.path(self.key(fname, config, *extra)))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        self.evict(0)
@@ -0,0 +1,450 @@
+import ctypes as ct
+import operator
+import re
+import typing as tp
+from collections import deque
+
+from .cutils import CType
+
+
+class CExprError(ValueError):
+    pass
+
+
+Node = tp.Tuple
+# The width in bits and signedness of an integer value, after the integer promotions
+IntType = tp.Tuple[int, bool]
+
+
+_token_re = re.compile(r'''\s*(?:
+    (?P<float>(?:\d+\.\d*|\.\d+)(?:[eE][+-]?\d+)?[fFlL]?|\d+[eE][+-]?\d+[fFlL]?
+              |0[xX](?:[\da-fA-F]+\.?[\da-fA-F]*|\.[\da-fA-F]+)[pP][+-]?\d+[fFlL]?)
+    |(?P<int>(?:0[xX][\da-fA-F]+|0[bB][01]+|\d+)(?:[uU](?:ll|LL|l|L)?|(?:ll|LL|l|L)[uU]?)?)
+    |(?P<char>[LuU]?'(?:[^'\\]|\\.)*')
+    |(?P<string>(?:u8|[LuU])?"(?:[^"\\]|\\.)*")
+    |(?P<name>[A-Za-z_]\w*)
+    |(?P<op><<|>>|<=|>=|==|!=|&&|\|\||[-+*/%<>&|^~!?:(),])
+)''', re.VERBOSE)
+
+
+def tokenize(expr: str) -> tp.List[tp.Tuple[str, str]]:
+    tokens, pos, expr = [], 0, expr.rstrip()
+    while pos < len(expr):
+        if not (match := _token_re.match(expr, pos)):
+            raise CExprError(f'unexpected character {expr[pos:].lstrip()[:1]!r}')
+        tokens.append((match.lastgroup, match.group(match.lastgroup)))
+        pos = match.end()
+    return tokens
+
+
+def _unescape(literal: str) -> str:
+    return literal.encode('latin-1', 'backslashreplace').decode('unicode_escape')
+
+
+def _bits(ctype: CType) -> int:
+    return 8 * ct.sizeof(ctype)
+
+
+_int = (_bits(ct.c_int), True)
+_size_t = (_bits(ct.c_size_t), False)
+_integer_ctypes = (ct.c_bool, ct.c_byte, ct.c_ubyte, ct.c_short, ct.c_ushort, ct.c_int, ct.c_uint,
+                   ct.c_long, ct.c_ulong, ct.c_longlong, ct.c_ulonglong)
+_unsigned_ctypes = (ct.c_bool, ct.c_ubyte, ct.c_ushort, ct.c_uint, ct.c_ulong, ct.c_ulonglong)
+
+
+def int_type(ctype: CType) -> tp.Optional[IntType]:
+    """The promoted `IntType` of values of ``ctype``, or None if it is not an integer type."""
+    if not (isinstance(ctype, type) and issubclass(ctype, _integer_ctypes)):
+        return None
+    return _int if _bits(ctype) < _int[0] else (_bits(ctype), not issubclass(ctype, _unsigned_ctypes))
+
+
+def value_type(value: int) -> tp.Optional[IntType]:
+    """The type given to integers whose C type is not known: the first of int, long, long long that holds them."""
+    for ctype in (ct.c_int, ct.c_long, ct.c_longlong):
+        if -(1 << _bits(ctype) - 1) <= value < 1 << _bits(ctype) - 1:
+            return _bits(ctype), True
+    return (_bits(ct.c_ulonglong), False) if 0 <= value < 1 << _bits(ct.c_ulonglong) else None
+
+
+def wrap(value: int, typ: IntType) -> int:
+    """Convert ``value`` to ``typ``, i.e. reduce it modulo ``2**bits`` into its range."""
+    bits, signed = typ
+    value &= (1 << bits) - 1
+    return value - (1 << bits) if signed and value >> (bits - 1) else value
+
+
+def common_type(a: IntType, b: IntType) -> IntType:
+    """The usual arithmetic conversions."""
+    if a[1] == b[1]:
+        return max(a, b)
+    signed, unsigned = (a, b) if a[1] else (b, a)
+    return signed if signed[0] > unsigned[0] else unsigned
+
+
+def parse_int(text: str) -> tp.Tuple[int, IntType]:
+    """The value and type of an integer literal, following its base and suffix."""
+    body = text.rstrip('uUlL')
+    suffix = text[len(body):].lower()
+    decimal = not (len(body) > 1 and body.startswith('0'))
+    try:
+        value = int(body, 8) if not decimal and body.isdigit() else int(body, 0)
+    except ValueError as e:
+        raise CExprError(f'invalid integer literal {text!r}') from e
+
+    unsigned, longs = 'u' in suffix, suffix.count('l')
+    for ctype in (ct.c_int, ct.c_long, ct.c_longlong)[longs:]:
+        for signed in (False,) if unsigned else (True,) if decimal else (True, False):
+            if value < 1 << (_bits(ctype) - signed):
+                return value, (_bits(ctype), signed)
+    raise CExprError(f'integer literal {text!r} is too large')
+
+
+def parse_float(text: str) -> float:
+    text = text.rstrip('fFlL')
+    return float.fromhex(text) if text[:2] in ('0x', '0X') else float(text)
+
+
+_type_keywords = {'void', 'char', 'short', 'int', 'long', 'float', 'double', 'signed', 'unsigned', '_Bool',
+                  'const', 'volatile'}
+
+
+def fundamental_ctype(words: tp.Sequence[str]) -> CType:
+    words = [word for word in words if word not in ('const', 'volatile')]
+    unsigned, longs = 'unsigned' in words, words.count('long')
+    if 'void' in words:
+        return None
+    elif '_Bool' in words:
+        return ct.c_bool
+    elif 'float' in words:
+        return ct.c_float
+    elif 'double' in words:
+        return ct.c_longdouble if longs else ct.c_double
+    elif 'char' in words:
+        return ct.c_ubyte if unsigned else ct.c_byte
+    elif 'short' in words:
+        return ct.c_ushort if unsigned else ct.c_short
+    else:
+        return ((ct.c_uint, ct.c_ulong, ct.c_ulonglong) if unsigned else
+                (ct.c_int, ct.c_long, ct.c_longlong))[min(longs, 2)]
+
+
+_binary_ops = {
+    '||': 1, '&&': 2, '|': 3, '^': 4, '&': 5, '==': 6, '!=': 6,
+    '<': 7, '>': 7, '<=': 7, '>=': 7, '<<': 8, '>>': 8, '+': 9, '-': 9, '*': 10, '/': 10, '%': 10
+}
+
+
+class Parser:
+    """Recursive descent parser for the bodies of object-like C macros."""
+
+    def __init__(self, expr: str, types: tp.Mapping[str, tp.Any] = None):
+        self.tokens = tokenize(expr)
+        self.pos = 0
+        self.types = types or {}
+
+    def peek(self, offset=0) -> tp.Tuple[tp.Optional[str], tp.Optional[str]]:
+        return self.tokens[self.pos + offset] if self.pos + offset < len(self.tokens) else (None, None)
+
+    def next(self) -> tp.Tuple[str, str]:
+        if self.pos >= len(self.tokens):
+            raise CExprError('unexpected end of expression')
+        self.pos += 1
+        return self.tokens[self.pos - 1]
+
+    def expect(self, value: str):
+        if (tok := self.next())[1] != value:
+            raise CExprError(f'expected {value!r} but got {tok[1]!r}')
+
+    def parse(self) -> Node:
+        if not self.tokens:
+            return 'const', type(None), None
+        node = self.parse_type(n) if (n := self.type_length(0)) == len(self.tokens) else self.parse_expr()
+        if self.pos < len(self.tokens):
+            raise CExprError(f'unexpected {self.peek()[1]!r}')
+        return node
+
+    def type_length(self, offset: int) -> int:
+        """Number of tokens starting at ``offset`` that make up a type name (0 if they don't)."""
+        kind, value = self.peek(offset)
+        if kind != 'name':
+            return 0
+        n = 1
+        if value not in self.types:
+            if value not in _type_keywords:
+                return 0
+            while self.peek(offset + n)[0] == 'name' and self.peek(offset + n)[1] in _type_keywords:
+                n += 1
+        while self.peek(offset + n)[1] == '*':
+            n += 1
+        return n
+
+    def parse_type(self, n: int) -> Node:
+        words = [self.next()[1] for _ in range(n)]
+        pointer = '*' in words
+        words = [word for word in words if word != '*']
+        ctype = (ct.c_void_p if pointer else
+                 self.types[words[0]] if len(words) == 1 and words[0] in self.types else
+                 fundamental_ctype(words))
+        return 'type', ctype
+
+    def parse_expr(self) -> Node:
+        cond = self.parse_binary(1)
+        if self.peek()[1] == '?':
+            self.next()
+            body = self.parse_expr()
+            self.expect(':')
+            return 'ternary', cond, body, self.parse_expr()
+        return cond
+
+    def parse_binary(self, minprec: int) -> Node:
+        left = self.parse_unary()
+        while (kind := self.peek())[0] == 'op' and _binary_ops.get(kind[1], 0) >= minprec:
+            op = self.next()[1]
+            left = 'binary', op, left, self.parse_binary(_binary_ops[op] + 1)
+        return left
+
+    def parse_unary(self) -> Node:
+        kind, value = self.peek()
+        if kind == 'op' and value in ('-', '+', '~', '!'):
+            self.next()
+            return 'unary', value, self.parse_unary()
+        elif kind == 'op' and value == '(' and (n := self.type_length(1)) and self.peek(n + 1)[1] == ')':
+            self.next()
+            typ = self.parse_type(n)
+            self.expect(')')
+            return 'cast', typ[1], self.parse_unary()
+        elif kind == 'name' and value == 'sizeof':
+            self.next()
+            self.expect('(')
+            if not (n := self.type_length(0)):
+                raise CExprError('sizeof is only supported for type names')
+            typ = self.parse_type(n)
+            self.expect(')')
+            return 'sizeof', typ[1]
+        return self.parse_primary()
+
+    def parse_primary(self) -> Node:
+        kind, value = self.next()
+        if kind == 'int':
+            return ('int', *parse_int(value))
+        elif kind == 'float':
+            return 'const', float, parse_float(value)
+        elif kind == 'char':
+            return 'int', sum(ord(c) << (8 * i) for i, c in enumerate(reversed(
+                _unescape(value[value.index("'") + 1:-1])))), _int
+        elif kind == 'string':
+            value = _unescape(value[value.index('"') + 1:-1])
+            while self.peek()[0] == 'string':
+                value += _unescape((nxt := self.next()[1])[nxt.index('"') + 1:-1])
+            return 'const', str, value
+        elif kind == 'name':
+            return 'name', value
+        elif value == '(':
+            node = self.parse_expr()
+            self.expect(')')
+            return node
+        raise CExprError(f'unexpected {value!r}')
+
+
+def parse(expr: str, types: tp.Mapping[str, tp.Any] = None) -> Node:
+    return Parser(expr, types).parse()
+
+
+def names(node: Node) -> tp.Iterator[str]:
+    if node[0] == 'name':
+        yield node[1]
+    else:
+        for child in node[1:]:
+            if isinstance(child, tuple):
+                yield from names(child)
+
+
+def _c_div(a, b):
+    if isinstance(a, int) and isinstance(b, int):
+        return (abs(a) // abs(b)) * (1 if (a < 0) == (b < 0) else -1)
+    return a / b
+
+
+def _c_mod(a, b):
+    return a - b * _c_div(a, b)
+
+
+_binary_funcs = {
+    '|': operator.or_, '^': operator.xor, '&': operator.and_,
+    '==': operator.eq, '!=': operator.ne, '<': operator.lt, '>': operator.gt, '<=': operator.le, '>=': operator.ge,
+    '<<': operator.lshift, '>>': operator.rshift, '+': operator.add, '-': operator.sub, '*': operator.mul,
+    '/': _c_div, '%': _c_mod
+}
+
+_unary_funcs = {'-': operator.neg, '+': operator.pos, '~': operator.invert, '!': operator.not_}
+
+
+class Evaluator:
+    """Evaluates parsed macro bodies, with integers in their C types, memoizing every sub-expression."""
+
+    def __init__(self, env: tp.Mapping[str, tp.Any]):
+        self.env = env
+        # The types of the integers in env, where known
+        self.int_types: tp.Dict[str, IntType] = {}
+        self.memo: tp.Dict[Node, tp.Tuple[tp.Any, tp.Optional[IntType]]] = {}
+
+    def __call__(self, node: Node):
+        return self.typed(node)[0]
+
+    def typed(self, node: Node) -> tp.Tuple[tp.Any, tp.Optional[IntType]]:
+        """The value of ``node`` and, if it is an integer, its type."""
+        try:
+            return self.memo[node]
+        except KeyError:
+            pass
+        except TypeError:
+            return self.evaluate(node)
+        ret = self.memo[node] = self.evaluate(node)
+        return ret
+
+    def name(self, name: str) -> tp.Tuple[tp.Any, tp.Optional[IntType]]:
+        try:
+            value = self.env[name]
+        except KeyError:
+            raise CExprError(f'undefined identifier {name}') from None
+        if isinstance(value, bool) or not isinstance(value, int):
+            return value, None
+        return value, self.int_types.get(name) or value_type(value)
+
+    def unary(self, op: str, operand: Node) -> tp.Tuple[tp.Any, tp.Optional[IntType]]:
+        value, typ = self.typed(operand)
+        if op == '!':
+            return int(not value), _int
+        ret = _unary_funcs[op](value)
+        return (ret, None) if typ is None else (wrap(ret, typ), typ)
+
+    def binary(self, op: str, left: Node, right: Node) -> tp.Tuple[tp.Any, tp.Optional[IntType]]:
+        if op == '&&':
+            return int(bool(self(left)) and bool(self(right))), _int
+        elif op == '||':
+            return int(bool(self(left)) or bool(self(right))), _int
+
+        (a, atype), (b, btype) = self.typed(left), self.typed(right)
+        if atype is None or btype is None:
+            ret = _binary_funcs[op](a, b)
+            return (int(ret), _int) if isinstance(ret, bool) else (ret, None)
+        elif op in ('<<', '>>'):
+            if not 0 <= b < atype[0]:
+                raise CExprError(f'shift by {b} out of range')
+            return wrap(_binary_funcs[op](a, b), atype), atype
+
+        typ = common_type(atype, btype)
+        ret = _binary_funcs[op](wrap(a, typ), wrap(b, typ))
+        return (int(ret), _int) if isinstance(ret, bool) else (wrap(ret, typ), typ)
+
+    def ternary(self, cond: Node, body: Node, orelse: Node) -> tp.Tuple[tp.Any, tp.Optional[IntType]]:
+        chosen, other = (body, orelse) if self(cond) else (orelse, body)
+        value, typ = self.typed(chosen)
+        if typ is None:
+            return value, typ
+        try:
+            other_type = self.typed(other)[1]
+        except CExprError:
+            return value, typ
+        if other_type is None:
+            return value, typ
+        typ = common_type(typ, other_type)
+        return wrap(value, typ), typ
+
+    def cast(self, ctype: CType, operand: Node) -> tp.Tuple[tp.Any, tp.Optional[IntType]]:
+        value = self(operand)
+        if ctype is None or ctype is ct.c_void_p:
+            return value, None
+        elif issubclass(ctype, (ct.c_float, ct.c_double, ct.c_longdouble)):
+            return ctype(float(value)).value, None
+        elif (typ := int_type(ctype)) is not None:
+            return wrap(ctype(int(value)).value, typ), typ
+        return ctype(int(value)).value, None
+
+    def evaluate(self, node: Node) -> tp.Tuple[tp.Any, tp.Optional[IntType]]:
+        kind = node[0]
+        try:
+            if kind == 'int':
+                return node[1], node[2]
+            elif kind == 'const':
+                return node[2], None
+            elif kind == 'type':
+                return node[1], None
+            elif kind == 'name':
+                return self.name(node[1])
+            elif kind == 'unary':
+                return self.unary(*node[1:])
+            elif kind == 'binary':
+                return self.binary(*node[1:])
+            elif kind == 'ternary':
+                return self.ternary(*node[1:])
+            elif kind == 'cast':
+                return self.cast(*node[1:])
+            elif kind == 'sizeof':
+                return ct.sizeof(node[1]), _size_t
+        except CExprError:
+            raise
+        except (TypeError, ArithmeticError, ValueError) as e:
+            raise CExprError(str(e)) from e
+        raise CExprError(f'unknown node {kind}')
+
+
+def evaluate(expr: str, env: tp.Mapping[str, tp.Any] = None, types: tp.Mapping[str, tp.Any] = None):
+    return Evaluator(env or {})(parse(expr, types))
+
+
+def evaluate_macros(macros: tp.Mapping[str, str], env: tp.Mapping[str, tp.Any] = None,
+                    types: tp.Mapping[str, tp.Any] = None) -> tp.Tuple[tp.Dict[str, tp.Any], tp.Dict[str, str]]:
+    """Evaluate object-like macros in dependency order. Returns the values, and the reasons for those that failed."""
+    env = dict(env or {})
+    unresolved: tp.Dict[str, str] = {}
+
+    parsed: tp.Dict[str, Node] = {}
+    for name, body in macros.items():
+        try:
+            parsed[name] = parse(body, types)
+        except CExprError as e:
+            unresolved[name] = f'cannot parse {body!r}: {e}'
+
+    deps = {name: {dep for dep in names(node) if dep in parsed and dep != name} for name, node in parsed.items()}
+    dependents = {name: [] for name in parsed}
+    for name, ds in deps.items():
+        for dep in ds:
+            if dep in dependents:
+                dependents[dep].append(name)
+
+    evaluator = Evaluator(env)
+    pending = {name: len(ds) for name, ds in deps.items()}
+    ready = deque(name for name, n in pending.items() if n == 0)
+    while ready:
+        name = ready.popleft()
+        del pending[name]
+        if (bad := next((dep for dep in names(parsed[name]) if dep in unresolved and dep != name), None)) is not None:
+            unresolved[name] = f'depends on unresolved macro {bad}'
+        else:
+            try:
+                env[name], typ = evaluator.typed(parsed[name])
+                if typ is not None:
+                    evaluator.int_types[name] = typ
+            except CExprError as e:
+                unresolved[name] = f'cannot evaluate {macros[name]!r}: {e}'
+        for dependent in dependents[name]:
+            pending[dependent] -= 1
+            if pending[dependent] == 0:
+                ready.append(dependent)
+
+    # Whatever is left is on a cycle or depends on one
+    for name in pending:
+        if name in unresolved:
+            continue
+        path = [name]
+        while (nxt := next(dep for dep in deps[path[-1]] if dep in pending)) not in path:
+            path.append(nxt)
+        cycle = path[path.index(nxt):] + [nxt]
+        for member in cycle:
+            unresolved.setdefault(member, 'cyclic definition: ' + ' -> '.join(cycle))
+        for member in path[:path.index(nxt)]:
+            unresolved.setdefault(member, f'depends on cyclic macro {nxt}')
+
+    return {name: env[name] for name in macros if name in env and name not in unresolved}, unresolved
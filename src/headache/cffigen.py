@@ -0,0 +1,176 @@
+"""
+A cffi API-mode backend. The generated module has the names of the ctypes one, but not its whole API: struct and
+pointer types are ``ffi.typeof`` objects, so instances are made with ``ffi.new`` (e.g. ``ffi.new('point *', [1, 2])``
+rather than ``point(1, 2)``) and pointer arguments take cdata (or lists and bytes, which cffi converts) rather than
+ctypes instances.
+"""
+
+import ctypes as ct
+import os
+import re
+import typing as tp
+from itertools import repeat
+
+from pygccxml import declarations as d
+
+from . import DLLWrapper, myast as ast
+from .cutils import c_enum, CArrayType, CFuncType, CPointerType, CType
+
+
+class CFFIWrapper(DLLWrapper):
+    """Generate a cffi API-mode extension (cdef and build script) and a module with the names of the ctypes one."""
+
+    # Later entries win for the types ctypes aliases to each other (e.g. c_longlong and c_long)
+    fundamental_spellings: tp.Dict[CType, str] = {
+        ct.c_ulonglong: 'unsigned long long', ct.c_longlong: 'long long',
+        ct.c_ulong: 'unsigned long', ct.c_long: 'long',
+        ct.c_uint: 'unsigned int', ct.c_int: 'int',
+        ct.c_ushort: 'unsigned short', ct.c_short: 'short',
+        ct.c_ubyte: 'unsigned char', ct.c_byte: 'signed char', ct.c_char: 'char', ct.c_wchar: 'wchar_t',
+        ct.c_bool: '_Bool', ct.c_float: 'float', ct.c_double: 'double', ct.c_longdouble: 'long double',
+        ct.c_void_p: 'void *', ct.c_char_p: 'char *', ct.c_wchar_p: 'wchar_t *',
+    }
+
+    enum_base = 'enum.IntEnum'
+
+    def __init__(self, headername: tp.Union[str, tp.Sequence[str]], *args, extname: str = None, **kwargs):
+        super().__init__(headername, *args, **kwargs)
+        self.extname = extname or f'_{os.path.splitext(os.path.basename(self.headername))[0]}_cffi'
+        self._spellings: tp.Dict[CType, str] = {}
+
+    def tag_typedefs(self) -> tp.Set[str]:
+        """Names of the structs, unions and enums typedef'd to their own name (this includes anonymous ones)."""
+        return {decl.name for decl in self.ns.declarations
+                if isinstance(decl, d.typedef_t) and isinstance(decl.decl_type, d.declarated_t)
+                and decl.decl_type.declaration.name == decl.name}
+
+    def local_names(self) -> tp.Set[str]:
+        """
+        Names declared in the header's directory tree. Structs from elsewhere (system headers) are declared without
+        fields, since castxml may have seen a different compiler's version of them.
+        """
+        headerdirs = tuple({os.path.dirname(os.path.abspath(header)) + os.sep for header in self.headernames})
+        return {decl.name for decl in self.ns.declarations
+                if decl.location and os.path.abspath(decl.location.file_name).startswith(headerdirs)}
+
+    def declare(self, ctype: tp.Optional[CType], declarator: str = '') -> str:
+        if ctype is None:
+            spelling = 'void'
+        elif ctype in self._spellings:
+            spelling = self._spellings[ctype]
+        elif issubclass(ctype, CFuncType):
+            return self.declare(ctype._restype_, f'(*{declarator})({self.declare_parameters(ctype._argtypes_)})')
+        elif issubclass(ctype, CPointerType):
+            return self.declare(ctype._type_,
+                                f'(*{declarator})' if issubclass(ctype._type_, CArrayType) else f'*{declarator}')
+        elif issubclass(ctype, CArrayType):
+            return self.declare(ctype._type_, f'{declarator}[{ctype._length_}]')
+        else:
+            spelling = ctype.__name__
+        return f'{spelling} {declarator}' if declarator else spelling
+
+    def declare_parameters(self, argtypes: tp.Iterable[CType], argnames: tp.Iterable[str] = None) -> str:
+        return ', '.join(self.declare(argtype, argname)
+                         for argtype, argname in zip(argtypes, argnames or repeat(''))) or 'void'
+
+    def cdef_typedef(self, name: str, ctype: CType, tag_typedefs: tp.Collection[str],
+                     local_names: tp.Collection[str]) -> tp.Tuple[str, str]:
+        """The declaration of ``ctype`` and how to refer to it afterwards."""
+        base = ctype.__bases__[0]
+        for kind, root in (('struct', ct.Structure), ('union', ct.Union), ('enum', c_enum)):
+            if base is root:
+                if kind == 'enum':
+                    body = ', '.join(f'{key} = {val}' for key, val in ctype._members.items()) or '...'
+                elif fields := getattr(ctype, '_fields_', ()):
+                    body = ' '.join(f'{self.declare(ftype, fname)};' for fname, ftype in fields
+                                    if name in local_names) + ' ...;'
+                else:
+                    body = None
+
+                if name in tag_typedefs:
+                    return (f'typedef {kind} {{ {body} }} {name};' if body is not None else
+                            f'typedef {kind} {name} {name};'), name
+                return f'{kind} {name} {{ {body} }};' if body is not None else f'{kind} {name};', f'{kind} {name}'
+
+        return f'typedef {self.declare(ctype if issubclass(ctype, CFuncType) else base, name)};', name
+
+    def cdef(self) -> str:
+        self._spellings = self.fundamental_spellings.copy()
+        tag_typedefs, local_names = self.tag_typedefs(), self.local_names()
+
+        lines = []
+        for name, ctype in self.typedefs():
+            if isinstance(ctype, type):
+                line, self._spellings[ctype] = self.cdef_typedef(name, ctype, tag_typedefs, local_names)
+                lines.append(line)
+        lines.extend(f'{self.declare(sig.return_annotation, f"{name}({params})")};'
+                     for name, sig in self.typer.functions.items()
+                     for params in [self.declare_parameters((param.annotation for param in sig.parameters.values()),
+                                                            sig.parameters.keys())])
+        return '\n'.join(lines) + '\n'
+
+    def create_typeof(self, ctype: CType) -> ast.expr:
+        return ast.call('ffi.typeof', [ast.Constant(value=self.declare(ctype))])
+
+    def create_chunks(self, dllvar='__dll') -> tp.Iterator[tp.Tuple[str, tp.List[ast.stmt]]]:
+        self.cdef()
+
+        yield from ((f'define {name}', [ast.assign(name, self.create_typeof(value) if isinstance(value, type) else
+                                                   ast.Constant(value=value))])
+                    for name, value in self.typer.defines.items())
+
+        self.reset_createed_types()
+        for name, ctype in self.typedefs():
+            if not isinstance(ctype, type):
+                stmt = self.create_define(name, ctype)
+            elif issubclass(ctype, c_enum):
+                stmt = (self.create_typedef_enum(name, ctype) if ctype.__bases__ == (c_enum,) else
+                        ast.assign(name, ast.rvalue(self._createed_types[ctype.__bases__[0]])))
+            else:
+                stmt = ast.assign(name, ast.call('ffi.typeof', [ast.Constant(value=self._spellings[ctype])]))
+            yield f'typedef {name}', [stmt]
+            self._createed_types[ctype] = name
+
+        yield from ((f'function {name}', [ast.assign(name, ast.rvalue(f'{dllvar}.{name}'))])
+                    for name in self.typer.functions)
+
+    def create_preamble(self, dllname=None, dllvar='__dll') -> tp.List[ast.stmt]:
+        return [
+            ast.Import(names=[ast.alias(name='enum')]),
+            ast.ImportFrom(module=self.extname, names=[ast.alias(name='ffi'), ast.alias(name='lib', asname=dllvar)])
+        ]
+
+    def create_build_script(self, dllname=None) -> ast.Module:
+        dllname = dllname or os.path.splitext(self.headername)[0]
+        if os.path.dirname(dllname):
+            libdir, libname = os.path.split(os.path.abspath(dllname))
+            libname = re.sub(r'^lib|\..*$', '', libname)
+            link = dict(libraries=[libname], library_dirs=[libdir], runtime_library_dirs=[libdir])
+        else:
+            link = dict(libraries=[dllname])
+        headerdirs, headers = zip(*(os.path.split(os.path.abspath(header)) for header in self.headernames))
+
+        return ast.Module(body=[
+            ast.ImportFrom(module='cffi', names=[ast.alias(name='FFI')]),
+            ast.assign('ffibuilder', ast.call('FFI', [])),
+            ast.Expr(value=ast.call('ffibuilder.cdef', [ast.Constant(value=self.cdef())])),
+            ast.Expr(value=ast.Call(
+                func=ast.rvalue('ffibuilder.set_source'),
+                args=[ast.Constant(value=self.extname),
+                      ast.Constant(value=''.join(f'#include "{header}"\n' for header in headers))],
+                keywords=[ast.keyword(arg=key, value=ast.List(elts=[ast.Constant(value=v) for v in val],
+                                                              ctx=ast.Load()))
+                          for key, val in dict(include_dirs=list(dict.fromkeys(headerdirs)), **link).items()]
+            )),
+            ast.If(test=ast.Compare(left=ast.rvalue('__name__'), ops=[ast.Eq()],
+                                    comparators=[ast.Constant(value='__main__')]),
+                   body=[ast.Expr(value=ast.call('ffibuilder.compile', []))], orelse=[])
+        ])
+
+    def print_build_script(self, file: tp.Union[str, tp.TextIO], dllname=None):
+        source = self.to_source(self.create_build_script(dllname))
+        if isinstance(file, str):
+            with open(file, 'w') as f:
+                f.write(source)
+        else:
+            file.write(source)
@@ -1,7 +1,15 @@
 import _ctypes
+import asyncio
 import ctypes as ct
 import inspect
+import os
+import sys
+import threading
 import typing as tp
+import weakref
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 from .utils import dictunion
 
@@ -12,11 +20,74 @@ CArrayType = _ctypes.Array
 CFuncType = _ctypes.CFuncPtr
 
 
+def make_prototype(restype: CType, argtypes: tp.Tuple[CType, ...], flags: int = ct._FUNCFLAG_CDECL) -> CFuncType:
+    if flags & ~(ct._FUNCFLAG_USE_ERRNO | ct._FUNCFLAG_USE_LASTERROR) == ct._FUNCFLAG_CDECL:
+        return ct.CFUNCTYPE(restype, *argtypes,
+                            use_errno=bool(flags & ct._FUNCFLAG_USE_ERRNO),
+                            use_last_error=bool(flags & ct._FUNCFLAG_USE_LASTERROR))
+    return type('CFunctionType', (CFuncType,), dict(_argtypes_=argtypes, _restype_=restype, _flags_=flags))
+
+
+class PrototypeCache:
+    """Interning tables for function prototypes and signatures, keyed by their shape."""
+
+    def __init__(self):
+        self.prototypes: tp.Dict[tp.Tuple, CFuncType] = {}
+        self.signatures: tp.Dict[tp.Tuple, 'CTSignature'] = {}
+        self.hits: tp.Counter[str] = Counter()
+        self.misses: tp.Counter[str] = Counter()
+
+    def _intern(self, kind: str, table: tp.Dict, key: tp.Tuple, factory: tp.Callable[[], tp.Any]):
+        try:
+            ret = table[key]
+        except KeyError:
+            self.misses[kind] += 1
+            ret = table[key] = factory()
+        else:
+            self.hits[kind] += 1
+        return ret
+
+    def prototype(self, restype: CType, argtypes: tp.Iterable[CType], flags: int = ct._FUNCFLAG_CDECL) -> CFuncType:
+        argtypes = tuple(argtypes)
+        return self._intern('prototypes', self.prototypes, (restype, argtypes, flags),
+                            lambda: make_prototype(restype, argtypes, flags))
+
+    def signature(self, cls: tp.Type['CTSignature'], argnames: tp.Iterable[str], argtypes: tp.Iterable[CType],
+                  rettype: CType) -> 'CTSignature':
+        argnames, argtypes = tuple(argnames), tuple(argtypes)
+        return self._intern('signatures', self.signatures, (cls, argnames, argtypes, rettype), lambda: cls(
+            parameters=[
+                inspect.Parameter(name=argname, kind=inspect.Parameter.POSITIONAL_OR_KEYWORD, annotation=argtype)
+                for argname, argtype in zip(argnames, argtypes)
+            ],
+            return_annotation=rettype
+        ))
+
+    def stats(self) -> tp.Dict[str, tp.Dict[str, int]]:
+        return {kind: dict(size=len(table), hits=self.hits[kind], misses=self.misses[kind])
+                for kind, table in (('prototypes', self.prototypes), ('signatures', self.signatures))}
+
+    def clear(self):
+        self.prototypes.clear()
+        self.signatures.clear()
+        self.hits.clear()
+        self.misses.clear()
+
+
+prototype_cache = PrototypeCache()
+
+
 class CTSignature(inspect.Signature):
+    _flags_ = ct._FUNCFLAG_CDECL
+
     @property
     def _as_parameter_(self):
-        return ct.CFUNCTYPE(self.return_annotation,
-                            *(arg.annotation for arg in self.parameters.values()))
+        try:
+            return self.__dict__['_prototype']
+        except KeyError:
+            ret = self.__dict__['_prototype'] = prototype_cache.prototype(
+                self.return_annotation, (arg.annotation for arg in self.parameters.values()), self._flags_)
+            return ret
 
     # Public accessor
     @property
@@ -25,33 +96,41 @@ class CTSignature(inspect.Signature):
 
     @classmethod
     def make(cls, argnames: tp.Sequence[str], argtypes: tp.Sequence[CType], rettype: CType):
-        return cls(
-            parameters=[
-                inspect.Parameter(name=argname, kind=inspect.Parameter.POSITIONAL_OR_KEYWORD, annotation=argtype)
-                for argname, argtype in zip(argnames, argtypes)
-            ],
-            return_annotation=rettype
-        )
+        return prototype_cache.signature(cls, argnames, argtypes, rettype)
 
 
 class c_enum_meta(type(ct.c_uint)):
-    def __new__(cls, name, bases, __dict__):
+    _reserved = frozenset(('_members', '_members_inv'))
+
+    @classmethod
+    def _is_member(mcs, key: str, bases: tp.Iterable[type]) -> bool:
+        return not (key.startswith('__') or key in mcs._reserved or any(hasattr(base, key) for base in bases))
+
+    def __new__(mcs, name, bases, __dict__):
         if name != 'c_enum':
             __dict__['__members'] = {}
             __dict__['__members_inv'] = {}
-            for key, val in __dict__.items():
-                if not (any(key in base.__dict__ for base in bases) or key.startswith('__')):
+            for key, val in list(__dict__.items()):
+                if mcs._is_member(key, bases):
                     __dict__['__members'][key] = val
                     __dict__['__members_inv'][val] = key
-        return super().__new__(cls, name, bases, __dict__)
+        cls = super().__new__(mcs, name, bases, __dict__)
+        cls._update_members()
+        return cls
 
-    @property
-    def _members(cls) -> tp.Mapping[str, int]:
-        return dictunion(getattr(cls, '__members', {}) for cls in cls.__mro__)
+    def _update_members(cls):
+        # Merged once here instead of on every lookup; kept in sync with subclasses by __setattr__
+        super().__setattr__('_members', dictunion(getattr(c, '__members', {}) for c in reversed(cls.__mro__)))
+        super().__setattr__('_members_inv', dictunion(getattr(c, '__members_inv', {}) for c in reversed(cls.__mro__)))
+        for sub in cls.__subclasses__():
+            sub._update_members()
 
-    @property
-    def _members_inv(cls) -> tp.Mapping[int, str]:
-        return dictunion(getattr(cls, '__members_inv', {}) for cls in cls.__mro__)
+    def __setattr__(cls, key, value):
+        super().__setattr__(key, value)
+        if '__members' in cls.__dict__ and type(cls)._is_member(key, cls.__bases__):
+            cls.__dict__['__members'][key] = value
+            cls.__dict__['__members_inv'][value] = key
+            cls._update_members()
 
 
 class c_enum(ct.c_uint, metaclass=c_enum_meta):
@@ -71,6 +150,10 @@ class c_enum(ct.c_uint, metaclass=c_enum_meta):
 
     @classmethod
     def from_param(cls, param):
+        if isinstance(param, int) and param in cls._members_inv:
+            # A fresh plain instance, since the callee may write to it, and cheaper to make than cls(param)
+            return ct.c_uint(param)
+
         if isinstance(param, c_enum):
             if param.__class__ != cls:
                 raise ValueError(f'Enumeration {param.__class__.__name__} passed as {cls.__name__}')
@@ -81,3 +164,122 @@ class c_enum(ct.c_uint, metaclass=c_enum_meta):
 
     def __repr__(self):
         return f'{self.__class__.__name__}: {self.__class__._members_inv.get(self.value, "UNDEFINED")} (= {self.value})'
+
+
+_cdata_types = (ct.c_int.__mro__[-2], type(ct.byref(ct.c_int())))
+_buffer_kinds = {**dict.fromkeys('bhilqn', 'i'), **dict.fromkeys('BHILQN', 'u'), **dict.fromkeys('efdg', 'f'), '?': '?'}
+_native_orders = '@=' + ('<' if sys.byteorder == 'little' else '>!')
+
+
+@lru_cache(maxsize=None)
+def buffer_pointer(ctype: tp.Optional[CType], readonly: bool = False) -> CType:
+    """
+    ``POINTER(ctype)`` that also takes C-contiguous buffers of ``ctype`` without copying (writable unless
+    ``readonly``; other read-only buffers than bytes and NumPy arrays are refused). ``ctype`` None means ``void *``.
+    """
+    base = ct.POINTER(ctype)
+    itemsize = None if ctype is None else ct.sizeof(ctype)
+    kind = _buffer_kinds.get(getattr(ctype, '_type_', None)) if ctype is not ct.c_char else None
+
+    def from_param(cls, param):
+        if param is None or isinstance(param, _cdata_types):
+            return base.from_param(param)
+        try:
+            view = memoryview(param)
+        except TypeError:
+            return base.from_param(param)
+
+        with view:
+            if itemsize is not None and (view.itemsize != itemsize or kind is not None and (
+                    _buffer_kinds.get(view.format[-1]) != kind or view.format[:-1] not in ('', *_native_orders))):
+                raise TypeError(f'expected a buffer of {ctype.__name__}, got format {view.format!r}')
+            if not view.c_contiguous:
+                raise TypeError('expected a C-contiguous buffer')
+            if not view.nbytes:
+                return None
+            if not view.readonly:
+                return ct.byref(ct.c_char.from_buffer(param))
+            if not readonly:
+                raise TypeError('expected a writable buffer')
+
+        if isinstance(param, bytes):
+            return ct.c_char_p(param)
+        elif (interface := getattr(param, '__array_interface__', None)) is not None:
+            return ct.c_void_p(interface['data'][0])
+        raise TypeError(f'cannot pass a read-only {type(param).__name__} without copying it')
+
+    return type(base)(f'{base.__name__}_buffer', (base,), dict(
+        _type_=ctype, from_param=classmethod(from_param)) if ctype is not None else dict(
+        from_param=classmethod(from_param)))
+
+
+class OutBuffers(threading.local):
+    """Scratch objects for out-parameters, created once per thread and function and reused by every call."""
+
+    def __init__(self):
+        self.buffers: tp.Dict[str, tp.Tuple[CType, ...]] = {}
+
+    def __call__(self, key: str, *ctypes: CType) -> tp.Tuple[CType, ...]:
+        try:
+            return self.buffers[key]
+        except KeyError:
+            ret = self.buffers[key] = tuple(ctype() for ctype in ctypes)
+            return ret
+
+
+class AsyncCaller:
+    """Awaitable calls of blocking foreign functions in a thread pool, at most ``max_pending`` at a time per loop."""
+
+    def __init__(self, max_workers: int = None, max_pending: int = None):
+        self._executor: tp.Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.configure(max_workers, max_pending)
+
+    def configure(self, max_workers: int = None, max_pending: int = None, executor: ThreadPoolExecutor = None):
+        """Change the limits (or supply an executor) for subsequent calls. Calls in flight are unaffected."""
+        with self._lock:
+            old, self._executor = self._executor, executor
+            self.max_workers = max_workers or getattr(executor, '_max_workers', None) or min(
+                32, (os.cpu_count() or 1) + 4)
+            self.max_pending = max_pending or 2 * self.max_workers
+            self._semaphores: tp.MutableMapping[asyncio.AbstractEventLoop, asyncio.Semaphore] = \
+                weakref.WeakKeyDictionary()
+        if old is not None and old is not executor:
+            old.shutdown(wait=False)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='headache-async')
+            return self._executor
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    async def __call__(self, func: tp.Callable, *args):
+        loop = asyncio.get_running_loop()
+        if (semaphore := self._semaphores.get(loop)) is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_pending)
+
+        await semaphore.acquire()
+        try:
+            future = self.executor.submit(func, *args)
+        except BaseException:
+            semaphore.release()
+            raise
+
+        def release(_):
+            try:
+                loop.call_soon_threadsafe(semaphore.release)
+            except RuntimeError:  # loop closed
+                pass
+
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future, loop=loop)
+
+
+async_caller = AsyncCaller()
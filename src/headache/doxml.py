@@ -1,29 +1,173 @@
+import hashlib
 import os
+import pickle
 import typing as tp
+from concurrent.futures import ProcessPoolExecutor
 
 from lxml import etree as ET, html, objectify
 
+from .cache import default_directory
+
+
+def format_description(el: ET.ElementBase) -> tp.Optional[str]:
+    return '\n'.join(html.fromstring(ET.tostring(para)).text_content() for para in paras) if (
+        paras := el.findall('para')) else None
+
+
+def parameter_directions(el: ET.ElementBase) -> tp.Dict[str, str]:
+    """The directions (``in``, ``out`` or ``in,out``) given to ``\\param`` commands inside ``el``."""
+    return {param.text: direction for param in el.iter('parametername') if (direction := param.get('direction'))}
+
+
+# Compounds whose members are only indexed by ``scope::name``, lest a field shadow a function of the same name
+record_kinds = ('struct', 'union', 'class')
+
+
+def index_keys(name: str, scopes: tp.Iterable[str], bare=True) -> tp.Tuple[str, ...]:
+    return ((name,) if bare else ()) + tuple(f'{scope}::{name}' for scope in scopes)
+
+
+def parse_compound(fname: str) -> tp.Tuple[tp.List[tp.Tuple[str, str]], tp.List[tp.Tuple[str, tp.Dict[str, str]]]]:
+    """The docstrings `DoXML.build_index` would index for a compound file, and its parameter directions."""
+    entries, directions = [], []
+    compound = member = None
+    record = False
+
+    def add(el, name, *scopes, bare=True):
+        if (docs := el.find('detaileddescription')) is not None and (doc := format_description(docs)) is not None:
+            entries.extend((key, doc) for key in index_keys(name, scopes, bare))
+            if el.tag == 'memberdef' and bare and (dirs := parameter_directions(docs)):
+                directions.append((name, dirs))
+
+    for event, el in ET.iterparse(fname, events=('end',), tag=('compoundname', 'name', 'enumvalue', 'memberdef',
+                                                               'compounddef')):
+        if el.tag == 'compoundname':
+            compound = el.text
+            record = el.getparent().get('kind') in record_kinds
+        elif el.tag == 'name':
+            if el.getparent().tag == 'memberdef':
+                member = el.text
+            continue
+        elif el.tag == 'enumvalue':
+            add(el, el.findtext('name'), member, compound, bare=False)
+        elif el.tag == 'memberdef':
+            add(el, member, compound, bare=not record)
+        else:
+            add(el, compound)
+
+        el.clear()
+        while el.getprevious() is not None:
+            del el.getparent()[0]
+    return entries, directions
+
 
 class DoXML:
-    def __init__(self, base_dir='xml'):
+    cache_version = 3
+
+    def __init__(self, base_dir='xml', streaming=False, jobs: int = None, cache_dir: str = None):
+        """With ``streaming`` the compound files are parsed one by one and their docs cached in ``cache_dir``."""
         self.base_dir = base_dir
 
+        if streaming:
+            self.doxml = None
+            self.index, self.directions = self.load_index(jobs, cache_dir)
+            return
+
         index = ET.parse(os.path.join(self.base_dir, 'index.xml'))
         transform = ET.XSLT(ET.parse(os.path.join(self.base_dir, 'combine.xslt')))
         schema = ET.XMLSchema(file=os.path.join(self.base_dir, 'compound.xsd'))
 
         self.doxml = objectify.fromstring(ET.tostring(transform(index)), parser=objectify.makeparser(schema=schema))
+        self.index = self.build_index(self.doxml)
+
+    @staticmethod
+    def build_index(root: objectify.ObjectifiedElement) -> tp.Dict[str, objectify.ObjectifiedElement]:
+        """Map the documented names, and ``scope::name`` for members, to their ``detaileddescription``."""
+        index = {}
+
+        def add(el, name, *scopes, bare=True):
+            if (docs := el.find('detaileddescription')) is not None and docs.find('para') is not None:
+                for key in index_keys(name, scopes, bare):
+                    index.setdefault(key, docs)
+
+        for compound in root.iter('compounddef'):
+            cname = compound.findtext('compoundname')
+            add(compound, cname)
+            record = compound.get('kind') in record_kinds
+            for member in compound.iter('memberdef'):
+                name = member.findtext('name')
+                add(member, name, cname, bare=not record)
+                for value in member.iter('enumvalue'):
+                    add(value, value.findtext('name'), name, cname, bare=False)
+        return index
+
+    @staticmethod
+    def stamp(fname: str) -> tp.Tuple[int, int]:
+        st = os.stat(fname)
+        return st.st_mtime_ns, st.st_size
+
+    def cache_file(self, cache_dir: str = None) -> str:
+        return os.path.join(cache_dir or default_directory(),
+                            f'doxml-{hashlib.sha1(os.path.abspath(self.base_dir).encode()).hexdigest()}.pickle')
+
+    def load_index(self, jobs: int = None, cache_dir: str = None
+                   ) -> tp.Tuple[tp.Dict[str, str], tp.Dict[str, tp.Dict[str, str]]]:
+        """
+        Build the index of formatted docstrings and of parameter directions with `parse_compound`, re-parsing
+        only changed files.
+        """
+        cache_file = self.cache_file(cache_dir)
+        try:
+            with open(cache_file, 'rb') as f:
+                cached = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            cached = {}
+        if cached.get('version') != self.cache_version:
+            cached = {}
+
+        index_file = os.path.join(self.base_dir, 'index.xml')
+        if cached.get('index', (None,))[0] == (stamp := self.stamp(index_file)):
+            refids = cached['index'][1]
+        else:
+            refids = [el.get('refid') for event, el in ET.iterparse(index_file, events=('end',), tag='compound')]
+
+        fnames = {refid: os.path.join(self.base_dir, f'{refid}.xml') for refid in refids}
+        compounds = {refid: entry for refid, entry in cached.get('compounds', {}).items()
+                     if refid in fnames and entry[0] == self.stamp(fnames[refid])}
+        if stale := [refid for refid in refids if refid not in compounds]:
+            with ProcessPoolExecutor(jobs) as executor:
+                compounds.update(
+                    (refid, (self.stamp(fnames[refid]), entries))
+                    for refid, entries in zip(stale, executor.map(parse_compound, [fnames[refid] for refid in stale],
+                                                                  chunksize=16)))
+
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            with open(cache_file + '.tmp', 'wb') as f:
+                pickle.dump({'version': self.cache_version, 'index': (stamp, refids), 'compounds': compounds}, f)
+            os.replace(cache_file + '.tmp', cache_file)
+
+        index, directions = {}, {}
+        for refid in refids:
+            entries, dirs = compounds[refid][1]
+            for key, doc in entries:
+                index.setdefault(key, doc)
+            for name, dct in dirs:
+                directions.setdefault(name, dct)
+        return index, directions
 
     def find_element_by_name(self, name: str, hasdocs=True) -> tp.Sequence[objectify.ObjectifiedElement]:
-        return self.doxml.xpath(f'//*[name[text() = "{name}"]]' + ('[detaileddescription]' if hasdocs else ''))
+        return self.doxml.xpath('//*[name[text() = $name]]' + ('[detaileddescription]' if hasdocs else ''),
+                                name=name)
 
     def format_docstring(self, el: objectify.ObjectifiedElement) -> tp.Optional[str]:
-        try:
-            return '\n'.join(html.fromstring(ET.tostring(para)).text_content() for para in el.para)
-        except AttributeError:
-            return None
-        # return html.fromstring(ET.tostring(el)).text_content()
-
-    def get_docs(self, name: str) -> tp.Optional[str]:
-        return (self.format_docstring(els[0].detaileddescription)
-                if (els := self.find_element_by_name(name)) else None)
+        return format_description(el)
+
+    def get_docs(self, name: str, scope: str = None) -> tp.Optional[str]:
+        el = self.index.get(name if scope is None else f'{scope}::{name}')
+        return el if el is None or isinstance(el, str) else self.format_docstring(el)
+
+    def get_directions(self, name: str) -> tp.Dict[str, str]:
+        """The documented directions of the parameters of the function ``name``."""
+        if self.doxml is None:
+            return self.directions.get(name, {})
+        return {} if (el := self.index.get(name)) is None else parameter_directions(el)
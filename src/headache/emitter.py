@@ -0,0 +1,285 @@
+"""Python source for the syntax trees the wrappers are built from; other nodes are handed to `ast.unparse`."""
+
+import ast
+import typing as tp
+
+from .myast import thaw
+
+__all__ = 'SourceEmitter', 'to_source'
+
+# Operator precedence, from loosest to tightest binding, of what the wrappers use
+TUPLE, TEST, CMP, BOR, ARITH, TERM, POWER, AWAIT, ATOM = range(9)
+
+binops: tp.Dict[tp.Type[ast.operator], tp.Tuple[str, int]] = {
+    ast.Add: ('+', ARITH), ast.Sub: ('-', ARITH), ast.Mult: ('*', TERM), ast.Div: ('/', TERM),
+    ast.FloorDiv: ('//', TERM), ast.Mod: ('%', TERM), ast.Pow: ('**', POWER), ast.BitOr: ('|', BOR)}
+cmpops: tp.Dict[tp.Type[ast.cmpop], str] = {
+    ast.Eq: '==', ast.NotEq: '!=', ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=',
+    ast.Is: 'is', ast.IsNot: 'is not', ast.In: 'in', ast.NotIn: 'not in'}
+
+_definitions = ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef
+
+
+def string_literal(value: str) -> str:
+    """Like `repr`, but multi-line strings (docstrings and the sources of lazy definitions) are triple-quoted."""
+    if '\n' not in value:
+        return repr(value)
+    if '\\' in value or not value.replace('\n', '').isprintable():
+        value = ''.join(c if c == '\n' or c.isprintable() and c != '\\' else repr(c)[1:-1] for c in value)
+    value = value.replace('"""', '""\\"')
+    return f'"""{value[:-1]}\\""""' if value.endswith('"') else f'"""{value}"""'
+
+
+class SourceEmitter:
+    """
+    Writes the source of syntax trees through ``write``, one statement at a time. Top-level statements
+    emitted one by one are separated like those of a module: with two blank lines around definitions.
+    """
+
+    indent = '    '
+
+    # The handler methods, by emitter and node class
+    _handlers: tp.Dict[tp.Tuple[type, type], tp.Optional[tp.Callable]] = {}
+
+    def __init__(self, write: tp.Callable[[str], tp.Any]):
+        self.write = write
+        self._prev: tp.Optional[ast.stmt] = None
+
+    @staticmethod
+    def separator(prev: tp.Optional[ast.stmt], stmt: ast.stmt, level=0) -> str:
+        """The blank lines between the consecutive statements ``prev`` and ``stmt``."""
+        if prev is None or not (isinstance(prev, _definitions) or isinstance(stmt, _definitions)):
+            return ''
+        return '\n\n' if level == 0 else '\n'
+
+    def emit(self, node: ast.AST):
+        if isinstance(node, ast.Module):
+            for stmt in node.body:
+                self.emit(stmt)
+        elif isinstance(node, ast.stmt):
+            self.write(self.separator(self._prev, node))
+            self.statement(node, 0)
+            self._prev = node
+        else:
+            self.write(self.expr(node) + '\n')
+
+    def _handler(self, kind: str, node: ast.AST) -> tp.Optional[tp.Callable]:
+        try:
+            return self._handlers[type(self), type(node)]
+        except KeyError:
+            # myast's node classes share the names of the ast ones
+            handler = self._handlers[type(self), type(node)] = getattr(type(self), f'{kind}_{type(node).__name__}',
+                                                                       None)
+            return handler
+
+    def _fallback(self, node: ast.AST) -> str:
+        if not hasattr(ast, 'unparse'):
+            raise TypeError(f'cannot emit {type(node).__name__} nodes')
+        # It looks for type comments by line number and concatenates argument lists
+        return ast.unparse(ast.fix_missing_locations(thaw(node)))
+
+    # Statements
+    # ----------
+
+    def statement(self, node: ast.stmt, level: int):
+        if (handler := self._handler('stmt', node)) is not None:
+            handler(self, node, level)
+        else:
+            for line in self._fallback(node).split('\n'):
+                self.line(line, level)
+
+    def line(self, text: str, level: int):
+        self.write(f'{self.indent * level}{text}\n')
+
+    def body(self, stmts: tp.Sequence[ast.stmt], level: int):
+        prev = None
+        for stmt in stmts:
+            self.write(self.separator(prev, stmt, level))
+            self.statement(stmt, level)
+            prev = stmt
+
+    def block(self, header: str, stmts: tp.Sequence[ast.stmt], level: int):
+        self.line(f'{header}:', level)
+        self.body(stmts, level + 1)
+
+    def stmt_Expr(self, node: ast.Expr, level: int):
+        self.line(self.expr(node.value), level)
+
+    def stmt_Assign(self, node: ast.Assign, level: int):
+        self.line(' = '.join([self.expr(target) for target in node.targets] + [self.expr(node.value)]), level)
+
+    def stmt_AnnAssign(self, node: ast.AnnAssign, level: int):
+        value = f' = {self.expr(node.value)}' if node.value is not None else ''
+        self.line(f'{self.expr(node.target)}: {self.expr(node.annotation, TEST)}{value}', level)
+
+    def stmt_Return(self, node: ast.Return, level: int):
+        self.line('return' if node.value is None else f'return {self.expr(node.value)}', level)
+
+    def stmt_Pass(self, node: ast.Pass, level: int):
+        self.line('pass', level)
+
+    @staticmethod
+    def alias(node: ast.alias) -> str:
+        return node.name if node.asname is None else f'{node.name} as {node.asname}'
+
+    def stmt_Import(self, node: ast.Import, level: int):
+        self.line('import ' + ', '.join(map(self.alias, node.names)), level)
+
+    def stmt_ImportFrom(self, node: ast.ImportFrom, level: int):
+        self.line(f'from {"." * (node.level or 0)}{node.module or ""} import '
+                  + ', '.join(map(self.alias, node.names)), level)
+
+    def stmt_Raise(self, node: ast.Raise, level: int):
+        self.line('raise' + (f' {self.expr(node.exc, TEST)}' if node.exc is not None else '')
+                  + (f' from {self.expr(node.cause, TEST)}' if node.cause is not None else ''), level)
+
+    def stmt_If(self, node: ast.If, level: int):
+        self.block(f'if {self.expr(node.test, TEST)}', node.body, level)
+        if node.orelse:
+            self.block('else', node.orelse, level)
+
+    def stmt_For(self, node: ast.For, level: int):
+        self.block(f'for {self.expr(node.target)} in {self.expr(node.iter)}', node.body, level)
+        if node.orelse:
+            self.block('else', node.orelse, level)
+
+    def stmt_Try(self, node: ast.Try, level: int):
+        self.block('try', node.body, level)
+        for handler in node.handlers:
+            self.block('except' + (f' {self.expr(handler.type, TEST)}' if handler.type is not None else '')
+                       + (f' as {handler.name}' if handler.name else ''), handler.body, level)
+        if node.orelse:
+            self.block('else', node.orelse, level)
+        if node.finalbody:
+            self.block('finally', node.finalbody, level)
+
+    def decorators(self, node: tp.Union[ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef], level: int):
+        for decorator in node.decorator_list:
+            self.line(f'@{self.expr(decorator, TEST)}', level)
+
+    def stmt_FunctionDef(self, node: ast.FunctionDef, level: int, keyword='def'):
+        self.decorators(node, level)
+        returns = f' -> {self.expr(node.returns, TEST)}' if node.returns is not None else ''
+        self.block(f'{keyword} {node.name}({self.arguments(node.args)}){returns}', node.body, level)
+
+    def stmt_AsyncFunctionDef(self, node: ast.AsyncFunctionDef, level: int):
+        self.stmt_FunctionDef(node, level, 'async def')
+
+    def stmt_ClassDef(self, node: ast.ClassDef, level: int):
+        self.decorators(node, level)
+        bases = ', '.join([self.expr(base, TEST) for base in node.bases]
+                          + [self.keyword(keyword) for keyword in node.keywords])
+        self.block(f'class {node.name}({bases})' if bases else f'class {node.name}', node.body, level)
+
+    def arg(self, node: ast.arg, default: tp.Optional[ast.expr] = None) -> str:
+        if node.annotation is None:
+            return node.arg if default is None else f'{node.arg}={self.expr(default, TEST)}'
+        annotated = f'{node.arg}: {self.expr(node.annotation, TEST)}'
+        return annotated if default is None else f'{annotated} = {self.expr(default, TEST)}'
+
+    def arguments(self, node: ast.arguments) -> str:
+        if getattr(node, 'posonlyargs', None) or node.kwonlyargs:
+            return self._fallback(node)
+        defaults = [None] * (len(node.args) - len(node.defaults)) + list(node.defaults)
+        return ', '.join([self.arg(arg, default) for arg, default in zip(node.args, defaults)]
+                         + ([f'*{self.arg(node.vararg)}'] if node.vararg is not None else [])
+                         + ([f'**{self.arg(node.kwarg)}'] if node.kwarg is not None else []))
+
+    # Expressions
+    # -----------
+
+    def expr(self, node: ast.expr, precedence=TUPLE) -> str:
+        """The source of ``node``, parenthesized if it binds looser than ``precedence``."""
+        if (handler := self._handler('expr', node)) is not None:
+            return handler(self, node, precedence)
+        return f'({self._fallback(node)})'
+
+    @staticmethod
+    def wrap(source: str, own: int, precedence: int) -> str:
+        return f'({source})' if own < precedence else source
+
+    def expr_Name(self, node: ast.Name, precedence: int) -> str:
+        return node.id
+
+    def expr_Attribute(self, node: ast.Attribute, precedence: int) -> str:
+        return f'{self.expr(node.value, ATOM)}.{node.attr}'
+
+    def expr_Constant(self, node: ast.Constant, precedence: int) -> str:
+        value = node.value
+        if isinstance(value, str):
+            return string_literal(value)
+        elif isinstance(value, float) and (value != value or value in (float('inf'), float('-inf'))):
+            # Macros can evaluate to these, which have no literals
+            source = '(1e309 - 1e309)' if value != value else '1e309' if value > 0 else '-1e309'
+            return self.wrap(source, POWER if value < 0 else ATOM, precedence)
+        elif isinstance(value, (int, float, complex)) and not isinstance(value, bool):
+            source = repr(value)
+            return self.wrap(source, POWER if source.startswith('-') else ATOM, precedence)
+        return repr(value)
+
+    def keyword(self, node: ast.keyword) -> str:
+        return f'**{self.expr(node.value, ATOM)}' if node.arg is None else f'{node.arg}={self.expr(node.value, TEST)}'
+
+    def expr_Call(self, node: ast.Call, precedence: int) -> str:
+        return f'{self.expr(node.func, ATOM)}(' + ', '.join(
+            [self.expr(arg, TEST) for arg in node.args] + [self.keyword(keyword) for keyword in node.keywords]
+        ) + ')'
+
+    def elements(self, elts: tp.Sequence[ast.expr]) -> str:
+        return ', '.join(self.expr(elt, TEST) for elt in elts)
+
+    def expr_Tuple(self, node: ast.Tuple, precedence: int) -> str:
+        if not node.elts:
+            return '()'
+        source = self.elements(node.elts) + (',' if len(node.elts) == 1 else '')
+        return self.wrap(source, TUPLE, precedence)
+
+    def expr_List(self, node: ast.List, precedence: int) -> str:
+        return f'[{self.elements(node.elts)}]'
+
+    def expr_Dict(self, node: ast.Dict, precedence: int) -> str:
+        return '{' + ', '.join(f'**{self.expr(value, ATOM)}' if key is None else
+                               f'{self.expr(key, TEST)}: {self.expr(value, TEST)}'
+                               for key, value in zip(node.keys, node.values)) + '}'
+
+    def expr_BinOp(self, node: ast.BinOp, precedence: int) -> str:
+        if type(node.op) not in binops:
+            return f'({self._fallback(node)})'
+        op, own = binops[type(node.op)]
+        # All are left-associative, except for the power operator
+        left, right = (own + 1, own) if own == POWER else (own, own + 1)
+        return self.wrap(f'{self.expr(node.left, left)} {op} {self.expr(node.right, right)}', own, precedence)
+
+    def expr_Compare(self, node: ast.Compare, precedence: int) -> str:
+        return self.wrap(self.expr(node.left, CMP + 1) + ''.join(
+            f' {cmpops[type(op)]} {self.expr(comparator, CMP + 1)}'
+            for op, comparator in zip(node.ops, node.comparators)), CMP, precedence)
+
+    def expr_Await(self, node: ast.Await, precedence: int) -> str:
+        return self.wrap(f'await {self.expr(node.value, ATOM)}', AWAIT, precedence)
+
+    def expr_Subscript(self, node: ast.Subscript, precedence: int) -> str:
+        return f'{self.expr(node.value, ATOM)}[{self.expr(node.slice)}]'
+
+    def expr_Index(self, node, precedence: int) -> str:
+        return self.expr(node.value, precedence)
+
+    def expr_JoinedStr(self, node: ast.JoinedStr, precedence: int) -> str:
+        parts = []
+        for value in node.values:
+            if not isinstance(value, ast.FormattedValue):
+                parts.append(value.value.replace('{', '{{').replace('}', '}}'))
+                continue
+            field = self.expr(value.value, TEST + 1)
+            # Replacement fields cannot hold quotes or backslashes of their own (before Python 3.12)
+            if value.format_spec is not None or any(c in field for c in '\'"\\'):
+                return f'({self._fallback(node)})'
+            conversion = f'!{chr(value.conversion)}' if value.conversion not in (None, -1) else ''
+            parts.append(f'{{ {field}{conversion}}}' if field.startswith('{') else f'{{{field}{conversion}}}')
+        return 'f' + repr(''.join(parts))
+
+
+def to_source(node: ast.AST) -> str:
+    parts = []
+    SourceEmitter(parts.append).emit(node)
+    return ''.join(parts)
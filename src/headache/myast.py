@@ -1,5 +1,6 @@
 import ast
 import typing as tp
+from functools import lru_cache
 
 # noinspection PyUnresolvedReferences
 from ast import mod, expr, stmt, expr_context, slice
@@ -9,7 +10,6 @@ from ast import (Add, And, AugLoad, AugStore, BitAnd, BitOr, BitXor, Del, Div, E
                  Sub, UAdd, USub, Pass, Break, Continue)
 
 from frozenlist import FrozenList
-from more_itertools import last
 
 empty = FrozenList()
 empty.freeze()
@@ -34,7 +34,7 @@ class comprehension(ast.comprehension, metaclass=Rehashable):
     is_async: int
 
     def __init__(self, *, target: expr, iter: expr, ifs: tp.List[expr], is_async: int):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(target=target, iter=iter, ifs=ifs, is_async=is_async)
 
 
 class arg(ast.arg, metaclass=Rehashable):
@@ -44,7 +44,7 @@ class arg(ast.arg, metaclass=Rehashable):
 
     def __init__(self, *, arg: identifier, annotation: tp.Optional[expr] = None,
                  type_comment: string = None):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(arg=arg, annotation=annotation, type_comment=type_comment)
 
 
 class arguments(ast.arguments, metaclass=Rehashable):
@@ -61,7 +61,8 @@ class arguments(ast.arguments, metaclass=Rehashable):
                  kwonlyargs: tp.List[ast.arg] = empty, kw_defaults: tp.List[expr] = empty,
                  kwarg: tp.Optional[ast.arg] = None,
                  defaults: tp.List[expr] = empty):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(posonlyargs=posonlyargs, args=args, vararg=vararg, kwonlyargs=kwonlyargs,
+                         kw_defaults=kw_defaults, kwarg=kwarg, defaults=defaults)
 
 
 class keyword(ast.keyword, metaclass=Rehashable):
@@ -69,7 +70,7 @@ class keyword(ast.keyword, metaclass=Rehashable):
     value: expr
 
     def __init__(self, *, arg: identifier = None, value: expr):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(arg=arg, value=value)
 
 
 class alias(ast.alias, metaclass=Rehashable):
@@ -77,7 +78,7 @@ class alias(ast.alias, metaclass=Rehashable):
     asname: identifier = None
 
     def __init__(self, *, name: identifier, asname: identifier = None):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(name=name, asname=asname)
 
 
 class withitem(ast.withitem, metaclass=Rehashable):
@@ -85,7 +86,7 @@ class withitem(ast.withitem, metaclass=Rehashable):
     optional_vars: tp.Optional[expr] = None
 
     def __init__(self, *, context_expr: expr, optional_vars: tp.Optional[expr] = None):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(context_expr=context_expr, optional_vars=optional_vars)
 
 
 class Module(ast.Module, metaclass=Rehashable):
@@ -93,21 +94,21 @@ class Module(ast.Module, metaclass=Rehashable):
     type_ignores: tp.List[ast.type_ignore] = empty
 
     def __init__(self, *, body: tp.List[stmt], type_ignores: tp.List[ast.type_ignore] = empty):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(body=body, type_ignores=type_ignores)
 
 
 class Interactive(ast.Interactive, metaclass=Rehashable):
     body: tp.List[stmt]
 
     def __init__(self, *, body: tp.List[stmt]):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(body=body)
 
 
 class Expression(ast.Expression, metaclass=Rehashable):
     body: expr
 
     def __init__(self, *, body: expr):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(body=body)
 
 
 class FunctionType(ast.FunctionType, metaclass=Rehashable):
@@ -115,14 +116,14 @@ class FunctionType(ast.FunctionType, metaclass=Rehashable):
     returns: expr
 
     def __init__(self, *, argtypes: tp.List[expr], returns: expr):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(argtypes=argtypes, returns=returns)
 
 
 class Suite(ast.Suite, metaclass=Rehashable):
     body: tp.List[stmt]
 
     def __init__(self, *, body: tp.List[stmt]):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(body=body)
 
 
 class FunctionDef(ast.FunctionDef, metaclass=Rehashable):
@@ -135,7 +136,8 @@ class FunctionDef(ast.FunctionDef, metaclass=Rehashable):
 
     def __init__(self, *, name: identifier, args: ast.arguments, body: tp.List[stmt],
                  decorator_list: tp.List[expr] = empty, returns: tp.Optional[expr] = None, type_comment: string = None):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(name=name, args=args, body=body, decorator_list=decorator_list, returns=returns,
+                         type_comment=type_comment)
 
 
 class AsyncFunctionDef(ast.AsyncFunctionDef, metaclass=Rehashable):
@@ -149,7 +151,8 @@ class AsyncFunctionDef(ast.AsyncFunctionDef, metaclass=Rehashable):
     def __init__(self, *, name: identifier, args: ast.arguments, body: tp.List[stmt],
                  decorator_list: tp.List[expr], returns: tp.Optional[expr] = None,
                  type_comment: string = None):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(name=name, args=args, body=body, decorator_list=decorator_list, returns=returns,
+                         type_comment=type_comment)
 
 
 class ClassDef(ast.ClassDef, metaclass=Rehashable):
@@ -161,21 +164,21 @@ class ClassDef(ast.ClassDef, metaclass=Rehashable):
 
     def __init__(self, *, name: identifier, body: tp.List[stmt], bases: tp.List[expr] = empty,
                  keywords: tp.List[ast.keyword] = empty, decorator_list: tp.List[expr] = empty):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(name=name, body=body, bases=bases, keywords=keywords, decorator_list=decorator_list)
 
 
 class Return(ast.Return, metaclass=Rehashable):
     value: tp.Optional[expr] = None
 
     def __init__(self, *, value: tp.Optional[expr] = None):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(value=value)
 
 
 class Delete(ast.Delete, metaclass=Rehashable):
     targets: tp.List[expr]
 
     def __init__(self, *, targets: tp.List[expr]):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(targets=targets)
 
 
 class Assign(ast.Assign, metaclass=Rehashable):
@@ -184,7 +187,7 @@ class Assign(ast.Assign, metaclass=Rehashable):
     type_comment: string = None
 
     def __init__(self, *, targets: tp.List[expr], value: expr, type_comment: string = None):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(targets=targets, value=value, type_comment=type_comment)
 
 
 class AugAssign(ast.AugAssign, metaclass=Rehashable):
@@ -193,7 +196,7 @@ class AugAssign(ast.AugAssign, metaclass=Rehashable):
     value: expr
 
     def __init__(self, *, target: expr, op: ast.operator, value: expr):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(target=target, op=op, value=value)
 
 
 class AnnAssign(ast.AnnAssign, metaclass=Rehashable):
@@ -203,7 +206,7 @@ class AnnAssign(ast.AnnAssign, metaclass=Rehashable):
     simple: int = 1
 
     def __init__(self, *, target: expr, annotation: expr, value: tp.Optional[expr] = None, simple: int = 1):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(target=target, annotation=annotation, value=value, simple=simple)
 
 
 class For(ast.For, metaclass=Rehashable):
@@ -215,7 +218,7 @@ class For(ast.For, metaclass=Rehashable):
 
     def __init__(self, *, target: expr, iter: expr, body: tp.List[stmt], orelse: tp.List[stmt],
                  type_comment: string = None):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(target=target, iter=iter, body=body, orelse=orelse, type_comment=type_comment)
 
 
 class AsyncFor(ast.AsyncFor, metaclass=Rehashable):
@@ -227,7 +230,7 @@ class AsyncFor(ast.AsyncFor, metaclass=Rehashable):
 
     def __init__(self, *, target: expr, iter: expr, body: tp.List[stmt], orelse: tp.List[stmt],
                  type_comment: string = None):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(target=target, iter=iter, body=body, orelse=orelse, type_comment=type_comment)
 
 
 class While(ast.While, metaclass=Rehashable):
@@ -236,7 +239,7 @@ class While(ast.While, metaclass=Rehashable):
     orelse: tp.List[stmt]
 
     def __init__(self, *, test: expr, body: tp.List[stmt], orelse: tp.List[stmt]):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(test=test, body=body, orelse=orelse)
 
 
 class If(ast.If, metaclass=Rehashable):
@@ -245,7 +248,7 @@ class If(ast.If, metaclass=Rehashable):
     orelse: tp.List[stmt]
 
     def __init__(self, *, test: expr, body: tp.List[stmt], orelse: tp.List[stmt]):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(test=test, body=body, orelse=orelse)
 
 
 class With(ast.With, metaclass=Rehashable):
@@ -254,7 +257,7 @@ class With(ast.With, metaclass=Rehashable):
     type_comment: string = None
 
     def __init__(self, *, items: tp.List[ast.withitem], body: tp.List[stmt], type_comment: string = None):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(items=items, body=body, type_comment=type_comment)
 
 
 class AsyncWith(ast.AsyncWith, metaclass=Rehashable):
@@ -263,7 +266,7 @@ class AsyncWith(ast.AsyncWith, metaclass=Rehashable):
     type_comment: string = None
 
     def __init__(self, *, items: tp.List[ast.withitem], body: tp.List[stmt], type_comment: string = None):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(items=items, body=body, type_comment=type_comment)
 
 
 class Raise(ast.Raise, metaclass=Rehashable):
@@ -271,7 +274,7 @@ class Raise(ast.Raise, metaclass=Rehashable):
     cause: tp.Optional[expr] = None
 
     def __init__(self, *, exc: tp.Optional[expr] = None, cause: tp.Optional[expr] = None):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(exc=exc, cause=cause)
 
 
 class Try(ast.Try, metaclass=Rehashable):
@@ -282,7 +285,7 @@ class Try(ast.Try, metaclass=Rehashable):
 
     def __init__(self, *, body: tp.List[stmt], handlers: tp.List[ast.excepthandler], orelse: tp.List[stmt],
                  finalbody: tp.List[stmt]):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(body=body, handlers=handlers, orelse=orelse, finalbody=finalbody)
 
 
 class Assert(ast.Assert, metaclass=Rehashable):
@@ -290,14 +293,14 @@ class Assert(ast.Assert, metaclass=Rehashable):
     msg: tp.Optional[expr] = None
 
     def __init__(self, *, test: expr, msg: tp.Optional[expr] = None):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(test=test, msg=msg)
 
 
 class Import(ast.Import, metaclass=Rehashable):
     names: tp.List[ast.alias]
 
     def __init__(self, *, names: tp.List[ast.alias]):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(names=names)
 
 
 class ImportFrom(ast.ImportFrom, metaclass=Rehashable):
@@ -306,28 +309,28 @@ class ImportFrom(ast.ImportFrom, metaclass=Rehashable):
     level: int = 0
 
     def __init__(self, *, module: identifier = None, names: tp.List[ast.alias], level: int = 0):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(module=module, names=names, level=level)
 
 
 class Global(ast.Global, metaclass=Rehashable):
     names: tp.List[identifier]
 
     def __init__(self, *, names: tp.List[identifier]):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(names=names)
 
 
 class Nonlocal(ast.Nonlocal, metaclass=Rehashable):
     names: tp.List[identifier]
 
     def __init__(self, *, names: tp.List[identifier]):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(names=names)
 
 
 class Expr(ast.Expr, metaclass=Rehashable):
     value: expr
 
     def __init__(self, *, value: expr):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(value=value)
 
 
 class BoolOp(ast.BoolOp, metaclass=Rehashable):
@@ -335,7 +338,7 @@ class BoolOp(ast.BoolOp, metaclass=Rehashable):
     values: tp.List[expr]
 
     def __init__(self, *, op: ast.boolop, values: tp.List[expr]):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(op=op, values=values)
 
 
 class NamedExpr(ast.NamedExpr, metaclass=Rehashable):
@@ -343,7 +346,7 @@ class NamedExpr(ast.NamedExpr, metaclass=Rehashable):
     value: expr
 
     def __init__(self, *, target: expr, value: expr):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(target=target, value=value)
 
 
 class BinOp(ast.BinOp, metaclass=Rehashable):
@@ -352,7 +355,7 @@ class BinOp(ast.BinOp, metaclass=Rehashable):
     right: expr
 
     def __init__(self, *, left: expr, op: ast.operator, right: expr):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(left=left, op=op, right=right)
 
 
 class UnaryOp(ast.UnaryOp, metaclass=Rehashable):
@@ -360,7 +363,7 @@ class UnaryOp(ast.UnaryOp, metaclass=Rehashable):
     operand: expr
 
     def __init__(self, *, op: ast.unaryop, operand: expr):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(op=op, operand=operand)
 
 
 class Lambda(ast.Lambda, metaclass=Rehashable):
@@ -368,7 +371,7 @@ class Lambda(ast.Lambda, metaclass=Rehashable):
     body: expr
 
     def __init__(self, *, args: ast.arguments, body: expr):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(args=args, body=body)
 
 
 class IfExp(ast.IfExp, metaclass=Rehashable):
@@ -377,7 +380,7 @@ class IfExp(ast.IfExp, metaclass=Rehashable):
     orelse: expr
 
     def __init__(self, *, test: expr, body: expr, orelse: expr):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(test=test, body=body, orelse=orelse)
 
 
 class Dict(ast.Dict, metaclass=Rehashable):
@@ -385,14 +388,14 @@ class Dict(ast.Dict, metaclass=Rehashable):
     values: tp.List[expr]
 
     def __init__(self, *, keys: tp.List[expr], values: tp.List[expr]):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(keys=keys, values=values)
 
 
 class Set(ast.Set, metaclass=Rehashable):
     elts: tp.List[expr]
 
     def __init__(self, *, elts: tp.List[expr]):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(elts=elts)
 
 
 class ListComp(ast.ListComp, metaclass=Rehashable):
@@ -400,7 +403,7 @@ class ListComp(ast.ListComp, metaclass=Rehashable):
     generators: tp.List[ast.comprehension]
 
     def __init__(self, *, elt: expr, generators: tp.List[ast.comprehension]):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(elt=elt, generators=generators)
 
 
 class SetComp(ast.SetComp, metaclass=Rehashable):
@@ -408,7 +411,7 @@ class SetComp(ast.SetComp, metaclass=Rehashable):
     generators: tp.List[ast.comprehension]
 
     def __init__(self, *, elt: expr, generators: tp.List[ast.comprehension]):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(elt=elt, generators=generators)
 
 
 class DictComp(ast.DictComp, metaclass=Rehashable):
@@ -417,7 +420,7 @@ class DictComp(ast.DictComp, metaclass=Rehashable):
     generators: tp.List[ast.comprehension]
 
     def __init__(self, *, key: expr, value: expr, generators: tp.List[ast.comprehension]):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(key=key, value=value, generators=generators)
 
 
 class GeneratorExp(ast.GeneratorExp, metaclass=Rehashable):
@@ -425,28 +428,28 @@ class GeneratorExp(ast.GeneratorExp, metaclass=Rehashable):
     generators: tp.List[ast.comprehension]
 
     def __init__(self, *, elt: expr, generators: tp.List[ast.comprehension]):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(elt=elt, generators=generators)
 
 
 class Await(ast.Await, metaclass=Rehashable):
     value: expr
 
     def __init__(self, *, value: expr):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(value=value)
 
 
 class Yield(ast.Yield, metaclass=Rehashable):
     value: tp.Optional[expr] = None
 
     def __init__(self, *, value: tp.Optional[expr] = None):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(value=value)
 
 
 class YieldFrom(ast.YieldFrom, metaclass=Rehashable):
     value: expr
 
     def __init__(self, *, value: expr):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(value=value)
 
 
 class Compare(ast.Compare, metaclass=Rehashable):
@@ -455,7 +458,7 @@ class Compare(ast.Compare, metaclass=Rehashable):
     comparators: tp.List[expr]
 
     def __init__(self, *, left: expr, ops: tp.List[ast.cmpop], comparators: tp.List[expr]):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(left=left, ops=ops, comparators=comparators)
 
 
 class Call(ast.Call, metaclass=Rehashable):
@@ -464,7 +467,7 @@ class Call(ast.Call, metaclass=Rehashable):
     keywords: tp.List[ast.keyword] = empty
 
     def __init__(self, *, func: expr, args: tp.List[expr] = empty, keywords: tp.List[ast.keyword] = empty):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(func=func, args=args, keywords=keywords)
 
 
 class FormattedValue(ast.FormattedValue, metaclass=Rehashable):
@@ -474,14 +477,14 @@ class FormattedValue(ast.FormattedValue, metaclass=Rehashable):
 
     def __init__(self, *, value: expr, conversion: int = None,
                  format_spec: tp.Optional[expr] = None):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(value=value, conversion=conversion, format_spec=format_spec)
 
 
 class JoinedStr(ast.JoinedStr, metaclass=Rehashable):
     values: tp.List[expr]
 
     def __init__(self, *, values: tp.List[expr]):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(values=values)
 
 
 class Constant(ast.Constant, metaclass=Rehashable):
@@ -489,7 +492,7 @@ class Constant(ast.Constant, metaclass=Rehashable):
     kind: string = None
 
     def __init__(self, *, value: constant, kind: string = None):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(value=value, kind=kind)
 
 
 class Attribute(ast.Attribute, metaclass=Rehashable):
@@ -498,7 +501,7 @@ class Attribute(ast.Attribute, metaclass=Rehashable):
     ctx: expr_context
 
     def __init__(self, *, value: expr, attr: identifier, ctx: expr_context):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(value=value, attr=attr, ctx=ctx)
 
 
 class Subscript(ast.Subscript, metaclass=Rehashable):
@@ -507,7 +510,7 @@ class Subscript(ast.Subscript, metaclass=Rehashable):
     ctx: expr_context
 
     def __init__(self, *, value: expr, slice: slice, ctx: expr_context):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(value=value, slice=slice, ctx=ctx)
 
 
 class Starred(ast.Starred, metaclass=Rehashable):
@@ -515,7 +518,7 @@ class Starred(ast.Starred, metaclass=Rehashable):
     ctx: expr_context
 
     def __init__(self, *, value: expr, ctx: expr_context):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(value=value, ctx=ctx)
 
 
 class Name(ast.Name, metaclass=Rehashable):
@@ -523,7 +526,7 @@ class Name(ast.Name, metaclass=Rehashable):
     ctx: expr_context
 
     def __init__(self, *, id: identifier, ctx: expr_context):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(id=id, ctx=ctx)
 
 
 class List(ast.List, metaclass=Rehashable):
@@ -531,7 +534,7 @@ class List(ast.List, metaclass=Rehashable):
     ctx: expr_context = Load()
 
     def __init__(self, *, elts: tp.List[expr], ctx: expr_context = Load()):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(elts=elts, ctx=ctx)
 
 
 class Tuple(ast.Tuple, metaclass=Rehashable):
@@ -539,7 +542,7 @@ class Tuple(ast.Tuple, metaclass=Rehashable):
     ctx: expr_context = Load()
 
     def __init__(self, *, elts: tp.List[expr], ctx: expr_context = Load()):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(elts=elts, ctx=ctx)
 
 
 class Slice(ast.Slice, metaclass=Rehashable):
@@ -549,21 +552,21 @@ class Slice(ast.Slice, metaclass=Rehashable):
 
     def __init__(self, *, lower: tp.Optional[expr] = None, upper: tp.Optional[expr] = None,
                  step: tp.Optional[expr] = None):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(lower=lower, upper=upper, step=step)
 
 
 class ExtSlice(ast.ExtSlice, metaclass=Rehashable):
     dims: tp.List[slice]
 
     def __init__(self, *, dims: tp.List[slice]):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(dims=dims)
 
 
 class Index(ast.Index, metaclass=Rehashable):
     value: expr
 
     def __init__(self, *, value: expr):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(value=value)
 
 
 class ExceptHandler(ast.ExceptHandler, metaclass=Rehashable):
@@ -573,7 +576,7 @@ class ExceptHandler(ast.ExceptHandler, metaclass=Rehashable):
 
     def __init__(self, *, type: tp.Optional[expr] = None, name: identifier = None,
                  body: tp.List[stmt]):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(type=type, name=name, body=body)
 
 
 class TypeIgnore(ast.TypeIgnore, metaclass=Rehashable):
@@ -581,14 +584,23 @@ class TypeIgnore(ast.TypeIgnore, metaclass=Rehashable):
     tag: string
 
     def __init__(self, *, lineno: int, tag: string):
-        super().__init__(**{key: value for key, value in locals().items() if key not in ('self', '__class__')})
+        super().__init__(lineno=lineno, tag=tag)
 
 
 _compile = compile
 
 
-def compile(tree, mode=None, *args, **kwargs):
-    return _compile(ast.fix_missing_locations(tree), '_file',
+def thaw(tree):
+    """Replace the frozen lists in ``tree`` by plain ones, which `compile` insists on."""
+    for node in ast.walk(tree):
+        for field, value in ast.iter_fields(node):
+            if isinstance(value, FrozenList):
+                setattr(node, field, list(value))
+    return tree
+
+
+def compile(tree, mode=None, *args, filename='_file', **kwargs):
+    return _compile(ast.fix_missing_locations(thaw(tree)), filename,
                     mode
                     or isinstance(tree, ast.Module) and 'exec'
                     or isinstance(tree, ast.Expression) and 'eval'
@@ -596,20 +608,27 @@ def compile(tree, mode=None, *args, **kwargs):
                     *args, **kwargs)
 
 
+# Contexts carry no data, so (like the parser does) all nodes share the same ones
+_load = Load()
+_store = Store()
+
+
 def dotted_name(name: str, ctx: expr_context) -> expr:
-    res = last(res for res in [None] for p in name.split('.') for res in [
-        Name(id=p, ctx=Load()) if res is None else Attribute(value=res, attr=p, ctx=Load())
-    ])
-    res.ctx = ctx
+    first, *attrs = name.split('.')
+    res = Name(id=first, ctx=_load if attrs else ctx)
+    for i, attr in enumerate(attrs, 1 - len(attrs)):
+        res = Attribute(value=res, attr=attr, ctx=_load if i else ctx)
     return res
 
 
 def lvalue(name: str) -> expr:
-    return dotted_name(name, Store())
+    return dotted_name(name, _store)
 
 
+@lru_cache(maxsize=1 << 16)
 def rvalue(name: str) -> expr:
-    return dotted_name(name, Load())
+    """The expression loading ``name``. It is interned: trees share it, so it must not be modified."""
+    return dotted_name(name, _load)
 
 
 def assign(name: str, value: expr, type_comment: str = None):
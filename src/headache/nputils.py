@@ -0,0 +1,35 @@
+import ctypes as ct
+import typing as tp
+
+import numpy as np
+
+from .cutils import CArrayType, CPointerType, CType
+
+
+def struct_dtype(ctype: CType) -> np.dtype:
+    """The ``_dtype_`` generated for ``ctype``, or the one NumPy derives itself."""
+    return getattr(ctype, '_dtype_', None) or np.dtype(ctype)
+
+
+def as_records(obj: tp.Union[CArrayType, CPointerType], count: int = None) -> np.recarray:
+    """
+    View a ctypes array of structs, or ``count`` structs starting at a pointer, as a NumPy record array without
+    copying. The memory is not kept alive for pointers: the caller has to.
+    """
+    ctype = obj._type_
+    if isinstance(obj, CPointerType):
+        if count is None:
+            raise TypeError('a count is required for pointers')
+        if count and not obj:
+            raise ValueError('NULL pointer')
+        obj = (ctype * count).from_address(ct.cast(obj, ct.c_void_p).value) if count else (ctype * 0)()
+    elif not isinstance(obj, CArrayType):
+        raise TypeError(f'expected a ctypes array or pointer, got {type(obj).__name__}')
+    return np.frombuffer(obj, struct_dtype(ctype)).view(np.recarray)
+
+
+def as_ctypes(arr: np.ndarray, ctype: CType) -> CArrayType:
+    """View a C-contiguous, writable array of records as a ctypes array of ``ctype`` without copying."""
+    if arr.dtype.itemsize != ct.sizeof(ctype):
+        raise TypeError(f'itemsize {arr.dtype.itemsize} does not match sizeof({ctype.__name__}) = {ct.sizeof(ctype)}')
+    return (ctype * arr.size).from_buffer(arr)
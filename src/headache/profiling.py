@@ -0,0 +1,154 @@
+import ctypes as ct
+import json
+import os
+import random
+import threading
+import typing as tp
+from time import perf_counter
+
+
+class CallStats:
+    """Call count, cumulative times and a bounded reservoir of per-call latencies of one function."""
+
+    __slots__ = 'calls', 'convert', 'foreign', 'max', 'samples', 'lock'
+
+    reservoir_size = 1024
+
+    def __init__(self):
+        self.calls = 0
+        self.convert = self.foreign = self.max = 0.
+        self.samples: tp.List[float] = []
+        self.lock = threading.Lock()
+
+    def add(self, convert: float, foreign: float):
+        total = convert + foreign
+        with self.lock:
+            self.calls += 1
+            self.convert += convert
+            self.foreign += foreign
+            self.max = max(self.max, total)
+            if len(self.samples) < self.reservoir_size:
+                self.samples.append(total)
+            elif (i := random.randrange(self.calls)) < self.reservoir_size:
+                self.samples[i] = total
+
+    def percentile(self, q: float) -> float:
+        samples = sorted(self.samples)
+        return samples[min(len(samples) - 1, int(q / 100 * len(samples)))] if samples else 0.
+
+    def summary(self) -> tp.Dict[str, float]:
+        total = self.convert + self.foreign
+        return dict(calls=self.calls, total=total, convert=self.convert, foreign=self.foreign,
+                    mean=total / self.calls if self.calls else 0., max=self.max,
+                    **{f'p{q}': self.percentile(q) for q in (50, 90, 99)})
+
+
+class ProfiledFunction:
+    """Stands in for a foreign function and times the conversion of its arguments and the call separately."""
+
+    __slots__ = '_func', '_raw', '_stats'
+
+    def __init__(self, func, stats: CallStats):
+        object.__setattr__(self, '_func', func)
+        object.__setattr__(self, '_raw', type(func)(ct.cast(func, ct.c_void_p).value))
+        object.__setattr__(self, '_stats', stats)
+
+    def __getattr__(self, key):
+        return getattr(self._func, key)
+
+    def __setattr__(self, key, value):
+        setattr(self._func, key, value)
+
+    def __call__(self, *args):
+        func = self._func
+        if (argtypes := func.argtypes) is None:
+            start = perf_counter()
+            try:
+                return func(*args)
+            finally:
+                self._stats.add(0., perf_counter() - start)
+
+        start = perf_counter()
+        converted = []
+        for i, (argtype, arg) in enumerate(zip(argtypes, args)):
+            try:
+                converted.append(argtype.from_param(arg))
+            except Exception as e:
+                raise ct.ArgumentError(f'argument {i + 1}: {type(e).__name__}: {e}') from None
+        if len(args) < len(argtypes):
+            raise TypeError(f'this function takes at least {len(argtypes)} arguments ({len(args)} given)')
+        converted.extend(args[len(argtypes):])
+
+        raw = self._raw
+        raw.restype = func.restype
+        if (errcheck := func.errcheck) is not None:
+            raw.errcheck = errcheck
+        end = perf_counter()
+        try:
+            return raw(*converted)
+        finally:
+            self._stats.add(end - start, perf_counter() - end)
+
+
+class Profiler:
+    """
+    Per-function call profiling of a generated module, enabled on import by ``HEADACHE_PROFILE``. Functions
+    missing from the library are skipped and listed in `missing`.
+    """
+
+    def __init__(self, dll: ct.CDLL, namespace: tp.MutableMapping[str, tp.Any], names: tp.Iterable[str]):
+        self.dll = dll
+        self.namespace = namespace
+        self.names = tuple(names)
+        self.calls: tp.Dict[str, CallStats] = {}
+        self.missing: tp.Set[str] = set()
+        self._originals: tp.Dict[str, tp.Any] = {}
+
+        if os.environ.get('HEADACHE_PROFILE'):
+            self.enable()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._originals)
+
+    def enable(self):
+        if self.enabled:
+            return
+        # Everything that can fail is done before anything is swapped
+        funcs = {}
+        for name in self.names:
+            try:
+                funcs[name] = getattr(self.dll, name)
+            except AttributeError:
+                self.missing.add(name)
+        proxies = {name: ProfiledFunction(func, self.calls.get(name) or CallStats()) for name, func in funcs.items()}
+
+        for name, proxy in proxies.items():
+            self.calls[name] = proxy._stats
+            setattr(self.dll, name, proxy)
+            if self.namespace.get(name) is funcs[name]:
+                self.namespace[name] = proxy
+        self._originals = funcs
+
+    def disable(self):
+        proxies = {name: getattr(self.dll, name) for name in self._originals}
+        for name, func in self._originals.items():
+            setattr(self.dll, name, func)
+            if self.namespace.get(name) is proxies[name]:
+                self.namespace[name] = func
+        self._originals = {}
+
+    def reset(self):
+        for stats in self.calls.values():
+            stats.__init__()
+
+    def stats(self) -> tp.Dict[str, tp.Dict[str, float]]:
+        """Summaries (times in seconds) of the functions called so far, the most expensive first."""
+        return dict(sorted(((name, stats.summary()) for name, stats in self.calls.items() if stats.calls),
+                           key=lambda item: item[1]['total'], reverse=True))
+
+    def dump(self, file: tp.Union[str, tp.TextIO]):
+        if isinstance(file, str):
+            with open(file, 'w') as f:
+                return self.dump(f)
+        json.dump(self.stats(), file, indent=2)
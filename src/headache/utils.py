@@ -12,6 +12,10 @@ def unzip(iterable: tp.Iterable, size: int = None):
             (islice(a, 1, None) for a in unzip(chain(((None,)*size,), iterable))))
 
 
+def uint32(value: int) -> bytes:
+    return (value & 0xFFFFFFFF).to_bytes(4, 'little')
+
+
 def update_dict(other, self):
     self.update(other)
     return self
@@ -0,0 +1,50 @@
+import importlib.util
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from headache import CTyper  # noqa: E402
+
+
+cc = os.environ.get('CC') or shutil.which('gcc') or shutil.which('cc')
+requires_castxml = pytest.mark.skipif(shutil.which('castxml') is None or cc is None,
+                                      reason='needs castxml and a C compiler')
+
+
+def import_file(name: str, path: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(autouse=True)
+def compiler_path(monkeypatch):
+    if cc is not None:
+        monkeypatch.setattr(CTyper, 'compiler_path', cc)
+
+
+@pytest.fixture
+def make_header(tmp_path):
+    def make_header(source: str, name='test.h') -> str:
+        path = tmp_path / name
+        path.write_text(source)
+        return str(path)
+    return make_header
+
+
+@pytest.fixture
+def make_library(tmp_path):
+    """Build a shared library from C source (compiled after including the header, if given)."""
+    def make_library(source: str, header: str = None, name='test') -> str:
+        path = tmp_path / f'{name}.c'
+        path.write_text((f'#include "{header}"\n' if header else '') + source)
+        library = str(tmp_path / f'lib{name}.so')
+        subprocess.run([cc, '-shared', '-fPIC', '-w', '-o', library, str(path)], check=True)
+        return library
+    return make_library
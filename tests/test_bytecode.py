@@ -0,0 +1,53 @@
+import importlib.util
+import os
+import py_compile
+
+import pytest
+
+from headache import CTyper, DLLWrapper
+
+from conftest import import_file, requires_castxml
+
+
+@requires_castxml
+@pytest.mark.parametrize('invalidation_mode', [None, *py_compile.PycInvalidationMode])
+def test_line_numbers(tmp_path, make_header, make_library, invalidation_mode):
+    header = make_header('#define N 3\ntypedef struct point { int x, y; } point;\nint add(int a, int b);\n')
+    library = make_library('int add(int a, int b) { return a + b; }', header)
+    file = str(tmp_path / 'wrapped.py')
+
+    cfile = DLLWrapper(header, CTyper()).print_bytecode(file, library, invalidation_mode=invalidation_mode)
+    module = import_file('wrapped', file)
+    assert module.__cached__ == cfile
+    assert module.add(1, 2) == 3
+
+    with open(file) as f:
+        lineno = next(i for i, line in enumerate(f, 1) if line.startswith('def add('))
+    assert module.add.__code__.co_firstlineno == lineno
+
+
+@requires_castxml
+def test_sourceless(tmp_path, make_header, make_library):
+    header = make_header('int add(int a, int b);\n')
+    library = make_library('int add(int a, int b) { return a + b; }', header)
+
+    cfile = DLLWrapper(header, CTyper()).print_bytecode(str(tmp_path / 'wrapped.py'), library, source=False)
+    assert import_file('wrapped', cfile).add(1, 2) == 3
+
+
+@requires_castxml
+@pytest.mark.parametrize('epoch', [None, '1'])
+def test_default_invalidation_mode(tmp_path, make_header, monkeypatch, epoch):
+    if epoch is None:
+        monkeypatch.delenv('SOURCE_DATE_EPOCH', raising=False)
+    else:
+        monkeypatch.setenv('SOURCE_DATE_EPOCH', epoch)
+    file = str(tmp_path / 'wrapped.py')
+    with open(DLLWrapper(make_header('int add(int a, int b);\n'), CTyper()).print_bytecode(file), 'rb') as f:
+        data = f.read()
+    assert data[:4] == importlib.util.MAGIC_NUMBER
+    with open(file, 'rb') as f:
+        # Reproducible builds get a checked hash of the source, as with py_compile
+        assert data[4:16] == (b'\x03\0\0\0' + importlib.util.source_hash(f.read()) if epoch else
+                              b'\0\0\0\0' + (int(os.stat(file).st_mtime) & 0xFFFFFFFF).to_bytes(4, 'little')
+                              + os.stat(file).st_size.to_bytes(4, 'little'))
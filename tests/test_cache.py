@@ -0,0 +1,101 @@
+import ctypes as ct
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from headache import CTyper, HeaderCache, cache
+
+from conftest import requires_castxml
+
+
+config = SimpleNamespace(xml_generator_path='castxml')
+
+
+@pytest.fixture
+def hc(tmp_path) -> HeaderCache:
+    return HeaderCache(str(tmp_path / 'cache'))
+
+
+def test_hit_and_miss(hc, make_header):
+    fname = make_header('int f(void);')
+    assert hc.load(fname, config) is None
+    hc.store(fname, config, {'f': 1})
+    assert hc.load(fname, config) == {'f': 1}
+    assert hc.load(fname, config, 'other settings') is None
+
+    make_header('int g(void);')
+    assert hc.load(fname, config) is None
+
+
+def test_include_changed(hc, make_header):
+    fname, include = make_header('#include "inc.h"'), make_header('#define X 1', 'inc.h')
+    hc.store(fname, config, 'value', dependencies=[fname, include])
+    assert hc.load(fname, config) == 'value'
+    make_header('#define X 2', 'inc.h')
+    assert hc.load(fname, config) is None
+
+
+def test_invalidate(hc, make_header):
+    fname = make_header('')
+    hc.store(fname, config, 'value')
+    hc.invalidate(fname, config)
+    assert hc.load(fname, config) is None
+
+
+def test_unreadable_entry_is_a_miss(hc, make_header):
+    fname = make_header('')
+    hc.store(fname, config, 'value')
+    path = hc.path(hc.key(fname, config))
+    with open(path, 'r+b') as f:
+        f.seek(-4, os.SEEK_END)
+        f.write(b'\xff' * 4)
+    with pytest.warns(UserWarning, match='unreadable'):
+        assert hc.load(fname, config) is None
+    assert not os.path.exists(path)
+
+
+def test_evict_least_recently_used(hc, make_header):
+    fnames = [make_header(name, f'{name}.h') for name in 'abc']
+    for i, fname in enumerate(fnames):
+        hc.store(fname, config, 'value')
+        os.utime(hc.path(hc.key(fname, config)), (1000 * (i + 1), 1000 * (i + 1)))
+    assert hc.load(fnames[0], config) == 'value'
+
+    hc.evict(2 * os.path.getsize(hc.path(hc.key(fnames[0], config))))
+    assert [hc.load(fname, config) for fname in fnames] == ['value', None, 'value']
+
+    hc.clear()
+    assert not hc.entries()
+
+
+def linked_list() -> type:
+    node = type(ct.Structure)('node', (ct.Structure,), {})
+    node._fields_ = [('v', ct.c_int), ('next', ct.POINTER(node))]
+    return node
+
+
+def check_linked_list(node: type):
+    assert [name for name, _ in node._fields_] == ['v', 'next']
+    assert node._fields_[1][1]._type_ is node
+    head = node(1, ct.pointer(node(2)))
+    assert head.next.contents.v == 2
+
+
+def test_recursive_struct_roundtrip():
+    check_linked_list(cache.loads(cache.dumps(linked_list())))
+
+
+def test_recursive_struct_header_cache(hc, make_header):
+    fname = make_header('')
+    hc.store(fname, config, {'node': linked_list()})
+    check_linked_list(hc.load(fname, config)['node'])
+
+
+@requires_castxml
+def test_recursive_struct_load_header(tmp_path, make_header):
+    fname = make_header('typedef struct node { int v; struct node *next; } node_t;\n')
+    for _ in range(2):
+        typer = CTyper(cache=HeaderCache(str(tmp_path / 'cache')))
+        ns = typer.load_header(fname)
+        check_linked_list(typer.typemap[ns.class_('node')])
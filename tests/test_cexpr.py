@@ -0,0 +1,46 @@
+import ctypes as ct
+
+import pytest
+
+from headache.cexpr import CExprError, evaluate, evaluate_macros
+
+
+@pytest.mark.parametrize('expr, value', [
+    ('42', 42), ('0x1F', 31), ('017', 15), ('0b101', 5), ('1.5f', 1.5), ("'a'", 97), ('"ab" "c"', 'abc'),
+    ('(1 + 2) * 3', 9), ('-7 / 2', -3), ('-7 % 2', -1), ('1 ? 2 : 3', 2), ('0 ? 1 / 0 : 3', 3),
+    ('!5', 0), ('1 < 2 && 2 < 3', 1), ('sizeof(int)', ct.sizeof(ct.c_int)), ('(unsigned char) 300', 44),
+    ('(char) 200', -56), ('1.5 * 2', 3.0), ('', None),
+])
+def test_evaluate(expr, value):
+    assert evaluate(expr) == value
+
+
+@pytest.mark.parametrize('expr, value', [
+    ('~0U', 2**32 - 1), ('~0UL', 2**(8 * ct.sizeof(ct.c_ulong)) - 1), ('0xFFFFFFFFu + 1', 0), ('-1u', 2**32 - 1),
+    ('0x7FFFFFFF + 1', -2**31), ('0xFFFFFFFF', 2**32 - 1), ('0xFFFFFFFF + 1', 0), ('4294967295 + 1', 2**32),
+    ('-1 < 0u', 0), ('-1 < 0', 1), ('-1 < 0L', 1), ('1 ? 1u : -1', 1), ('0 ? 1u : -1', 2**32 - 1),
+    ('(unsigned) -1 >> 1', 2**31 - 1), ('-1 >> 1', -1), ('sizeof(int) - 5', 2**(8 * ct.sizeof(ct.c_size_t)) - 1),
+])
+def test_integer_types(expr, value):
+    assert evaluate(expr) == value
+
+
+@pytest.mark.parametrize('expr', ['08', '0xFFFFFFFFFFFFFFFFFF', '1 << 40', '1 / 0', 'X + 1', '(1', '1 $ 2'])
+def test_errors(expr):
+    with pytest.raises(CExprError):
+        evaluate(expr)
+
+
+def test_evaluate_macros():
+    values, unresolved = evaluate_macros({
+        'B': '(A + 1)', 'A': '0xFFFFFFFFu', 'C': '08', 'D': 'C + 1', 'E': 'F', 'F': 'E', 'G': 'B - 1', 'H': 'X',
+    })
+    assert values == {'B': 0, 'A': 2**32 - 1, 'G': 2**32 - 1}
+    assert set(unresolved) == {'C', 'D', 'E', 'F', 'H'}
+    assert 'depends on unresolved macro C' in unresolved['D']
+    assert 'cyclic' in unresolved['E']
+
+
+def test_env_and_types():
+    assert evaluate('N * 2', {'N': 3}) == 6
+    assert evaluate('(size_t) -1', types={'size_t': ct.c_size_t}) == 2**(8 * ct.sizeof(ct.c_size_t)) - 1
@@ -0,0 +1,74 @@
+import importlib
+import os
+import subprocess
+import sys
+
+import pytest
+
+from headache import CTyper
+from headache.cffigen import CFFIWrapper
+
+from conftest import requires_castxml
+
+
+header_source = '''
+#define SCALE 3
+typedef enum color { RED, GREEN = 5 } color_t;
+typedef struct point { int x, y; } point;
+int add(int a, int b);
+int sum(const int *xs, int n);
+int norm1(point *p);
+'''
+
+library_source = '''
+int add(int a, int b) { return a + b; }
+int sum(const int *xs, int n) { int s = 0; while (n--) s += xs[n]; return s; }
+int norm1(point *p) { return (p->x < 0 ? -p->x : p->x) + (p->y < 0 ? -p->y : p->y); }
+'''
+
+
+@pytest.fixture
+def cffi_module(tmp_path, make_header, make_library, monkeypatch):
+    pytest.importorskip('cffi')
+    header = make_header(header_source)
+    library = make_library(library_source, header)
+
+    wrapper = CFFIWrapper(header, CTyper(), extname='_test_cffi')
+    wrapper.print_build_script(str(tmp_path / 'build.py'), library)
+    wrapper.print(str(tmp_path / 'wrapped_cffi.py'))
+    subprocess.run([sys.executable, 'build.py'], cwd=tmp_path, check=True, stdout=subprocess.DEVNULL)
+
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield importlib.import_module('wrapped_cffi')
+    for name in ('wrapped_cffi', '_test_cffi'):
+        sys.modules.pop(name, None)
+
+
+@requires_castxml
+def test_cffi_module(cffi_module):
+    m = cffi_module
+    assert m.add(1, 2) == 3
+    assert m.sum([1, 2, 3], 3) == 6
+    assert m.norm1(m.ffi.new('point *', [3, -4])) == 7
+    assert m.SCALE == 3
+    assert m.color.GREEN == 5 and m.color_t(5) is m.color.GREEN
+    assert m.point is m.ffi.typeof('point')
+
+
+@requires_castxml
+@pytest.mark.parametrize('single_pass', [False, True])
+def test_cffi_cdef(make_header, single_pass):
+    cdef = CFFIWrapper(make_header(header_source), CTyper(single_pass=single_pass)).cdef()
+    assert 'typedef struct { int x; int y; ...; } point;' in cdef
+    assert 'int sum(int *xs, int n);' in cdef
+
+
+@pytest.mark.parametrize('option', ['--lazy', '--numpy', '--direct', '--async=*'])
+def test_cffi_unsupported_options(tmp_path, make_header, option):
+    proc = subprocess.run(
+        [sys.executable, '-m', 'headache', make_header(header_source), '-o', str(tmp_path / 'out.py'),
+         '--cffi', str(tmp_path / 'build.py'), option],
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)), stderr=subprocess.PIPE,
+        universal_newlines=True)
+    assert proc.returncode == 2
+    assert 'cannot be combined' in proc.stderr
@@ -0,0 +1,116 @@
+import array
+import ctypes as ct
+
+import pytest
+
+from headache.cutils import buffer_pointer, c_enum
+
+from conftest import cc
+
+
+class color(c_enum):
+    RED = 0
+    GREEN = 5
+
+
+class shade(color):
+    DARK = 7
+
+
+class other(c_enum):
+    A = 5
+
+
+@pytest.fixture
+def dll(make_library):
+    if cc is None:
+        pytest.skip('needs a C compiler')
+    return ct.CDLL(make_library('unsigned identity(unsigned x) { return x; }\n'
+                                'void increment(unsigned *x) { ++*x; }\n'))
+
+
+def test_enum_members():
+    assert color(5).name == 'GREEN' and color().value == 0
+    assert shade._members == dict(RED=0, GREEN=5, DARK=7)
+    assert shade._members_inv[7] == 'DARK'
+    with pytest.raises(ValueError):
+        color(6)
+
+
+def test_enum_new_member():
+    class palette(c_enum):
+        RED = 0
+
+    class tint(palette):
+        pass
+
+    palette.BLUE = 9
+    assert palette._members_inv[9] == 'BLUE' and tint._members['BLUE'] == 9 and tint(9).name == 'BLUE'
+
+
+def test_enum_from_param():
+    param = color.from_param(5)
+    assert param.value == 5
+    param.value = 6
+    assert color.from_param(5).value == 5 and color.from_param(5) is not color.from_param(5)
+
+    own = color(5)
+    assert color.from_param(own) is own
+    with pytest.raises(ValueError):
+        color.from_param(6)
+    with pytest.raises(ValueError):
+        color.from_param(other(5))
+
+
+def test_enum_arguments(dll):
+    dll.identity.argtypes, dll.identity.restype = [color], ct.c_uint
+    assert dll.identity(5) == 5 and dll.identity(color.RED) == 0 and dll.identity(color(5)) == 5
+    with pytest.raises(ct.ArgumentError):
+        dll.identity(6)
+
+    value = color(5)
+    dll.increment(ct.byref(value))
+    assert value.value == 6 and color.from_param(5).value == 5
+
+
+@pytest.fixture
+def doubles(make_library):
+    if cc is None:
+        pytest.skip('needs a C compiler')
+    dll = ct.CDLL(make_library('void scale(double *xs, int n) { while (n--) xs[n] *= 2; }\n'
+                               'double total(const double *xs, int n) { double s = 0; while (n--) s += xs[n]; '
+                               'return s; }\n'
+                               'int first(const void *p) { return *(const char *)p; }\n', name='doubles'))
+    dll.scale.argtypes = buffer_pointer(ct.c_double), ct.c_int
+    dll.total.argtypes, dll.total.restype = (buffer_pointer(ct.c_double, True), ct.c_int), ct.c_double
+    dll.first.argtypes = buffer_pointer(None, True),
+    return dll
+
+
+def test_buffer_pointer(doubles):
+    assert buffer_pointer(ct.c_double) is buffer_pointer(ct.c_double)
+    assert issubclass(buffer_pointer(ct.c_double), ct.POINTER(ct.c_double))
+
+    xs = array.array('d', [1, 2, 3])
+    doubles.scale(xs, len(xs))
+    assert list(xs) == [2, 4, 6]
+    assert doubles.total(xs, 3) == 12 and doubles.total(array.array('d'), 0) == 0
+    assert doubles.total((ct.c_double * 2)(1, 2), 2) == 3 and doubles.total(None, 0) == 0
+
+    for bad in (array.array('f', [1]), memoryview(array.array('d', [1, 2, 3]))[::2], b'12345678'):
+        with pytest.raises(ct.ArgumentError):
+            doubles.scale(bad, 1)
+
+
+def test_buffer_pointer_readonly(doubles):
+    assert doubles.first(b'A') == ord('A') and doubles.first(bytearray(b'B')) == ord('B')
+    # Read-only buffers without an address ctypes can get at would have to be copied
+    with pytest.raises(ct.ArgumentError, match='without copying'):
+        doubles.total(memoryview(array.array('d', [1, 2]).tobytes()).cast('d'), 2)
+
+    np = pytest.importorskip('numpy')
+    xs = np.arange(3, dtype=float)
+    xs.flags.writeable = False
+    assert doubles.total(xs, 3) == 3
+    with pytest.raises(ct.ArgumentError):
+        doubles.scale(xs, 3)
@@ -0,0 +1,139 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip('lxml')
+
+from headache import doxml as doxml_module  # noqa: E402
+from headache.doxml import DoXML  # noqa: E402
+
+
+# Doxygen lists compounds alphabetically, so the field ``scale`` of point comes before the function ``scale``
+compounds = {
+    'structpoint': ('struct', '''
+  <compounddef id="structpoint" kind="struct" language="C++" prot="public">
+    <compoundname>point</compoundname>
+    <sectiondef kind="public-attrib">
+      <memberdef kind="variable" id="structpoint_1ax" prot="public" static="no" mutable="no">
+        <type>int</type><definition>int point::x</definition><argsstring/><name>x</name>
+        <briefdescription/><detaileddescription><para>The x coordinate.</para></detaileddescription>
+      </memberdef>
+      <memberdef kind="variable" id="structpoint_1ascale" prot="public" static="no" mutable="no">
+        <type>double</type><definition>double point::scale</definition><argsstring/><name>scale</name>
+        <briefdescription/><detaileddescription><para>The scale of the point.</para></detaileddescription>
+      </memberdef>
+    </sectiondef>
+    <briefdescription/><detaileddescription><para>A point.</para></detaileddescription>
+  </compounddef>'''),
+    'test_8h': ('file', '''
+  <compounddef id="test_8h" kind="file" language="C++">
+    <compoundname>test.h</compoundname>
+    <sectiondef kind="enum">
+      <memberdef kind="enum" id="test_8h_1acolor" prot="public" static="no" strong="no">
+        <type/><name>color</name>
+        <enumvalue id="test_8h_1ared" prot="public">
+          <name>RED</name><briefdescription/><detaileddescription><para>Red.</para></detaileddescription>
+        </enumvalue>
+        <briefdescription/><detaileddescription><para>Colours.</para></detaileddescription>
+      </memberdef>
+    </sectiondef>
+    <sectiondef kind="func">
+      <memberdef kind="function" id="test_8h_1ascale" prot="public" static="no">
+        <type>void</type><definition>void scale</definition><argsstring>(point *p, double by)</argsstring>
+        <name>scale</name>
+        <param><type>point *</type><declname>p</declname></param>
+        <param><type>double</type><declname>by</declname></param>
+        <briefdescription/>
+        <detaileddescription><para>Scale a point.</para><para><parameterlist kind="param">
+          <parameteritem><parameternamelist><parametername direction="inout">p</parametername></parameternamelist>
+            <parameterdescription><para>the point</para></parameterdescription></parameteritem>
+          <parameteritem><parameternamelist><parametername direction="in">by</parametername></parameternamelist>
+            <parameterdescription><para>the factor</para></parameterdescription></parameteritem>
+        </parameterlist></para></detaileddescription>
+      </memberdef>
+    </sectiondef>
+    <briefdescription/><detaileddescription/>
+  </compounddef>'''),
+}
+
+combine = '''<xsl:stylesheet xmlns:xsl="http://www.w3.org/1999/XSL/Transform" version="1.0">
+  <xsl:output method="xml" version="1.0" indent="no" standalone="yes"/>
+  <xsl:template match="/">
+    <doxygen version="{doxygenindex/@version}">
+      <xsl:for-each select="doxygenindex/compound">
+        <xsl:copy-of select="document(concat(@refid, '.xml'))/doxygen/*"/>
+      </xsl:for-each>
+    </doxygen>
+  </xsl:template>
+</xsl:stylesheet>
+'''
+
+# Doxygen's own schema, reduced to letting anything through
+schema = '''<xsd:schema xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+  <xsd:element name="doxygen">
+    <xsd:complexType>
+      <xsd:sequence><xsd:any processContents="skip" minOccurs="0" maxOccurs="unbounded"/></xsd:sequence>
+      <xsd:anyAttribute processContents="skip"/>
+    </xsd:complexType>
+  </xsd:element>
+</xsd:schema>
+'''
+
+
+def write_compound(base, refid: str, body: str):
+    (base / f'{refid}.xml').write_text(f'<?xml version="1.0"?>\n<doxygen version="1.9.1">{body}\n</doxygen>\n')
+
+
+@pytest.fixture
+def doxml_dir(tmp_path):
+    base = tmp_path / 'xml'
+    base.mkdir()
+    (base / 'index.xml').write_text('<?xml version="1.0"?>\n<doxygenindex version="1.9.1">\n' + ''.join(
+        f'  <compound refid="{refid}" kind="{kind}"><name>{refid}</name></compound>\n'
+        for refid, (kind, body) in compounds.items()) + '</doxygenindex>\n')
+    (base / 'combine.xslt').write_text(combine)
+    (base / 'compound.xsd').write_text(schema)
+    for refid, (kind, body) in compounds.items():
+        write_compound(base, refid, body)
+    return base
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_get_docs(tmp_path, doxml_dir, streaming):
+    doxml = DoXML(str(doxml_dir), streaming=streaming, cache_dir=str(tmp_path / 'cache'))
+    assert doxml.get_docs('point') == 'A point.' and doxml.get_docs('color') == 'Colours.'
+    assert doxml.get_docs('x', 'point') == 'The x coordinate.' and doxml.get_docs('RED', 'color') == 'Red.'
+    # Members are only found in their scope, so that the field does not shadow the function
+    assert doxml.get_docs('scale').startswith('Scale a point.')
+    assert doxml.get_docs('scale', 'point') == 'The scale of the point.'
+    assert doxml.get_docs('x') is None and doxml.get_docs('RED') is None
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_get_directions(tmp_path, doxml_dir, streaming):
+    doxml = DoXML(str(doxml_dir), streaming=streaming, cache_dir=str(tmp_path / 'cache'))
+    assert doxml.get_directions('scale') == {'p': 'inout', 'by': 'in'}
+    assert doxml.get_directions('point') == {} and doxml.get_directions('missing') == {}
+
+
+def test_streaming_cache(tmp_path, doxml_dir, monkeypatch):
+    parsed = []
+    parse_compound = doxml_module.parse_compound
+    # Threads, so that the parsed files can be told
+    monkeypatch.setattr(doxml_module, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    monkeypatch.setattr(doxml_module, 'parse_compound', lambda fname: parsed.append(fname) or parse_compound(fname))
+
+    def load():
+        parsed.clear()
+        return DoXML(str(doxml_dir), streaming=True, cache_dir=str(tmp_path / 'cache'))
+
+    assert load().get_docs('x', 'point') == 'The x coordinate.' and len(parsed) == 2
+    assert load().get_docs('x', 'point') == 'The x coordinate.' and parsed == []
+
+    write_compound(doxml_dir, 'structpoint', compounds['structpoint'][1].replace('The x', 'The first'))
+    st = os.stat(doxml_dir / 'structpoint.xml')
+    os.utime(doxml_dir / 'structpoint.xml', ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    doxml = load()
+    assert parsed == [str(doxml_dir / 'structpoint.xml')]
+    assert doxml.get_docs('x', 'point') == 'The first coordinate.' and doxml.get_docs('color') == 'Colours.'
@@ -0,0 +1,82 @@
+import ast
+import io
+import re
+import sys
+
+import pytest
+
+from headache import CTyper, DLLWrapper
+from headache.cffigen import CFFIWrapper
+from headache.emitter import to_source
+from headache.myast import thaw
+
+from conftest import requires_castxml
+
+
+header_source = '''
+#define N 3
+#define S "a\\"b"
+#define HALF 0.5
+#define BIG (1ull << 40)
+typedef enum color { RED, GREEN = 5, BLUE = -1 } color;
+typedef struct point { int x, y; struct point *next; char name[N]; } point;
+typedef union value { int i; double d; } value;
+typedef int (*cb_t)(point *);
+int f(point *p, cb_t cb, color c, double *out);
+void g(const char *s, value v, int xs[N]);
+'''
+
+options = [
+    {}, dict(lazy=True), dict(lazy_types=True), dict(direct=True), dict(hoist_types=False),
+    dict(buffers=True, out_params=True, async_functions='*'), dict(numpy_dtypes=True, profile=True),
+]
+
+
+def dump(node: ast.AST) -> str:
+    return ast.dump(node, include_attributes=False)
+
+
+def check(mod: ast.Module):
+    source = to_source(mod)
+    assert dump(ast.parse(source)) == dump(ast.parse(ast.unparse(ast.fix_missing_locations(thaw(mod)))))
+    # Definitions are set off by two blank lines at module level and by one inside classes and functions
+    assert not re.search(r'\S\n(?:\n|\n\n\n+)(?:def|class|async def) ', source)
+    assert not re.search(r'\S\n(?:\n\n+)?( +)(?:def|class|async def) ', source)
+    return source
+
+
+@requires_castxml
+@pytest.mark.skipif(sys.version_info < (3, 9), reason='needs ast.unparse')
+@pytest.mark.parametrize('options', options)
+def test_generated_module(make_header, options):
+    check(DLLWrapper(make_header(header_source), CTyper(), **options).create('libtest.so'))
+
+
+@requires_castxml
+@pytest.mark.skipif(sys.version_info < (3, 9), reason='needs ast.unparse')
+def test_generated_cffi(make_header):
+    wrapper = CFFIWrapper(make_header(header_source), CTyper())
+    check(wrapper.create('libtest.so'))
+    check(wrapper.create_build_script('libtest.so'))
+
+
+@requires_castxml
+@pytest.mark.parametrize('options', [{}, dict(lazy=True), dict(lazy_types=True), dict(direct=True)])
+def test_print_stream(make_header, options):
+    wrapper = DLLWrapper(make_header(header_source), CTyper(), **options)
+    printed, streamed = io.StringIO(), io.StringIO()
+    wrapper.print(printed, 'libtest.so')
+    wrapper.print_stream(streamed, 'libtest.so')
+    assert streamed.getvalue() == printed.getvalue()
+
+
+@requires_castxml
+def test_generated_source_runs(make_header, make_library):
+    header = make_header(header_source)
+    library = make_library('int f(point *p, cb_t cb, color c, double *out) { *out = 0.5; return cb(p) + c; }\n'
+                           'void g(const char *s, value v, int xs[N]) {}\n', header)
+    namespace = {}
+    exec(compile(to_source(DLLWrapper(header, CTyper()).create(library)), 'test', 'exec'), namespace)
+    assert namespace['S'] == 'a"b' and namespace['BIG'] == 1 << 40 and namespace['color'].BLUE == -1
+    out = namespace['ctypes'].c_double()
+    assert namespace['f'](None, namespace['cb_t'](lambda p: 2), namespace['color'].GREEN, out) == 7 and out.value == 0.5
@@ -0,0 +1,96 @@
+import ctypes as ct
+import warnings
+
+import pytest
+
+from headache import CTyper, DLLWrapper
+
+from conftest import import_file, requires_castxml
+
+
+common_header = '''
+typedef struct point { int x, y; } point;
+typedef struct node { int value; struct node *next; } node;
+int length(const node *n);
+'''
+
+a_header = '''
+#include "common.h"
+#define A 1
+typedef struct pt { int x, y; } pt;
+int norm1(const point *p);
+'''
+
+b_header = '''
+#include "common.h"
+#define B 2
+typedef struct pt { int x, y, z; } pt;
+int sum(const node *n);
+'''
+
+library_source = '''
+int length(const node *n) { int k = 0; for (; n; n = n->next) ++k; return k; }
+int norm1(const point *p) { return (p->x < 0 ? -p->x : p->x) + (p->y < 0 ? -p->y : p->y); }
+int sum(const node *n) { int s = 0; for (; n; n = n->next) s += n->value; return s; }
+'''
+
+
+@pytest.fixture
+def headers(make_header):
+    make_header(common_header, 'common.h')
+    return make_header(a_header, 'a.h'), make_header(b_header, 'b.h')
+
+
+def named(typer: CTyper, name: str):
+    return [ctype for pgxtype, ctype in typer.typemap.items() if getattr(pgxtype, 'name', None) == name]
+
+
+@requires_castxml
+def test_load_headers(headers):
+    typer = CTyper()
+    with pytest.warns(UserWarning, match='Conflicting definitions of type pt') as record:
+        typer.load_headers(headers, jobs=2)
+    assert len(record) == 1
+
+    # The types and functions of common.h are shared rather than duplicated, including the self-referential node
+    assert len(named(typer, 'point')) == len(named(typer, 'node')) == 1
+    node, = named(typer, 'node')
+    assert typer.functions['length'].parameters['n'].annotation._type_ is node
+    assert typer.functions['sum'].parameters['n'].annotation._type_ is node
+    assert set(typer.functions) == {'length', 'norm1', 'sum'} and (typer.defines['A'], typer.defines['B']) == (1, 2)
+
+    pt, = named(typer, 'pt')
+    assert [name for name, _ in pt._fields_] == ['x', 'y']
+
+
+@requires_castxml
+def test_merge_functions(headers):
+    typer = CTyper()
+    typer.load_header(headers[0])
+    other = CTyper()
+    other.load_header(headers[1])
+    with pytest.warns(UserWarning) as record:
+        typer.merge(None, {key: val for key, val in other.typemap.items() if key not in other.fundamental_typemap},
+                    other.functions, other.defines)
+    # node is a different class in each typer, but laid out the same, and so is the signature of length
+    assert [str(warning.message).split(':')[0] for warning in record] == ['Conflicting definitions of type pt [struct]']
+    assert len(named(typer, 'node')) == 1
+
+
+@requires_castxml
+def test_wrap_headers(tmp_path, headers, make_library):
+    library = make_library(library_source, headers[0])
+    file = str(tmp_path / 'wrapped.py')
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        wrapper = DLLWrapper(list(headers), CTyper(), jobs=2)
+    wrapper.print(file, library)
+    with open(file) as f:
+        source = f.read()
+    assert source.count('class node(') == 1 and source.count('class point(') == 1
+    assert wrapper.dependencies() >= set(headers)
+
+    m = import_file('wrapped', file)
+    n = m.node(1, None)
+    n = m.node(2, ct.pointer(n))
+    assert (m.length(n), m.sum(n), m.norm1(m.point(3, -4)), m.A, m.B) == (2, 3, 7, 1, 2)
@@ -0,0 +1,72 @@
+import ctypes
+import io
+import json
+
+from headache import CTyper, DLLWrapper, HeaderCache
+
+from conftest import requires_castxml
+
+
+@requires_castxml
+def test_dependencies_include_macro_only_files(make_header):
+    make_header('#define X 1\n', 'defs.h')
+    header = make_header('#include "defs.h"\nint f(int x);\n')
+    assert any(dep.endswith('defs.h') for dep in DLLWrapper(header, CTyper()).dependencies())
+
+
+@requires_castxml
+def test_cache_notices_macro_only_include(tmp_path, make_header):
+    make_header('#define X 1\n', 'defs.h')
+    header = make_header('#include "defs.h"\nint f(int x);\n')
+    hc = HeaderCache(str(tmp_path / 'cache'))
+    for value in (1, 1, 2):
+        make_header(f'#define X {value}\n', 'defs.h')
+        typer = CTyper(cache=hc)
+        typer.load_header(header)
+        assert typer.defines['X'] == value
+
+
+@requires_castxml
+def test_print_incremental(tmp_path, make_header):
+    header = make_header('#define X 1\nint f(int x);\nint g(int x);\n')
+    file = str(tmp_path / 'wrapped.py')
+    wrapper = DLLWrapper(header, CTyper())
+    first = wrapper.print_incremental(file, 'libtest.so')
+    with open(file) as f:
+        assert 'X = 1' in f.read()
+
+    make_header('#define X 2\nint f(int x);\nint g(int x, int y);\n')
+    wrapper.reload()
+    # Reused sources are taken from the record, so doctor one to see which are
+    fingerprints = json.loads(json.dumps(first))
+    fingerprints['function f'][1] = fingerprints['function f'][1].replace('def f(', 'def f_reused(')
+    second = wrapper.print_incremental(file, 'libtest.so', fingerprints=fingerprints)
+    with open(file) as f:
+        source = f.read()
+    assert 'X = 2' in source and 'def f_reused(' in source and 'def g(x: ctypes.c_int, y: ctypes.c_int)' in source
+    assert second['define X'] != first['define X'] and second['function g'] != first['function g']
+
+
+@requires_castxml
+def test_reload_reuses_unchanged_types(make_header):
+    source = ('typedef struct point {{ int x, y; }} point;\ntypedef struct line {{ point a, b; }} line;\n'
+              'typedef enum color {{ RED, GREEN }} color;\ntypedef {} value;\ntypedef struct box {{ value v; }} box;\n'
+              'typedef struct node {{ struct node *next; }} node;\nint f(line *l, color c, box *b, node *n);\n')
+    header = make_header(source.format('int'))
+    wrapper = DLLWrapper(header, CTyper())
+    before = dict(wrapper.typedefs())
+
+    make_header(source.format('double'))
+    wrapper.reload()
+    after = dict(wrapper.typedefs())
+    names = ['point', 'line', 'color', 'value', 'box', 'node']
+    assert [name for name in names if after[name] is before[name]] == ['point', 'line', 'color']
+    # Recursive structs are made anew, since their fields lead back to the new struct
+    assert wrapper.typer.type_stats()['reused'] == 3 and after['node'] is not before['node']
+    assert after['box']._fields_ == [('v', after['value'])] and after['value'].__bases__ == (ctypes.c_double,)
+    assert wrapper.typer.functions['f'].parameters['l'].annotation is ctypes.POINTER(before['line'])
+
+    reloaded, fresh = io.StringIO(), io.StringIO()
+    wrapper.print(reloaded, 'libtest.so')
+    DLLWrapper(header, CTyper()).print(fresh, 'libtest.so')
+    assert reloaded.getvalue() == fresh.getvalue()
@@ -0,0 +1,62 @@
+import ctypes as ct
+
+import pytest
+
+from headache.profiling import Profiler, ProfiledFunction
+
+from conftest import cc
+
+
+@pytest.fixture
+def dll(make_library):
+    if cc is None:
+        pytest.skip('needs a C compiler')
+    dll = ct.CDLL(make_library('int add(int a, int b) { return a + b; }\nint neg(int a) { return -a; }\n'))
+    dll.add.argtypes = ct.c_int, ct.c_int
+    return dll
+
+
+def test_enable_and_disable(dll):
+    namespace = {'add': dll.add, 'neg': dll.neg}
+    add, neg = dll.add, dll.neg
+    profiler = Profiler(dll, namespace, ['add', 'neg'])
+    assert not profiler.enabled
+
+    profiler.enable()
+    assert isinstance(dll.add, ProfiledFunction) and namespace['neg'] is dll.neg is not neg
+    assert namespace['add'](1, 2) == 3 and dll.neg(4) == -4
+    assert profiler.stats()['add']['calls'] == 1 and profiler.stats()['neg']['calls'] == 1
+
+    profiler.disable()
+    assert (dll.add, dll.neg, namespace['add'], namespace['neg']) == (add, neg, add, neg)
+    assert namespace['add'](1, 2) == 3 and profiler.stats()['add']['calls'] == 1
+
+    profiler.enable()
+    dll.add(1, 2)
+    assert profiler.stats()['add']['calls'] == 2
+    profiler.reset()
+    assert profiler.stats() == {}
+
+
+def test_missing_symbols(dll):
+    namespace = {'add': dll.add}
+    profiler = Profiler(dll, namespace, ['add', 'missing', 'neg'])
+    profiler.enable()
+    assert profiler.enabled and profiler.missing == {'missing'}
+    assert isinstance(dll.add, ProfiledFunction) and isinstance(dll.neg, ProfiledFunction)
+
+    profiler.disable()
+    assert not isinstance(dll.add, ProfiledFunction) and not isinstance(dll.neg, ProfiledFunction)
+    assert namespace['add'] is dll.add
+
+
+def test_enable_is_atomic(dll, monkeypatch):
+    def fail(self, func, stats):
+        raise RuntimeError
+
+    add = dll.add
+    profiler = Profiler(dll, {}, ['add', 'neg'])
+    monkeypatch.setattr(ProfiledFunction, '__init__', fail)
+    with pytest.raises(RuntimeError):
+        profiler.enable()
+    assert dll.add is add and not profiler.enabled
@@ -0,0 +1,95 @@
+import ctypes as ct
+import io
+import os
+
+import pytest
+
+from headache import CTyper, DLLWrapper
+
+from conftest import requires_castxml
+
+
+own_header = '''
+#include "vendor/other.h"
+#define OWN 1
+#define use_MAX 5
+typedef struct inner { int v; } inner;
+typedef struct reached { inner *i; } reached;
+typedef struct unused { int z; } unused;
+typedef long count_t;
+typedef long spare_t;
+int use(reached *r, count_t n);
+int skip(unused *u);
+'''
+
+other_header = '''
+#define OTHER 2
+typedef struct foreign { int q; } foreign;
+int other(foreign *f);
+'''
+
+
+@pytest.fixture
+def headers(tmp_path, make_header):
+    (tmp_path / 'vendor').mkdir()
+    return make_header(own_header, 'own.h'), make_header(other_header, 'vendor/other.h')
+
+
+def structs(typer: CTyper):
+    return {ctype.__name__ for ctype in typer.typemap.values()
+            if isinstance(ctype, type) and issubclass(ctype, ct.Structure)}
+
+
+@requires_castxml
+@pytest.mark.parametrize('single_pass', [False, True])
+def test_allow_functions(headers, single_pass):
+    typer = CTyper(single_pass=single_pass, allow_functions=['use*'])
+    typer.load_header(headers[0])
+    assert set(typer.functions) == {'use'}
+    # inner is only reachable through the fields of a type in the signature of use
+    assert structs(typer) == {'reached', 'inner'}
+    assert set(typer.defines) == {'use_MAX'}
+
+
+@requires_castxml
+@pytest.mark.parametrize('single_pass', [False, True])
+def test_allow_files(headers, single_pass):
+    typer = CTyper(single_pass=single_pass, allow_files=[headers[1]])
+    typer.load_header(headers[0])
+    assert set(typer.functions) == {'other'} and structs(typer) == {'foreign'} and set(typer.defines) == {'OTHER'}
+
+    typer = CTyper(single_pass=single_pass, allow_files=[headers[0]])
+    typer.load_header(headers[0])
+    assert set(typer.functions) == {'use', 'skip'} and structs(typer) == {'reached', 'inner', 'unused'}
+    assert set(typer.defines) == {'OWN', 'use_MAX'}
+
+
+@requires_castxml
+def test_allow_functions_and_files(headers):
+    typer = CTyper(allow_functions=['use'], allow_files=[os.path.dirname(headers[1])])
+    typer.load_header(headers[0])
+    assert set(typer.functions) == {'use', 'other'} and structs(typer) == {'reached', 'inner', 'foreign'}
+    assert set(typer.defines) == {'OTHER'}
+
+
+@requires_castxml
+def test_wrap_pruned(headers):
+    f = io.StringIO()
+    DLLWrapper(headers[0], CTyper(allow_functions=['use*'])).print(f, 'libown.so')
+    source = f.getvalue()
+    for expected in ('class inner(', 'class reached(', 'count_t = ', 'use_MAX = 5', 'def use('):
+        assert expected in source
+    for name in ('unused', 'spare_t', 'skip', 'foreign', 'other', 'OWN', 'OTHER'):
+        assert name not in source
+
+
+@requires_castxml
+def test_single_pass_locations(headers):
+    def locations(typer: CTyper):
+        return {decl.name: (os.path.abspath(decl.location.file_name), decl.location.line)
+                for decl in typer.load_header(headers[0]).declarations
+                if decl.location and not decl.location.file_name.startswith('<')}
+
+    expected = locations(CTyper())
+    assert expected['use'] == (headers[0], 10) and expected['foreign'] == (headers[1], 3)
+    assert locations(CTyper(single_pass=True)) == expected
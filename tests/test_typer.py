@@ -0,0 +1,52 @@
+import ctypes as ct
+
+from pygccxml import declarations as d
+
+from headache import CTyper
+
+from conftest import requires_castxml
+
+
+def struct(fname: str, ftype: d.type_t) -> d.class_t:
+    cls = d.class_t(name='s', class_type=d.CLASS_TYPES.STRUCT)
+    cls.location = d.location_t(fname, 1)
+    cls.adopt_declaration(d.variable_t(name='v', decl_type=ftype), d.ACCESS_TYPES.PUBLIC)
+    return cls
+
+
+def test_type_memo():
+    typer = CTyper()
+    first, second = d.pointer_t(d.int_t()), d.pointer_t(d.int_t())
+    assert typer.get_type(first) is ct.POINTER(ct.c_int)
+    assert typer.type_stats() == dict(size=2, identity_hits=0, key_hits=0, misses=2, reused=0)
+    # The same object again, then an equal one
+    assert typer.get_type(first) is typer.get_type(second) is ct.POINTER(ct.c_int)
+    assert typer.type_stats() == dict(size=2, identity_hits=1, key_hits=1, misses=2, reused=0)
+
+    typer.clear_type_table()
+    assert typer.get_type(second) is ct.POINTER(ct.c_int) and typer.type_stats()['size'] == 2
+
+
+def test_type_key():
+    typer = CTyper()
+    # Spelled the same, but different declarations
+    a, b = (d.pointer_t(d.declarated_t(struct(fname, ftype))) for fname, ftype in (('a.h', d.int_t()),
+                                                                                    ('b.h', d.double_t())))
+    assert a.decl_string == b.decl_string and typer.type_key(a) != typer.type_key(b)
+    assert typer.get_type(a)._type_._fields_ == [('v', ct.c_int)]
+    assert typer.get_type(b)._type_._fields_ == [('v', ct.c_double)]
+
+    for first, second in ((d.pointer_t(d.int_t()), d.pointer_t(d.const_t(d.int_t()))),
+                          (d.array_t(d.int_t(), 2), d.array_t(d.int_t(), 3))):
+        assert typer.type_key(first) != typer.type_key(second)
+
+
+@requires_castxml
+def test_shared_type_objects(make_header):
+    typer = CTyper()
+    typer.load_header(make_header('typedef struct point { int x, y; } point;\n'
+                                  'int f(point *p, int *n);\nint g(point *p, int *n);\n'))
+    stats = typer.type_stats()
+    # castxml hands out one object per type, so the uses in g are found by identity
+    assert stats['misses'] == stats['size'] and stats['key_hits'] == 0 and stats['identity_hits'] >= 3
+    assert typer.functions['f'] == typer.functions['g']
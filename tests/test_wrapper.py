@@ -0,0 +1,207 @@
+import array
+import asyncio
+import ctypes as ct
+import inspect
+
+import pytest
+
+from headache import CTyper, DLLWrapper
+from headache.cutils import async_caller
+
+from conftest import import_file, requires_castxml
+
+
+callbacks_header = '''
+typedef int (*cb_t)(int);
+typedef int (*cb2_t)(int);
+int call_cb(cb_t cb, int x);
+int call_cb2(cb2_t cb, int x);
+'''
+
+callbacks_source = '''
+int call_cb(cb_t cb, int x) { return cb(x); }
+int call_cb2(cb2_t cb, int x) { return 2 * cb(x); }
+'''
+
+
+@pytest.fixture
+def generate(tmp_path, make_header, make_library):
+    def generate(header: str, source: str, **kwargs):
+        header = make_header(header)
+        library = make_library(source, header)
+        file = str(tmp_path / 'wrapped.py')
+        DLLWrapper(header, CTyper(), **kwargs).print(file, library)
+        with open(file) as f:
+            return f.read(), import_file('wrapped', file)
+    return generate
+
+
+@requires_castxml
+@pytest.mark.parametrize('options', [{}, dict(lazy_types=True), dict(out_params=True, async_functions='*')])
+def test_typedef_names(generate, options):
+    source, m = generate(callbacks_header, callbacks_source, **options)
+    assert 'def call_cb(cb: cb_t,' in source and 'def call_cb2(cb: cb2_t,' in source
+    if options.get('async_functions'):
+        assert 'async def call_cb_async(cb: cb_t,' in source
+    assert m.call_cb(m.cb_t(lambda x: x + 1), 1) == 2 and m.call_cb2(m.cb2_t(lambda x: x + 1), 1) == 4
+    assert inspect.signature(m.call_cb).parameters['cb'].annotation is m.cb_t
+
+
+@requires_castxml
+@pytest.mark.parametrize('options', [{}, dict(lazy=True)])
+def test_buffer_aliases(generate, options):
+    source, m = generate('double total(const double *xs, int n);\ndouble mean(const double *xs, int n);\n'
+                         'void scale(double *xs, int n);\n',
+                         'double total(const double *xs, int n) { double s = 0; while (n--) s += xs[n]; return s; }\n'
+                         'double mean(const double *xs, int n) { return total(xs, n) / n; }\n'
+                         'void scale(double *xs, int n) { while (n--) xs[n] *= 2; }\n', buffers=True, **options)
+    assert source.count('buffer_pointer(ctypes.c_double, True)') == 1
+    assert source.count('buffer_pointer(ctypes.c_double)') == 1
+
+    xs = array.array('d', [1, 2, 3])
+    m.scale(xs, 3)
+    assert m.total(xs, 3) == 12 and m.mean(xs, 3) == 4
+
+
+points_header = '''
+#define OUT __attribute__((annotate("out")))
+typedef struct point { int x, y; } point;
+int norm1(const point *p);
+int divide(int a, int b, int *quotient OUT, int *remainder OUT);
+void origin(point *p OUT);
+void get(double *value);
+'''
+
+points_source = '''
+int norm1(const point *p) { return (p->x < 0 ? -p->x : p->x) + (p->y < 0 ? -p->y : p->y); }
+int divide(int a, int b, int *quotient, int *remainder) { if (!b) return -1; *quotient = a / b; *remainder = a % b;
+                                                          return 0; }
+void origin(point *p) { p->x = p->y = 0; }
+void get(double *value) { *value = 1.5; }
+'''
+
+
+@requires_castxml
+@pytest.mark.parametrize('options', [dict(out_params=True), dict(out_params={'get': ['value']}, lazy=True)])
+def test_out_params(generate, options):
+    source, m = generate(points_header, points_source, **options)
+    assert list(inspect.signature(m.divide).parameters) == ['a', 'b']
+    assert m.divide(7, 2) == (0, 3, 1) and m.divide(9, 3) == (0, 3, 0)
+
+    p = m.origin()
+    assert isinstance(p, m.point) and (p.x, p.y) == (0, 0) and m.origin() is not p
+    assert m.norm1(m.point(-1, 2)) == 3
+    if options['out_params'] is True:
+        value = ct.c_double()
+        m.get(ct.byref(value))
+        assert value.value == 1.5
+    else:
+        assert m.get() == 1.5
+
+
+@requires_castxml
+@pytest.mark.parametrize('options', [dict(lazy=True), dict(lazy_types=True)])
+def test_lazy(generate, options):
+    source, m = generate(points_header, points_source, **options)
+    assert 'def __getattr__(name):' in source
+    assert 'norm1' not in vars(m) and 'norm1' in dir(m)
+    assert ('point' in vars(m)) is not options.get('lazy_types', False)
+
+    assert m.norm1(m.point(1, -2)) == 3
+    assert 'norm1' in vars(m) and 'point' in vars(m) and m.norm1 is m.norm1
+    with pytest.raises(AttributeError, match='has no attribute'):
+        m.missing
+
+
+async_header = points_header + '''
+int meet(int *count, int n);
+void nap(int ms);
+void bump(int *count);
+'''
+
+async_source = '''
+#include <unistd.h>
+''' + points_source + '''
+int meet(int *count, int n) {
+    __atomic_add_fetch(count, 1, __ATOMIC_SEQ_CST);
+    for (int i = 0; i < 5000 && __atomic_load_n(count, __ATOMIC_SEQ_CST) < n; i++) usleep(1000);
+    return __atomic_load_n(count, __ATOMIC_SEQ_CST) >= n;
+}
+void nap(int ms) { usleep(ms * 1000); }
+void bump(int *count) { ++*count; }
+'''
+
+
+@pytest.fixture
+def caller():
+    yield async_caller
+    async_caller.configure()
+
+
+@requires_castxml
+def test_async_functions(generate, caller):
+    source, m = generate(async_header, async_source, out_params=True, async_functions='*')
+
+    async def concurrently():
+        # Each call only returns true once the other has started too
+        count = ct.c_int()
+        return await asyncio.gather(m.meet_async(ct.byref(count), 2), m.meet_async(ct.byref(count), 2))
+
+    assert asyncio.run(concurrently()) == [1, 1]
+
+    async def results():
+        assert await m.divide_async(7, 2) == (0, 3, 1)
+        with pytest.raises(ct.ArgumentError):
+            await m.divide_async('seven', 2)
+
+    asyncio.run(results())
+
+    async def cancel():
+        count = ct.c_int()
+        running = asyncio.ensure_future(m.nap_async(200))
+        await asyncio.sleep(0.05)
+        # The only worker is busy, so the call is still queued when it is cancelled
+        queued = asyncio.ensure_future(m.bump_async(ct.byref(count)))
+        await asyncio.sleep(0)
+        queued.cancel()
+        await running
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        await asyncio.sleep(0.05)
+        assert count.value == 0
+        await m.bump_async(ct.byref(count))
+        assert count.value == 1
+
+    caller.configure(max_workers=1)
+    asyncio.run(cancel())
+
+
+hoisting_header = '''
+typedef struct point { int x, y; } point;
+int first(point *p, point **pp, int (*f)(point *));
+int second(point *p, point **pp, int (*f)(point *));
+'''
+
+hoisting_source = '''
+int first(point *p, point **pp, int (*f)(point *)) { return f(p) + (*pp)->y; }
+int second(point *p, point **pp, int (*f)(point *)) { return f(*pp) - p->x; }
+'''
+
+
+@requires_castxml
+@pytest.mark.parametrize('options', [{}, dict(lazy=True), dict(hoist_types=False)])
+def test_hoisted_types(generate, options):
+    source, m = generate(hoisting_header, hoisting_source, **options)
+    if options.get('hoist_types', True):
+        # Every pointer and prototype is spelled out once, in terms of the aliases before it
+        for alias, expr in (('_ct_P_point', 'ctypes.POINTER(point)'), ('_ct_P_P_point', 'ctypes.POINTER(_ct_P_point)'),
+                            ('_ct_F_c_int__P_point', 'ctypes.CFUNCTYPE(ctypes.c_int, _ct_P_point)')):
+            assert source.count(f'{alias} = {expr}\n') == 1
+        assert source.count('ctypes.POINTER(') == 2 and source.count('ctypes.CFUNCTYPE(') == 1
+        assert m._ct_P_point is ct.POINTER(m.point)
+    else:
+        assert '_ct_' not in source and source.count('ctypes.CFUNCTYPE(') > 1
+
+    p = m.point(1, 2)
+    f = inspect.signature(m.first).parameters['f'].annotation(lambda q: q.contents.x * 10)
+    assert m.first(p, ct.pointer(ct.pointer(p)), f) == 12 and m.second(p, ct.pointer(ct.pointer(p)), f) == 9